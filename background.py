@@ -0,0 +1,97 @@
+"""
+Background work for GTA-style South Park Canadian game
+This module runs slow, self-contained jobs (painting city chunks, building
+sprite variants, writing cache files) on a small thread pool so they don't
+hold up startup or the first frames. Jobs only touch their own data; the
+callbacks that hand results to the game run on the main thread, from poll(),
+between frames.
+"""
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+class Job:
+    """A submitted job: ask whether it is ready, or wait for its result"""
+    __slots__ = ("future", "on_ready", "delivered")
+
+    def __init__(self, future, on_ready):
+        self.future = future
+        self.on_ready = on_ready
+        self.delivered = False  # on_ready has run
+
+    @property
+    def ready(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """The job's return value, waiting for it if needed (re-raises the job's error)"""
+        return self.future.result(timeout)
+
+    def value(self, default=None):
+        """The return value if the job has finished successfully, otherwise default"""
+        if not self.future.done() or self.future.cancelled() or self.future.exception() is not None:
+            return default
+        return self.future.result()
+
+    def cancel(self):
+        """Drop the job if it hasn't started; returns True if it was dropped"""
+        return self.future.cancel()
+
+class TaskPool:
+    """Thread pool whose results are delivered on the main thread"""
+    def __init__(self, workers=None):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="background")
+        self.pending = []  # Jobs whose on_ready hasn't run yet, in submission order
+
+    def submit(self, function, *args, on_ready=None):
+        """Run function(*args) in the background; on_ready(result) runs in a later poll()"""
+        job = Job(self.executor.submit(function, *args), on_ready)
+        self.pending.append(job)
+        return job
+
+    def poll(self):
+        """Deliver finished jobs (main thread only); returns how many were delivered"""
+        if not self.pending:
+            return 0
+        # One ready check per job, so a job finishing during the split can't fall between the lists
+        done, waiting = [], []
+        for job in self.pending:
+            (done if job.ready else waiting).append(job)
+        if not done:
+            return 0
+        self.pending = waiting
+        for job in done:
+            self.deliver(job)
+        return len(done)
+
+    def wait(self):
+        """Block until every job has finished and been delivered"""
+        while self.pending:
+            job = self.pending.pop(0)
+            try:
+                job.future.result()
+            except Exception:
+                pass  # Reported by deliver()
+            self.deliver(job)
+
+    def deliver(self, job):
+        job.delivered = True
+        if job.future.cancelled():
+            return
+        error = job.future.exception()
+        if error is not None:
+            print(f"Background job failed: {error}")
+            traceback.print_exception(type(error), error, error.__traceback__)
+            return
+        if job.on_ready is not None:
+            job.on_ready(job.future.result())
+
+    @property
+    def busy(self):
+        return bool(self.pending)
+
+    def shutdown(self):
+        """Drop queued jobs and let running ones finish"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pending = []
@@ -5,7 +5,74 @@ and are activated through specific sequences of actions.
 """
 import random
 import math
+from collections import deque
 import pygame
+import modifiers
+import input_system
+import rendering
+
+class CheatMatcher:
+    """Aho-Corasick automaton over cheat codes: one transition per key press
+
+    States are trie nodes (0 is the root). Failure links are folded into a
+    full transition table at build time, so stepping never backtracks, and
+    each state remembers the cheat whose code it completes (the earliest
+    listed cheat wins when codes overlap).
+    """
+    def __init__(self, cheats):
+        self.transitions = [{}]  # state -> {key: next state}
+        self.matches = [None]    # state -> cheat completed on reaching it
+        self.build(cheats)
+
+    def build(self, cheats):
+        # Trie of all codes
+        goto = [{}]
+        own_match = [None]
+        for cheat in cheats:
+            state = 0
+            for key in cheat["code"]:
+                next_state = goto[state].get(key)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][key] = next_state
+                    goto.append({})
+                    own_match.append(None)
+                state = next_state
+            if own_match[state] is None:
+                own_match[state] = cheat
+
+        # Breadth-first failure links, completing the transition table as we go
+        order = {id(cheat): i for i, cheat in enumerate(cheats)}
+        transitions = [dict(edges) for edges in goto]
+        matches = list(own_match)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            # A code ending at the failure state also ends here (suffix match)
+            suffix_match = matches[fail[state]]
+            if suffix_match is not None and (matches[state] is None or
+                                             order[id(suffix_match)] < order[id(matches[state])]):
+                matches[state] = suffix_match
+
+            for key, next_state in goto[state].items():
+                fail[next_state] = transitions[fail[state]].get(key, 0) if state else 0
+                queue.append(next_state)
+
+            # Missing edges follow the failure state's (already complete) edges
+            for key, next_state in transitions[fail[state]].items():
+                transitions[state].setdefault(key, next_state)
+
+        self.transitions = transitions
+        self.matches = matches
+
+    def step(self, state, key):
+        """Return the state after one key press"""
+        return self.transitions[state].get(key, 0)
+
+    def match(self, state):
+        """Return the cheat completed in this state, or None"""
+        return self.matches[state]
 
 class CheatSystem:
     """Manages cheat codes and their activation"""
@@ -13,11 +80,14 @@ class CheatSystem:
         self.game = game
         self.cheats = []
         self.input_sequence = []
-        self.sequence_timer = 0
+        self.match_state = 0  # Current CheatMatcher state
+        self.modifiers = modifiers.ModifierRegistry()  # Attribute changes made by active cheats
+        self.sequence_expires = 0  # Scheduler tick when the typed sequence goes stale
         self.max_sequence_time = 120  # 2 seconds at 60 fps
         self.last_activated_cheat = None
-        self.active_cheats = {}  # cheat_name: time_remaining
-        self.cheat_messages = []  # messages to display
+        self.active_cheats = {}  # effect: scheduler handle for its expiry
+        self.cheat_messages = []  # messages to display (each removed by a scheduler timer)
+        self.one_shot_effects = {"money_boost", "panic_mode"}  # Effects that don't last
         
         # Initialize available cheats
         self.initialize_cheats()
@@ -111,206 +181,173 @@ class CheatSystem:
             "duration": 2400,  # 40 seconds at 60 fps
             "discovered": False
         })
+
+        # Compile every code into one automaton for constant-time matching
+        self.matcher = CheatMatcher(self.cheats)
+    
+    def process_actions(self, pressed):
+        """Feed the actions newly pressed this tick (an input_system bitmask) to the matcher"""
+        if not pressed:
+            return
+        for action, key in input_system.CHEAT_KEYS:
+            if pressed & action:
+                self.process_input(key)
     
     def process_input(self, key):
         """Process a key press and check for cheat code matches"""
         # Reset sequence if timer expired
-        if self.sequence_timer <= 0:
+        now = self.game.scheduler.tick
+        if now >= self.sequence_expires:
             self.input_sequence = []
+            self.match_state = 0
         
         # Add key to sequence and reset timer
         self.input_sequence.append(key)
-        self.sequence_timer = self.max_sequence_time
+        self.sequence_expires = now + self.max_sequence_time
         
-        # Limit sequence length
+        # Limit sequence length (kept for the debug display)
         if len(self.input_sequence) > 10:
             self.input_sequence = self.input_sequence[-10:]
             
-        # Check for matches
-        for cheat in self.cheats:
-            # Skip if code is longer than current sequence
-            if len(cheat["code"]) > len(self.input_sequence):
-                continue
-                
-            # Check if end of sequence matches the cheat code
-            seq_slice = self.input_sequence[-len(cheat["code"]):]
-            if seq_slice == cheat["code"]:
-                self.activate_cheat(cheat)
-                self.input_sequence = []  # Reset after successful activation
-                return
+        # One automaton step per key; a state that completes a code names its cheat
+        self.match_state = self.matcher.step(self.match_state, key)
+        cheat = self.matcher.match(self.match_state)
+        if cheat is not None:
+            self.activate_cheat(cheat)
+            self.input_sequence = []  # Reset after successful activation
+            self.match_state = 0
     
     def activate_cheat(self, cheat):
         """Activate a cheat code's effect"""
         # Mark as discovered
         cheat["discovered"] = True
         
-        # Set as active with duration
-        self.active_cheats[cheat["effect"]] = cheat["duration"]
+        # Set as active with duration (re-activating restarts the clock)
+        scheduler = self.game.scheduler
+        scheduler.cancel(self.active_cheats.get(cheat["effect"]))
+        self.active_cheats[cheat["effect"]] = scheduler.schedule(
+            cheat["duration"], self.deactivate_cheat, cheat["effect"])
         
         # Store last activated cheat
         self.last_activated_cheat = cheat
         
         # Add message
         message = f"Cheat Activated: {cheat['name']} - {cheat['description']}"
-        self.cheat_messages.append({
-            "text": message,
-            "timer": 180  # Show for 3 seconds
-        })
+        self.add_message(message, 180)  # Show for 3 seconds
         
         # Apply immediate effects
         self.apply_cheat_effect(cheat)
     
+    def resume_cheat(self, effect, remaining):
+        """Re-activate a cheat restored from a snapshot with the time it had left"""
+        cheat = next((cheat for cheat in self.cheats if cheat["effect"] == effect), None)
+        if cheat is None:
+            return
+        scheduler = self.game.scheduler
+        scheduler.cancel(self.active_cheats.get(effect))
+        self.active_cheats[effect] = scheduler.schedule_at(scheduler.tick + remaining, self.deactivate_cheat, effect)
+        # One-shot effects (money, panic) already happened before the save
+        if effect not in self.one_shot_effects:
+            self.apply_cheat_effect(cheat)
+    
     def apply_cheat_effect(self, cheat):
         """Apply the specific effect of a cheat code"""
         effect = cheat["effect"]
+        player = self.game.player
+        
+        # Re-activating a cheat replaces its modifiers instead of stacking them
+        self.modifiers.remove_source(effect)
         
         if effect == "punch_speed":
             # Increase player attack speed dramatically
-            if hasattr(self.game.player, 'shoot_cooldown'):
-                # Store original value if we haven't already
-                if not hasattr(self, '_original_shoot_cooldown'):
-                    self._original_shoot_cooldown = self.game.player.shoot_cooldown
-                
-                # Set to very low cooldown
-                self.game.player.shoot_cooldown = 5
+            if hasattr(player, 'shoot_cooldown_time'):
+                self.modifiers.add(player, "shoot_cooldown_time", modifiers.OVERRIDE, 5, effect)
                 
         elif effect == "rocket_launcher":
             # Give player rocket launcher capabilities
-            if hasattr(self.game.player, 'bullets'):
-                # Store original values
-                if not hasattr(self, '_original_bullet_speed'):
-                    self._original_bullet_speed = self.game.player.bullet_speed
-                
-                # Make bullets act like rockets (faster, bigger)
-                self.game.player.bullet_speed = 15
-                # Additional properties will be handled in update_effects
+            if hasattr(player, 'bullets'):
+                # Make bullets act like rockets (faster, bigger, explode on impact)
+                self.modifiers.add(player, "bullet_speed", modifiers.OVERRIDE, 15, effect)
+                self.modifiers.add(player, "rockets", modifiers.OVERRIDE, True, effect)
                 
         elif effect == "invincibility":
             # Make player invincible
-            # Will be handled in update_effects
-            pass
+            if hasattr(player, 'invincible'):
+                self.modifiers.add(player, "invincible", modifiers.OVERRIDE, True, effect)
             
         elif effect == "car_boost":
             # Boost car speed
-            if hasattr(self.game.player, 'in_vehicle') and self.game.player.in_vehicle:
-                if not hasattr(self, '_original_vehicle_speed'):
-                    self._original_vehicle_speed = self.game.player.in_vehicle.speed
-                
-                # Double vehicle speed
-                self.game.player.in_vehicle.speed *= 2
+            if hasattr(player, 'in_vehicle') and player.in_vehicle:
+                # Double vehicle top speed
+                self.modifiers.add(player.in_vehicle, "max_speed", modifiers.MULTIPLY, 2, effect)
             
         elif effect == "panic_mode":
             # Make all pedestrians panic and run
             for ped in self.game.map.pedestrians:
                 if hasattr(ped, 'ai_state'):
                     ped.ai_state = "flee"
-                    ped.flee_target = self.game.player
+                    ped.flee_target = player
                     
         elif effect == "money_boost":
             # Add money if the player has a money attribute
-            if hasattr(self.game.player, 'money'):
-                self.game.player.money += 500
+            if hasattr(player, 'money'):
+                player.money += 500
             else:
                 # Add money attribute if it doesn't exist
-                self.game.player.money = 500
+                player.money = 500
                 
         elif effect == "no_police":
-            # Remove police temporarily
-            # Store current police to restore later
-            if not hasattr(self, '_stored_police'):
-                self._stored_police = self.game.map.police_vehicles.copy()
-                self.game.map.police_vehicles = []
+            # Remove police temporarily (the current list comes back on expiry)
+            self.modifiers.add(self.game.map, "police_vehicles", modifiers.OVERRIDE, [], effect)
                 
         elif effect == "big_head":
             # Big head mode - affect character rendering scale
             # Set a flag that will be used during rendering
             self.game.big_head_mode = True
     
+    def add_message(self, text, duration):
+        """Show a cheat message for duration ticks"""
+        message = {"text": text}
+        self.cheat_messages.append(message)
+        self.game.scheduler.schedule(duration, self.remove_message, message)
+
+    def remove_message(self, message):
+        """Scheduler callback: hide a cheat message"""
+        if message in self.cheat_messages:
+            self.cheat_messages.remove(message)
+    
     def update(self):
         """Update cheat system state"""
-        # Update sequence timer
-        if self.sequence_timer > 0:
-            self.sequence_timer -= 1
-            
-        # Update active cheats
-        to_remove = []
-        for effect, duration in self.active_cheats.items():
-            self.active_cheats[effect] = duration - 1
-            if duration <= 0:
-                to_remove.append(effect)
-                
-        # Remove expired cheats
-        for effect in to_remove:
-            self.deactivate_cheat(effect)
-            
-        # Update cheat messages
-        messages_to_remove = []
-        for i, message in enumerate(self.cheat_messages):
-            message["timer"] -= 1
-            if message["timer"] <= 0:
-                messages_to_remove.append(i)
-                
-        # Remove expired messages
-        for i in sorted(messages_to_remove, reverse=True):
-            del self.cheat_messages[i]
-            
-        # Update special effects
-        self.update_effects()
-    
-    def update_effects(self):
-        """Update any ongoing cheat effects"""
-        # Rocket launcher effect - modify bullets to be rockets
-        if "rocket_launcher" in self.active_cheats and hasattr(self.game.player, 'bullets'):
-            # Make bullets explode on impact
-            for bullet in self.game.player.bullets:
-                # Check if not already a rocket
-                if not bullet.get("is_rocket", False):
-                    bullet["is_rocket"] = True
-                    bullet["size"] = 8  # Bigger bullet
-                    bullet["color"] = (255, 100, 0)  # Orange color
-                    bullet["damage"] = 3  # More damage
-                    
-                # Handle explosion for rockets that hit something
-                if bullet.get("hit", False) and not bullet.get("exploded", False):
-                    bullet["exploded"] = True
-                    # Add explosion effect
-                    if hasattr(self.game, 'add_explosion'):
-                        self.game.add_explosion(bullet["x"], bullet["y"], 100)
-                    
-                    # Damage everything nearby
-                    radius = 100
-                    # Check vehicles
-                    for vehicle in self.game.map.vehicles + self.game.map.police_vehicles:
-                        dx = vehicle.x - bullet["x"]
-                        dy = vehicle.y - bullet["y"]
-                        dist = math.sqrt(dx*dx + dy*dy)
-                        if dist < radius:
-                            # Apply damage and knockback
-                            if hasattr(vehicle, 'damage'):
-                                vehicle.damage(3)
-                            
-                    # Check pedestrians
-                    for ped in self.game.map.pedestrians:
-                        dx = ped.x - bullet["x"]
-                        dy = ped.y - bullet["y"]
-                        dist = math.sqrt(dx*dx + dy*dy)
-                        if dist < radius:
-                            # Make pedestrian flee
-                            ped.ai_state = "flee"
-                            ped.flee_target = self.game.player
-                            # Damage pedestrian
-                            if hasattr(ped, 'health'):
-                                ped.health -= 1
-        
-        # Invincibility effect
-        if "invincibility" in self.active_cheats:
-            # Store original health if we haven't already
-            if hasattr(self.game.player, 'health') and not hasattr(self, '_original_health'):
-                self._original_health = self.game.player.health
+        # Nothing to do per frame: expiry runs on the game's scheduler,
+        # modified values live on the entities and rockets explode on impact
+        pass
+
+    def explode_rocket(self, bullet):
+        """Blast everything near a rocket's impact point"""
+        x, y = bullet["x"], bullet["y"]
+        radius = 100
+        
+        # Add explosion effect
+        if hasattr(self.game, 'add_explosion'):
+            self.game.add_explosion(x, y, radius)
+        
+        index = self.game.entity_index
+        # Damage vehicles
+        for vehicle in index.query_radius(x, y, radius, "vehicle"):
+            if hasattr(vehicle, 'damage'):
+                vehicle.damage(bullet.get("damage", 3))
                 
-            # Ensure player health stays at maximum
-            if hasattr(self.game.player, 'health'):
-                self.game.player.health = 1000
+        # Pedestrians in the blast flee and get hurt
+        for ped in index.query_radius(x, y, radius, "pedestrian"):
+            if ped.is_dead:
+                continue
+            ped.ai_state = "flee"
+            ped.flee_target = self.game.player
+            if hasattr(ped, 'health'):
+                ped.health -= 1
+                if ped.health <= 0:
+                    ped.is_dead = True
+                    self.game.map.pedestrian_died(ped)
     
     def draw(self, screen, font):
         """Draw cheat-related UI elements"""
@@ -328,7 +365,7 @@ class CheatSystem:
             screen.blit(font.render("Active Cheats:", True, (255, 255, 0)), (10, y_offset))
             y_offset += 20
             
-            for effect, time_left in self.active_cheats.items():
+            for effect, expiry in self.active_cheats.items():
                 # Find cheat name from effect
                 cheat_name = effect
                 for cheat in self.cheats:
@@ -337,7 +374,7 @@ class CheatSystem:
                         break
                 
                 # Convert frames to seconds
-                seconds_left = int(time_left / 60)
+                seconds_left = int(self.game.scheduler.remaining(expiry) / 60)
                 text = f"{cheat_name}: {seconds_left}s"
                 text_surface = font.render(text, True, (200, 200, 50))
                 screen.blit(text_surface, (10, y_offset))
@@ -351,52 +388,22 @@ class CheatSystem:
     
     def deactivate_cheat(self, effect):
         """Deactivate a cheat effect and restore original settings"""
-        if effect == "punch_speed":
-            # Restore original attack speed
-            if hasattr(self, '_original_shoot_cooldown'):
-                self.game.player.shoot_cooldown = self._original_shoot_cooldown
-                delattr(self, '_original_shoot_cooldown')
-                
-        elif effect == "rocket_launcher":
-            # Restore original bullet properties
-            if hasattr(self, '_original_bullet_speed'):
-                self.game.player.bullet_speed = self._original_bullet_speed
-                delattr(self, '_original_bullet_speed')
-                
-        elif effect == "invincibility":
-            # Restore original health
-            if hasattr(self, '_original_health'):
-                self.game.player.health = self._original_health
-                delattr(self, '_original_health')
-                
-        elif effect == "car_boost":
-            # Restore original vehicle speed
-            if hasattr(self, '_original_vehicle_speed') and self.game.player.in_vehicle:
-                self.game.player.in_vehicle.speed = self._original_vehicle_speed
-                delattr(self, '_original_vehicle_speed')
-                
-        elif effect == "no_police":
-            # Restore police
-            if hasattr(self, '_stored_police'):
-                self.game.map.police_vehicles = self._stored_police
-                delattr(self, '_stored_police')
-                
-        elif effect == "big_head":
+        # Drop the cheat's modifiers, which puts the original values back
+        self.modifiers.remove_source(effect)
+        
+        if effect == "big_head":
             # Turn off big head mode
             self.game.big_head_mode = False
             
-        # Remove from active cheats
+        # Remove from active cheats (and drop its timer if it hasn't fired yet)
         if effect in self.active_cheats:
-            del self.active_cheats[effect]
+            self.game.scheduler.cancel(self.active_cheats.pop(effect))
             
         # Add expiration message
         for cheat in self.cheats:
             if cheat["effect"] == effect:
                 message = f"Cheat Expired: {cheat['name']}"
-                self.cheat_messages.append({
-                    "text": message,
-                    "timer": 120  # Show for 2 seconds
-                })
+                self.add_message(message, 120)  # Show for 2 seconds
                 break
     
 
@@ -453,7 +460,7 @@ class DialogueSystem:
     def setup_font(self, size=24):
         """Initialize the font for dialogue"""
         if pygame.font.get_init():
-            self.dialogue_font = pygame.font.SysFont('Arial', size)
+            self.dialogue_font = rendering.font('Arial', size)
     
     def start_dialogue(self, npc):
         """Start a dialogue with an NPC"""
@@ -589,7 +596,7 @@ class DialogueSystem:
             # Draw continue indicator
             if len(self.revealed_text) == len(self.dialogue_lines[self.current_line]):
                 indicator_text = "Press E to continue"
-                indicator_surface = pygame.font.SysFont('Arial', 18).render(indicator_text, True, (200, 200, 200))
+                indicator_surface = rendering.font('Arial', 18).render(indicator_text, True, (200, 200, 200))
                 screen.blit(indicator_surface, (box_x + box_width - indicator_surface.get_width() - 10, 
                                               box_y + box_height - indicator_surface.get_height() - 10))
                 
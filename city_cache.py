@@ -0,0 +1,174 @@
+"""
+City cache for GTA-style South Park Canadian game
+This module stores a generated city (the baked map raster, a collision
+bitmap, the road graph and the wall/road/light geometry) in one file per
+city seed. Processes map the file read-only and wrap it with
+pygame.image.frombuffer and NumPy views instead of copying it, so every game
+instance on a host that uses the same city starts without generating it
+and shares the same physical pages.
+
+File layout (little-endian):
+    header: magic "GTAC", version (u16), chunk count (u16), city seed (u64),
+            width (u32), height (u32), pixel format (4s)
+    table:  chunk count x (offset (u64), length (u64)), in CHUNKS order
+    chunks: raster (width x height BGRA pixels, page aligned),
+            collision (width x height u8, 1 = wall), walls (N x 4 i32),
+            roads (N x 5 i32: rect and horizontal flag),
+            lights (N x 4 i32: position, horizontal green, timer),
+            road nodes (N x 2 i32), road edges (N x 3 i32: node, node, length),
+            blocks (JSON)
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+import pygame
+
+MAGIC = b"GTAC"
+VERSION = 2
+PIXEL_FORMAT = b"BGRA"  # Byte order of a little-endian XRGB display surface
+
+HEADER = struct.Struct("<4sHHQII4s")
+CHUNK = struct.Struct("<QQ")
+CHUNKS = ("raster", "collision", "walls", "roads", "lights", "road_nodes", "road_edges", "blocks")
+
+# Where cache files live (override with GAME_CACHE_DIR, e.g. a tmpfs)
+CACHE_DIR = os.environ.get("GAME_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gta_city_cache"))
+
+def cache_path(seed, width, height):
+    return os.path.join(CACHE_DIR, f"city-{seed:016x}-{width}x{height}.bin")
+
+def collision_bitmap(walls, width, height):
+    """(height, width) uint8 array with 1 on every wall pixel"""
+    bitmap = np.zeros((height, width), dtype=np.uint8)
+    for wall in walls:
+        rect = wall["rect"].clip(0, 0, width, height)
+        bitmap[rect.top:rect.bottom, rect.left:rect.right] = 1
+    return bitmap
+
+def road_graph(roads):
+    """Intersections and the road segments between them
+
+    Returns (nodes, edges): nodes is (N, 2) int32 intersection centres,
+    edges is (E, 3) int32 rows of (node, node, length) linking neighbouring
+    intersections along the same road.
+    """
+    rows = sorted({road["rect"].centery for road in roads if road["horizontal"]})
+    columns = sorted({road["rect"].centerx for road in roads if not road["horizontal"]})
+    nodes = np.array([(x, y) for y in rows for x in columns], dtype=np.int32).reshape(-1, 2)
+
+    edges = []
+    for r in range(len(rows)):
+        for c in range(len(columns)):
+            node = r * len(columns) + c
+            if c + 1 < len(columns):
+                edges.append((node, node + 1, columns[c + 1] - columns[c]))
+            if r + 1 < len(rows):
+                edges.append((node, node + len(columns), rows[r + 1] - rows[r]))
+    return nodes, np.array(edges, dtype=np.int32).reshape(-1, 3)
+
+def save_city(game_map, seed):
+    """Write the map's city to the cache; returns the path, or None if it can't be written"""
+    return write_city(city_chunks(game_map), seed, game_map.width, game_map.height)
+
+def city_chunks(game_map, raster=True):
+    """The cache file's chunks as the city is now (safe to write from another thread)
+
+    With raster=False the "raster" chunk is left out, to be added once the
+    map image is finished.
+    """
+    lights = getattr(game_map, 'traffic_lights', [])
+    chunks = {
+        "collision": game_map.collision,
+        "walls": np.array([tuple(wall["rect"]) for wall in game_map.walls], dtype=np.int32),
+        "roads": np.array([tuple(road["rect"]) + (road["horizontal"],) for road in game_map.roads],
+                          dtype=np.int32),
+        "lights": np.array([light["position"] + (light["horizontal_green"], light["timer"])
+                            for light in lights], dtype=np.int32),
+        "road_nodes": game_map.road_nodes,
+        "road_edges": game_map.road_edges,
+        "blocks": json.dumps([{"rect": tuple(block["rect"]), "type": block["type"], "subtype": block["subtype"]}
+                              for block in game_map.blocks]).encode("utf-8"),
+    }
+    if raster:
+        chunks["raster"] = pygame.image.tobytes(game_map.map_image, "BGRA")
+    return chunks
+
+def write_city(chunks, seed, width, height):
+    """Write a city's chunks to its cache file; returns the path, or None if it can't be written"""
+    # Raster first, on a page boundary so it can be mapped straight into surfaces
+    table_end = HEADER.size + CHUNK.size * len(CHUNKS)
+    offset = -(-table_end // mmap.ALLOCATIONGRANULARITY) * mmap.ALLOCATIONGRANULARITY
+    table = []
+    for name in CHUNKS:
+        data = chunks[name]
+        length = data.nbytes if isinstance(data, np.ndarray) else len(data)
+        table.append((offset, length))
+        offset += -(-length // 8) * 8  # Keep arrays 8-byte aligned
+
+    path = cache_path(seed, width, height)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write beside the final name and rename, so other instances never map half a file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(CHUNKS), seed, width, height, PIXEL_FORMAT))
+            for entry in table:
+                f.write(CHUNK.pack(*entry))
+            for name, (chunk_offset, _) in zip(CHUNKS, table):
+                f.seek(chunk_offset)
+                data = chunks[name]
+                f.write(np.ascontiguousarray(data).tobytes() if isinstance(data, np.ndarray) else data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not write city cache {path}: {e}")
+        return None
+    return path
+
+def load_city(game_map, seed):
+    """Map a cached city into game_map; returns False if there is no usable cache file"""
+    path = cache_path(seed, game_map.width, game_map.height)
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return False
+
+    if len(data) < HEADER.size + CHUNK.size * len(CHUNKS):
+        return False
+    magic, version, chunk_count, file_seed, width, height, pixel_format = HEADER.unpack_from(data)
+    if (magic != MAGIC or version != VERSION or chunk_count != len(CHUNKS) or file_seed != seed
+            or (width, height) != (game_map.width, game_map.height) or pixel_format != PIXEL_FORMAT):
+        print(f"Ignoring stale city cache {path}")
+        return False
+    table = [CHUNK.unpack_from(data, HEADER.size + i * CHUNK.size) for i in range(chunk_count)]
+    if any(offset + length > len(data) for offset, length in table):
+        print(f"Ignoring truncated city cache {path}")
+        return False
+    chunks = dict(zip(CHUNKS, table))
+
+    def array(name, dtype, columns):
+        offset, length = chunks[name]
+        return np.frombuffer(data, dtype, length // np.dtype(dtype).itemsize, offset).reshape(-1, columns)
+
+    # The raster surface and collision view point into the shared mapping (no copies)
+    offset, length = chunks["raster"]
+    game_map.map_image = pygame.image.frombuffer(memoryview(data)[offset:offset + length], (width, height), "BGRA")
+    game_map.map_image.set_alpha(None)  # Opaque: blit as a plain copy
+    game_map.collision = array("collision", np.uint8, width)
+    game_map.road_nodes = array("road_nodes", np.int32, 2)
+    game_map.road_edges = array("road_edges", np.int32, 3)
+    game_map.city_file = data  # Keep the mapping open as long as the map
+
+    game_map.walls = [{"rect": pygame.Rect(rect)} for rect in array("walls", np.int32, 4).tolist()]
+    game_map.roads = [{"rect": pygame.Rect(x, y, w, h), "horizontal": bool(horizontal)}
+                      for x, y, w, h, horizontal in array("roads", np.int32, 5).tolist()]
+    game_map.traffic_lights = [{"position": (x, y), "horizontal_green": bool(green), "timer": timer}
+                               for x, y, green, timer in array("lights", np.int32, 4).tolist()]
+    offset, length = chunks["blocks"]
+    game_map.blocks = [{"rect": pygame.Rect(block["rect"]), "type": block["type"], "subtype": block["subtype"]}
+                       for block in json.loads(bytes(data[offset:offset + length]).decode("utf-8"))]
+    return True
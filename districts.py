@@ -0,0 +1,443 @@
+"""
+District simulation for GTA-style South Park Canadian game
+This module splits the city into districts on the procedural generator's
+block grid and simulates the traffic lights and pedestrians of each group
+of districts in a worker process. The main process keeps the player, the
+police, civilian traffic (cars follow whole lanes across districts, see
+traffic.py; the workers only see them as obstacles) and rendering.
+
+Every tick the main process publishes the entities into input tables in one
+shared memory block, the workers update the rows their districts own with
+the game's own AI code and write them to output tables, and the main process
+copies the results back onto its objects. Each row's owner is worked out
+from its position when it is published, so an entity that crossed a district
+boundary is handed to the neighbouring worker on the next tick.
+
+Workers are forked (they inherit the city geometry and the shared tables)
+and step in lockstep behind a barrier. Each worker reseeds its RNG from the
+world seed, the tick and its index, so a session replays exactly with the
+same worker count. Anything the tables can't describe (unknown AI states,
+rows beyond the tables' capacity) is updated by the main process after the
+workers finish.
+"""
+import multiprocessing
+import random
+import threading
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+import pygame
+
+import procedural_map
+
+DISTRICT_SIZE = procedural_map.BLOCK_SIZE
+
+# Row owners besides worker indexes
+OWNER_MAIN = -1  # Updated by the main process after the workers
+OWNER_NONE = -2  # Not updated this tick (dead pedestrians); only seen by others
+
+# Entity references (the vehicle table's row, or one of these)
+REF_NONE = -1
+REF_PLAYER = -2
+
+DIRECTIONS = ("up", "down", "left", "right")
+AI_STATES = ("wander", "wait", "flee")
+
+# Pedestrians this close to a worker's districts can get in its pedestrians' way
+NEAR_MARGIN = 32
+
+BARRIER_TIMEOUT = 10.0  # Seconds before a stuck worker counts as dead
+
+HEADER = np.dtype([
+    ("tick", "i8"), ("seed", "u8"), ("stop", "u1"),
+    ("pedestrians", "i4"), ("vehicles", "i4"), ("lights", "i4"), ("bullets", "i4"),
+    ("player_x", "f8"), ("player_y", "f8"), ("player_armed", "u1"), ("player_vehicle", "i4"),
+])
+PEDESTRIAN = np.dtype([
+    ("owner", "i2"), ("direction", "u1"), ("ai_state", "u1"), ("moving", "u1"), ("dead", "u1"),
+    ("x", "f8"), ("y", "f8"), ("speed", "f8"), ("size", "f8"), ("frame", "f8"), ("frame_speed", "f8"),
+    ("ai_timer", "i4"), ("health", "i4"), ("flee", "i4"),
+    ("hit", "i4"), ("wanted", "f8"),  # Output only: bullet that killed it, wanted level it added
+])
+VEHICLE = np.dtype([("x", "f8"), ("y", "f8"), ("speed", "f8"), ("width", "f8"), ("height", "f8")])
+LIGHT = np.dtype([("owner", "i2"), ("x", "i4"), ("y", "i4"), ("green", "u1"), ("timer", "i4")])
+BULLET = np.dtype([("x", "f8"), ("y", "f8")])
+
+class SharedTables:
+    """Named NumPy tables laid out in one shared memory block"""
+    def __init__(self, specs):
+        offsets = {}
+        size = 0
+        for name, dtype, count in specs:
+            offsets[name] = size
+            size += -(-dtype.itemsize * count // 8) * 8
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, 8))
+        self.names = []
+        for name, dtype, count in specs:
+            setattr(self, name, np.ndarray((count,), dtype, buffer=self.memory.buf, offset=offsets[name]))
+            self.names.append(name)
+
+    def close(self):
+        # Views into the block must go before it can be closed
+        for name in self.names:
+            setattr(self, name, None)
+        self.memory.close()
+        self.memory.unlink()
+
+def partition(columns, rows, workers):
+    """(rows, columns) worker index of each district: contiguous runs, column by column"""
+    count = columns * rows
+    order = np.arange(count) * workers // count
+    return order.reshape(columns, rows).T.astype(np.int16)
+
+def owner_at(owners, x, y):
+    """Worker index owning each (x, y) position"""
+    rows, columns = owners.shape
+    column = np.clip(np.asarray(x) // DISTRICT_SIZE, 0, columns - 1).astype(np.intp)
+    row = np.clip(np.asarray(y) // DISTRICT_SIZE, 0, rows - 1).astype(np.intp)
+    return owners[row, column]
+
+def near_districts(owners, index, x, y, margin=NEAR_MARGIN):
+    """Mask of positions within margin of a district the worker owns"""
+    # A square smaller than a district that overlaps one has a corner inside it
+    near = np.zeros(len(x), dtype=bool)
+    for dx in (-margin, margin):
+        for dy in (-margin, margin):
+            near |= owner_at(owners, x + dx, y + dy) == index
+    return near
+
+class Body:
+    """What the AI needs to know about an entity another process updates"""
+    __slots__ = ("x", "y", "speed", "rect")
+
+    def __init__(self, x, y, width, height, speed=0):
+        self.x = x
+        self.y = y
+        self.speed = speed
+        self.rect = pygame.Rect(x - width/2, y - height/2, width, height)
+
+class PlayerView:
+    """The player as the workers see it; records what pedestrians did to it"""
+    def __init__(self, x, y, has_weapon, in_vehicle):
+        self.x = x
+        self.y = y
+        self.has_weapon = has_weapon
+        self.in_vehicle = in_vehicle
+        self.bullets = []
+        self.wanted_level = 0.0  # Added this tick
+        self.hit = -1
+
+    def bullet_hit(self, bullet):
+        self.hit = bullet["index"]
+
+class DistrictSimulation:
+    """Worker processes that each simulate a group of districts, and the tables they share"""
+    def __init__(self, game_map, workers, seed, classes, context):
+        self.map = game_map
+        self.workers = workers
+        self.seed = seed
+        self.classes = classes
+
+        self.columns = -(-game_map.width // DISTRICT_SIZE)
+        self.rows = -(-game_map.height // DISTRICT_SIZE)
+        self.owners = partition(self.columns, self.rows, workers)
+
+        # Room for the city to grow; rows past the end are updated by the main process
+        vehicle_count = len(game_map.vehicles) + len(game_map.police_vehicles) + 1
+        self.pedestrian_capacity = max(256, len(game_map.pedestrians) * 4)
+        self.vehicle_capacity = max(128, vehicle_count * 4)
+        self.bullet_capacity = 256
+        lights = getattr(game_map, 'traffic_lights', [])
+        self.tables = SharedTables([
+            ("header", HEADER, 1),
+            ("pedestrians_in", PEDESTRIAN, self.pedestrian_capacity),
+            ("pedestrians_out", PEDESTRIAN, self.pedestrian_capacity),
+            ("vehicles_in", VEHICLE, self.vehicle_capacity),
+            ("lights_in", LIGHT, len(lights)),
+            ("lights_out", LIGHT, len(lights)),
+            ("bullets", BULLET, self.bullet_capacity),
+        ])
+
+        # Lights never move, so their owners are fixed
+        table = self.tables.lights_in
+        for i, light in enumerate(lights):
+            table[i] = (0, light['position'][0], light['position'][1], 0, 0)
+        if len(lights):
+            table["owner"] = owner_at(self.owners, table["x"], table["y"])
+
+        # What was published this tick, to map results back onto objects
+        self.vehicle_list = []
+        self.vehicle_refs = {}
+        self.pedestrian_list = []
+        self.bullet_list = []
+
+        self.barrier = context.Barrier(workers + 1)
+        self.processes = []
+        for index in range(workers):
+            process = context.Process(target=run_worker, name=f"district-{index}", daemon=True,
+                                      args=(index, self.tables, self.barrier, self.owners, game_map.walls,
+                                            game_map.pedestrian_paths(), classes))
+            process.start()
+            self.processes.append(process)
+
+    @classmethod
+    def start(cls, game_map, workers, seed, classes):
+        """Start the workers; returns None if this platform can't fork them"""
+        if "fork" not in multiprocessing.get_all_start_methods():
+            print("District workers need the fork start method; simulating the city in one process")
+            return None
+        return cls(game_map, workers, seed, classes, multiprocessing.get_context("fork"))
+
+    def step(self, player):
+        """Simulate one tick in the workers; returns False if they have stopped"""
+        game_map = self.map
+        self.publish_vehicles(player)
+        main_pedestrians = self.publish_pedestrians(player)
+        self.publish_world(player)
+
+        try:
+            self.barrier.wait(BARRIER_TIMEOUT)  # Workers start
+            self.barrier.wait(BARRIER_TIMEOUT)  # Workers are done
+        except threading.BrokenBarrierError:
+            self.close()
+            return False
+
+        self.collect_lights()
+        self.collect_pedestrians(player)
+
+        # Rows the workers couldn't take, in the order the single-process update would run them
+        if main_pedestrians:
+            vehicles = game_map.vehicles + game_map.police_vehicles + ([player.in_vehicle] if player.in_vehicle else [])
+            for pedestrian in main_pedestrians:
+                pedestrian.update_ai(player, game_map.walls, game_map.pedestrian_paths(), vehicles,
+                                     player.bullets, game_map.pedestrians, game_map.pedestrian_died)
+        return True
+
+    # Publishing (main process, while the workers wait)
+
+    def publish_vehicles(self, player):
+        """Fill the vehicle table (the workers' pedestrians only need to dodge them)"""
+        game_map = self.map
+        vehicles = list(game_map.vehicles) + list(game_map.police_vehicles)
+        if player.in_vehicle is not None and player.in_vehicle not in vehicles:
+            vehicles.append(player.in_vehicle)
+        self.vehicle_list = vehicles[:self.vehicle_capacity]
+        self.tables.vehicles_in[:len(self.vehicle_list)] = [
+            (vehicle.x, vehicle.y, vehicle.speed, *self.vehicle_size(vehicle)) for vehicle in self.vehicle_list]
+        self.vehicle_refs = {id(vehicle): i for i, vehicle in enumerate(self.vehicle_list)}
+
+    @staticmethod
+    def vehicle_size(vehicle):
+        size = vehicle.size
+        return size if isinstance(size, tuple) else (size, size)
+
+    def publish_pedestrians(self, player):
+        """Fill the pedestrian table; returns the pedestrians left to this process"""
+        pedestrians = self.map.pedestrians
+        main_pedestrians = []
+        rows = []
+        for pedestrian in pedestrians[:self.pedestrian_capacity]:
+            flee = self.ref(pedestrian.flee_target, player)
+            if pedestrian.is_dead:
+                owner = OWNER_NONE
+            elif (pedestrian.ai_state not in AI_STATES or pedestrian.direction not in DIRECTIONS
+                  or flee is None):
+                owner = OWNER_MAIN
+                main_pedestrians.append(pedestrian)
+            else:
+                owner = 0  # Assigned by position below
+            rows.append((owner,
+                         DIRECTIONS.index(pedestrian.direction) if pedestrian.direction in DIRECTIONS else 0,
+                         AI_STATES.index(pedestrian.ai_state) if pedestrian.ai_state in AI_STATES else 0,
+                         pedestrian.moving, pedestrian.is_dead, pedestrian.x, pedestrian.y, pedestrian.speed,
+                         pedestrian.size, pedestrian.animation_frame, pedestrian.animation_speed,
+                         pedestrian.ai_timer, pedestrian.health, REF_NONE if flee is None else flee, -1, 0.0))
+        main_pedestrians.extend(pedestrian for pedestrian in pedestrians[len(rows):] if not pedestrian.is_dead)
+
+        table = self.tables.pedestrians_in
+        table[:len(rows)] = rows
+        self.assign_owners(table[:len(rows)])
+        self.pedestrian_list = pedestrians[:len(rows)]
+        return main_pedestrians
+
+    def publish_world(self, player):
+        game_map = self.map
+        self.bullet_list = player.bullets[:self.bullet_capacity]
+        self.tables.bullets[:len(self.bullet_list)] = [(bullet["x"], bullet["y"]) for bullet in self.bullet_list]
+
+        lights = getattr(game_map, 'traffic_lights', [])
+        table = self.tables.lights_in
+        table["green"] = [light['horizontal_green'] for light in lights]
+        table["timer"] = [light['timer'] for light in lights]
+
+        vehicle = self.ref(player.in_vehicle, player)
+        header = self.tables.header
+        header[0] = (game_map.scheduler.tick, self.seed, 0,
+                     len(self.pedestrian_list), len(self.vehicle_list), len(lights), len(self.bullet_list),
+                     player.x, player.y, player.has_weapon, REF_NONE if vehicle is None else vehicle)
+
+    def assign_owners(self, rows):
+        """Hand rows the workers take to the worker owning their district"""
+        take = rows["owner"] >= 0
+        if take.any():
+            rows["owner"][take] = owner_at(self.owners, rows["x"][take], rows["y"][take])
+
+    def ref(self, entity, player):
+        """Table reference for an entity, or None if the tables can't describe it"""
+        if entity is None:
+            return REF_NONE
+        if entity is player:
+            return REF_PLAYER
+        return self.vehicle_refs.get(id(entity))
+
+    # Collecting (main process, once the workers are done)
+
+    def collect_lights(self):
+        lights = getattr(self.map, 'traffic_lights', [])
+        for light, (green, timer) in zip(lights, self.tables.lights_out[["green", "timer"]][:len(lights)].tolist()):
+            light['horizontal_green'] = bool(green)
+            light['timer'] = timer
+
+    def collect_pedestrians(self, player):
+        count = len(self.pedestrian_list)
+        owners = self.tables.pedestrians_in["owner"][:count]
+        results = self.tables.pedestrians_out[:count]
+        consumed = set()
+        for row in np.flatnonzero(owners >= 0).tolist():
+            pedestrian = self.pedestrian_list[row]
+            (_, direction, ai_state, moving, dead, x, y, _, size, frame, _,
+             ai_timer, health, flee, hit, wanted) = results[row].tolist()
+            if hit >= 0 and hit in consumed:
+                # Two workers saw the same bullet hit; it only kills the first, so this
+                # pedestrian keeps the state it had (and adds no wanted level) this tick
+                continue
+            pedestrian.direction = DIRECTIONS[direction]
+            pedestrian.ai_state = AI_STATES[ai_state]
+            pedestrian.moving = bool(moving)
+            if dead and not pedestrian.is_dead:
+                self.map.pedestrian_died(pedestrian)
+            pedestrian.is_dead = bool(dead)
+            if (x, y) != (pedestrian.x, pedestrian.y):
+                pedestrian.x, pedestrian.y = x, y
+                pedestrian.rect = pygame.Rect(x - size/2, y - size/2, size, size)
+            pedestrian.animation_frame = frame
+            pedestrian.ai_timer = ai_timer
+            pedestrian.health = health
+            pedestrian.flee_target = self.resolve(flee, player)
+
+            if hit >= 0:
+                consumed.add(hit)
+                bullet = self.bullet_list[hit]
+                if bullet in player.bullets:
+                    player.bullets.remove(bullet)
+                player.bullet_hit(bullet)
+            player.wanted_level += wanted
+
+    def resolve(self, ref, player):
+        if ref == REF_PLAYER:
+            return player
+        if 0 <= ref < len(self.vehicle_list):
+            return self.vehicle_list[ref]
+        return None
+
+    def close(self):
+        """Stop the workers and free the shared tables"""
+        if self.tables is None:
+            return
+        self.tables.header["stop"] = 1
+        try:
+            self.barrier.wait(BARRIER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+        for process in self.processes:
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+        self.tables.close()
+        self.tables = None
+
+# Workers
+
+def run_worker(index, tables, barrier, owners, walls, paths, classes):
+    """Worker process: simulate this worker's districts once per tick until told to stop"""
+    try:
+        while True:
+            barrier.wait()
+            if tables.header["stop"][0]:
+                return
+            simulate_districts(index, tables, owners, walls, paths, classes)
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        return
+    except Exception:
+        traceback.print_exc()
+        barrier.abort()  # Wake the main process instead of leaving it waiting
+
+def simulate_districts(index, tables, owners, walls, paths, classes):
+    """One tick of the lights and pedestrians this worker owns"""
+    header = tables.header[0]
+    random.seed((int(header["seed"]) * 1000003 + int(header["tick"])) * 1024 + index)
+
+    # Lights after this tick's change (worked out for all of them; only ours are written back)
+    lights_in = tables.lights_in[:int(header["lights"])]
+    green = lights_in["green"].astype(bool)
+    timers = lights_in["timer"] + 1
+    change = timers >= 180  # Individual light changes every 3 seconds
+    timers[change] = 0
+    green[change] = ~green[change]
+    mine = lights_in["owner"] == index
+    lights_out = tables.lights_out[:len(lights_in)]
+    lights_out["green"][mine] = green[mine]
+    lights_out["timer"][mine] = timers[mine]
+
+    # Vehicles are obstacles where the main process left them
+    vehicles = [Body(x, y, width, height, speed)
+                for x, y, speed, width, height in tables.vehicles_in[:int(header["vehicles"])].tolist()]
+
+    vehicle_ref = int(header["player_vehicle"])
+    player = PlayerView(float(header["player_x"]), float(header["player_y"]), bool(header["player_armed"]),
+                        vehicles[vehicle_ref] if vehicle_ref >= 0 else None)
+    bullets = tables.bullets[:int(header["bullets"])]
+    refs = {id(vehicle): i for i, vehicle in enumerate(vehicles)}
+    refs[id(player)] = REF_PLAYER
+
+    # Pedestrians: ours run the real AI, the rest nearby only block the way (in table
+    # order, so the first one bumped into is the same as in the single-process update)
+    pedestrian_class = classes["pedestrian"]
+    pedestrians = []
+    ours = []
+    table = tables.pedestrians_in[:int(header["pedestrians"])]
+    rows = np.flatnonzero((table["owner"] == index) | near_districts(owners, index, table["x"], table["y"]))
+    for row, (owner, direction, ai_state, moving, dead, x, y, speed, size, frame, frame_speed,
+              ai_timer, health, flee, _, _) in zip(rows.tolist(), table[rows].tolist()):
+        if owner != index:
+            pedestrians.append(Body(x, y, size, size))
+            continue
+        pedestrian = pedestrian_class.__new__(pedestrian_class)
+        pedestrian.x, pedestrian.y, pedestrian.speed, pedestrian.size = x, y, speed, size
+        pedestrian.rect = pygame.Rect(x - size/2, y - size/2, size, size)
+        pedestrian.direction = DIRECTIONS[direction]
+        pedestrian.ai_state = AI_STATES[ai_state]
+        pedestrian.moving = bool(moving)
+        pedestrian.is_dead = bool(dead)
+        pedestrian.animation_frame, pedestrian.animation_speed = frame, frame_speed
+        pedestrian.ai_timer, pedestrian.health = ai_timer, health
+        pedestrian.flee_target = (player if flee == REF_PLAYER
+                                  else vehicles[flee] if 0 <= flee < len(vehicles) else None)
+        pedestrian.despawn_timer = None
+        pedestrians.append(pedestrian)
+        ours.append((row, pedestrian))
+
+    # A bullet stops in the first of our pedestrians it hits, as in the single-process update
+    player.bullets = [{"x": x, "y": y, "index": i} for i, (x, y) in enumerate(bullets.tolist())]
+    pedestrians_out = tables.pedestrians_out
+    for row, pedestrian in ours:
+        player.wanted_level = 0.0
+        player.hit = -1
+        pedestrian.update_ai(player, walls, paths, vehicles, player.bullets, pedestrians)
+        pedestrians_out[row] = (index, DIRECTIONS.index(pedestrian.direction), AI_STATES.index(pedestrian.ai_state),
+                                pedestrian.moving, pedestrian.is_dead, pedestrian.x, pedestrian.y, pedestrian.speed,
+                                pedestrian.size, pedestrian.animation_frame, pedestrian.animation_speed,
+                                pedestrian.ai_timer, pedestrian.health,
+                                refs.get(id(pedestrian.flee_target), REF_NONE), player.hit, player.wanted_level)
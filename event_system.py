@@ -3,306 +3,294 @@ Escalating Event System for GTA-style South Park Canadian game
 This module implements random events that trigger when the player lingers,
 gradually escalating in chaos and crime.
 """
+import os
+import json
 import random
 import math
+import functools
 import pygame
+import numpy as np
+import spatial_index
+
+# Declarative event templates, compiled into EventAction objects at load time
+EVENT_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "event_templates.json")
+
+class EventAction:
+    """A template action compiled to a handler with its arguments bound"""
+    __slots__ = ("handler", "args")
+
+    def __init__(self, handler, *args):
+        self.handler = handler
+        self.args = args
+
+    def __call__(self, event_x, event_y):
+        self.handler(*self.args, event_x, event_y)
 
 class EventSystem:
     """Manages escalating events that occur around the player"""
     def __init__(self, game):
         self.game = game
         self.active_events = []
-        self.event_cooldown = 0
+        self.cooldown_until = 0  # Scheduler tick when events may trigger again
         self.min_cooldown = 600  # 10 seconds at 60 fps
         self.event_regions = []  # Regions where events can trigger
-        self.player_time_in_region = {}  # Time spent in each region
+
+        # Region types for the generator's park/parking/special blocks
+        self.block_region_types = {
+            "park": "park",
+            "parking": "plaza"
+        }
+        self.special_region_types = {
+            "police": "police_station",
+            "mall": "bank",
+            "entertainment": "high_value"
+        }
+
+        # Raster labels for classify_regions (0 is street)
+        self.block_labels = {
+            None: 1,  # Ordinary building block
+            "park": 2,
+            "plaza": 3,
+            "police_station": 4,
+            "bank": 5,
+            "high_value": 6
+        }
+
+        # Region types when the map has no block data, banks and police stations less common
+        self.fallback_region_types = [
+            "street_corner", "intersection", "alley", "park", 
+            "plaza", "bank", "police_station", "dark_area",
+            "high_value", "bad_neighborhood", "highway", "road",
+            "forest"
+        ]
+        self.fallback_region_weights = [10, 10, 8, 6, 5, 2, 2, 7, 3, 5, 4, 10, 3]
+
+        # Private RNG so region classification never reseeds the global one
+        # (seeded by the game so replays classify regions the same way)
+        seeds = getattr(game, 'seeds', None)
+        self.region_rng = random.Random(seeds["regions"] if seeds else None)
+
+        self.current_region_id = None  # Region the player is in
+        self.region_entered_tick = 0  # Scheduler tick when they entered it
         self.hovering_threshold = 300  # 5 seconds before events start triggering
         
-        # Initialize event templates
+        # Spawn handlers for each entity type an action can name
+        self.entity_spawners = {
+            "police": self.spawn_police,
+            "swat": self.spawn_swat,
+            "vehicle": self.spawn_vehicle
+        }
+        for entity_type in ["cultist", "mime", "gang_member", "angry_driver", "rival_gang"]:
+            self.entity_spawners[entity_type] = functools.partial(
+                self.spawn_special_pedestrian, entity_type=entity_type)
+
+        # Initialize event templates (compiled) and index them by region type
         self.event_templates = self.initialize_event_templates()
+        self.templates_by_location = self.index_templates_by_location()
         
         # Initialize event regions
         self.initialize_event_regions()
     
     def initialize_event_templates(self):
-        """Define templates for different types of escalating events"""
+        """Load event templates from the data file and compile their actions"""
+        try:
+            with open(EVENT_TEMPLATES_PATH) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading event templates from {EVENT_TEMPLATES_PATH}: {e}")
+            return []
+
         templates = []
-        
-        # Suspicious Activity / Police Escalation
-        templates.append({
-            "name": "Police Escalation",
-            "trigger_locations": ["bank", "police_station", "high_value"],
-            "stages": [
-                {
-                    "description": "Suspicious Activity Reported",
-                    "duration": 600,  # 10 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "police", "count": 1, "distance": 300},
-                        {"type": "message", "text": "Someone reported suspicious activity, eh!"}
-                    ]
-                },
-                {
-                    "description": "Police Investigation",
-                    "duration": 900,  # 15 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "police", "count": 2, "distance": 250},
-                        {"type": "message", "text": "The Mounties are investigating the area!"}
-                    ]
-                },
-                {
-                    "description": "SWAT Team Deployed",
-                    "duration": 1200,  # 20 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "police", "count": 4, "distance": 200},
-                        {"type": "spawn_entity", "entity": "swat", "count": 2, "distance": 350},
-                        {"type": "message", "text": "SWAT team has been deployed, buddy!"}
-                    ]
-                }
-            ]
-        })
-        
-        # Cult Gathering
-        templates.append({
-            "name": "Cult Gathering",
-            "trigger_locations": ["alley", "dark_area", "forest"],
-            "stages": [
-                {
-                    "description": "Strange Chanting",
-                    "duration": 600,  # 10 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "cultist", "count": 3, "distance": 200},
-                        {"type": "message", "text": "You hear strange chanting nearby..."}
-                    ]
-                },
-                {
-                    "description": "Cult Ritual",
-                    "duration": 900,  # 15 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "cultist", "count": 5, "distance": 180},
-                        {"type": "effect", "name": "strange_lights", "duration": 900},
-                        {"type": "message", "text": "The cultists are performing some kind of ritual!"}
-                    ]
-                },
-                {
-                    "description": "Cult Hunt",
-                    "duration": 1200,  # 20 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "cultist", "count": 8, "distance": 150},
-                        {"type": "effect", "name": "strange_lights", "duration": 1200},
-                        {"type": "message", "text": "The cultists have spotted you! They're coming for you, guy!"}
-                    ]
-                }
-            ]
-        })
-        
-        # Street Performer Revenge
-        templates.append({
-            "name": "Mime Riot",
-            "trigger_locations": ["park", "street_corner", "plaza"],
-            "stages": [
-                {
-                    "description": "Street Performers",
-                    "duration": 600,  # 10 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "mime", "count": 2, "distance": 150},
-                        {"type": "message", "text": "Street performers are doing their thing..."}
-                    ]
-                },
-                {
-                    "description": "Mime Congregation",
-                    "duration": 900,  # 15 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "mime", "count": 5, "distance": 130},
-                        {"type": "message", "text": "More mimes are silently gathering..."}
-                    ]
-                },
-                {
-                    "description": "Silent Riot",
-                    "duration": 1200,  # 20 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "mime", "count": 10, "distance": 100},
-                        {"type": "effect", "name": "mime_rage", "duration": 1200},
-                        {"type": "message", "text": "The mimes are rioting! Silently but deadly!"}
-                    ]
-                }
-            ]
-        })
-        
-        # Road Rage Event
-        templates.append({
-            "name": "Road Rage",
-            "trigger_locations": ["intersection", "highway", "road"],
-            "stages": [
-                {
-                    "description": "Traffic Jam",
-                    "duration": 600,  # 10 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "vehicle", "count": 4, "distance": 200},
-                        {"type": "message", "text": "Traffic is backing up..."}
-                    ]
-                },
-                {
-                    "description": "Angry Drivers",
-                    "duration": 900,  # 15 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "vehicle", "count": 6, "distance": 180},
-                        {"type": "effect", "name": "honking", "duration": 900},
-                        {"type": "message", "text": "Drivers are getting angry, friend!"}
-                    ]
-                },
-                {
-                    "description": "Road Rage Chaos",
-                    "duration": 1200,  # 20 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "angry_driver", "count": 4, "distance": 150},
-                        {"type": "spawn_entity", "entity": "vehicle", "count": 8, "distance": 130},
-                        {"type": "effect", "name": "honking", "duration": 1200},
-                        {"type": "message", "text": "Full-on road rage! Cars are going crazy, guy!"}
-                    ]
-                }
-            ]
-        })
-        
-        # Gang Activity
-        templates.append({
-            "name": "Gang Activity",
-            "trigger_locations": ["alley", "dark_area", "bad_neighborhood"],
-            "stages": [
-                {
-                    "description": "Gang Members Appear",
-                    "duration": 600,  # 10 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "gang_member", "count": 3, "distance": 200},
-                        {"type": "message", "text": "Some suspicious characters have spotted you..."}
-                    ]
-                },
-                {
-                    "description": "Gang Confrontation",
-                    "duration": 900,  # 15 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "gang_member", "count": 5, "distance": 150},
-                        {"type": "message", "text": "The gang members are confronting you, buddy!"}
-                    ]
-                },
-                {
-                    "description": "Gang War",
-                    "duration": 1200,  # 20 seconds
-                    "actions": [
-                        {"type": "spawn_entity", "entity": "gang_member", "count": 8, "distance": 130},
-                        {"type": "spawn_entity", "entity": "rival_gang", "count": 6, "distance": 200},
-                        {"type": "message", "text": "A full-on gang war has erupted!"}
-                    ]
-                }
-            ]
-        })
-        
+        for template in data.get("templates", []):
+            stages = []
+            for stage in template["stages"]:
+                actions = [self.compile_action(action) for action in stage["actions"]]
+                stages.append({
+                    "description": stage["description"],
+                    "duration": stage["duration"],
+                    "actions": [action for action in actions if action is not None]
+                })
+            templates.append({
+                "name": template["name"],
+                "trigger_locations": list(template["trigger_locations"]),
+                "stages": stages
+            })
         return templates
+
+    def index_templates_by_location(self):
+        """Map each region type to the templates that can trigger there"""
+        templates_by_location = {}
+        for template in self.event_templates:
+            for location in template["trigger_locations"]:
+                templates_by_location.setdefault(location, []).append(template)
+        return templates_by_location
+
+    def compile_action(self, action):
+        """Turn an action dict into an EventAction with its handler bound up front"""
+        action_type = action.get("type")
+        if action_type == "spawn_entity":
+            spawner = self.entity_spawners.get(action["entity"])
+            if spawner is None:
+                print(f"Unknown event entity: {action['entity']}")
+                return None
+            return EventAction(self.spawn_entities, spawner, action["count"], action["distance"])
+        elif action_type == "message":
+            return EventAction(self.show_message_action, action["text"])
+        elif action_type == "effect":
+            return EventAction(self.apply_effect, action)
+
+        print(f"Unknown event action type: {action_type}")
+        return None
     
     def initialize_event_regions(self):
         """Define regions where events can trigger"""
-        # In a real implementation, this would analyze the map
-        # For now, we'll create regions based on the map's size
-        
         # Get map size
         map_width = getattr(self.game.map, 'width', 2400)
         map_height = getattr(self.game.map, 'height', 1800)
         
-        # Create regions in a grid pattern
+        # Create regions in a grid pattern, looked up by arithmetic
         region_size = 300
-        for x in range(0, map_width, region_size):
-            for y in range(0, map_height, region_size):
-                region_type = self.determine_region_type(x, y)
-                
-                self.event_regions.append({
-                    "x": x,
-                    "y": y,
-                    "width": region_size,
-                    "height": region_size,
-                    "type": region_type
-                })
+        columns = (map_width + region_size - 1) // region_size
+        rows = (map_height + region_size - 1) // region_size
+        self.region_grid = spatial_index.GridLookup(0, 0, region_size, region_size, columns, rows)
+        region_types = self.classify_regions(columns, rows, region_size)
+        for column in range(columns):
+            for row in range(rows):
+                x = column * region_size
+                y = row * region_size
+                region = self.add_region(x, y, region_size, region_size, region_types[row][column])
+                self.region_grid.set(column, row, region)
+
+        # Parks, parking lots and special buildings from the generator become their
+        # own (non-uniform) regions, which take priority over the grid cell around them
+        block_regions = []
+        for block in getattr(self.game.map, 'blocks', []):
+            region_type = self.block_region_type(block)
+            if region_type:
+                rect = block["rect"]
+                block_regions.append(self.add_region(rect.x, rect.y, rect.width, rect.height, region_type))
+        self.block_region_index = spatial_index.IntervalIndex(
+            (region["x"], region["y"], region["width"], region["height"], region)
+            for region in block_regions
+        )
+
+        # Index regions so the debug view only touches the ones on screen
+        self.region_index = spatial_index.SpatialHash(region_size)
+        for region in self.event_regions:
+            # Shrink by one pixel so a region doesn't spill into its neighbours' cells
+            self.region_index.insert(region, region["x"], region["y"],
+                                     region["width"] - 1, region["height"] - 1)
+
+    def add_region(self, x, y, width, height, region_type):
+        """Create a region with a stable id and add it to the region list"""
+        region = {
+            "id": len(self.event_regions),
+            "x": x,
+            "y": y,
+            "width": width,
+            "height": height,
+            "type": region_type
+        }
+        self.event_regions.append(region)
+        return region
+
+    def block_region_type(self, block):
+        """Region type for a generator block, or None for ordinary building blocks"""
+        if block["type"] == "special":
+            return self.special_region_types.get(block["subtype"], "high_value")
+        return self.block_region_types.get(block["type"])
     
-    def determine_region_type(self, x, y):
-        """Determine the type of region based on location"""
-        # This would ideally use map data, but for now we'll randomize
-        region_types = [
-            "street_corner", "intersection", "alley", "park", 
-            "plaza", "bank", "police_station", "dark_area",
-            "high_value", "bad_neighborhood", "highway", "road",
-            "forest"
-        ]
-        
-        # For banks and police stations, make them less common
-        weights = [10, 10, 8, 6, 5, 2, 2, 7, 3, 5, 4, 10, 3]
-        
-        # Use position to deterministically select type (but still with variety)
-        # This ensures the same area always has the same type
-        seed = int((x * 127 + y * 311) % 1000)
-        random.seed(seed)
-        
-        # Pick a weighted random type
-        region_type = random.choices(region_types, weights=weights, k=1)[0]
-        
-        # Reset random seed
-        random.seed()
-        
-        return region_type
+    def classify_regions(self, columns, rows, region_size):
+        """Pick a type for every grid region from the map's blocks in one vectorised pass"""
+        blocks = getattr(self.game.map, 'blocks', [])
+        if not blocks:
+            # No block data (fallback map image): weighted random types
+            types = self.region_rng.choices(self.fallback_region_types,
+                                            weights=self.fallback_region_weights,
+                                            k=rows * columns)
+            return np.array(types, dtype=object).reshape(rows, columns)
+
+        # Rasterise the blocks at a coarse resolution, one label per cell
+        resolution = 10
+        cells = region_size // resolution
+        raster = np.zeros((rows * cells, columns * cells), dtype=np.int8)  # 0 = street
+        for block in blocks:
+            rect = block["rect"]
+            label = self.block_labels[self.block_region_type(block)]
+            raster[rect.top // resolution:rect.bottom // resolution,
+                   rect.left // resolution:rect.right // resolution] = label
+
+        # Fraction of each region covered by each label: shape (labels, rows, columns)
+        tiles = raster.reshape(rows, cells, columns, cells)
+        coverage = np.stack([(tiles == label).mean(axis=(1, 3))
+                             for label in range(len(self.block_labels) + 1)])
+        _, buildings, park, plaza, police, bank, high_value = coverage
+
+        # Median building coverage by sorting (np.median would import numpy.ma at startup)
+        ordered = np.sort(buildings, axis=None)
+        middle = ordered.size // 2
+        median = (ordered[middle - 1] + ordered[middle]) / 2 if ordered.size % 2 == 0 else ordered[middle]
+
+        # Building-heavy and street-heavy regions break ties with the private RNG
+        count = rows * columns
+        street_types = np.array(self.region_rng.choices(
+            ["intersection", "road", "highway", "street_corner"],
+            weights=[10, 10, 4, 10], k=count), dtype=object).reshape(rows, columns)
+        block_types = np.array(self.region_rng.choices(
+            ["alley", "dark_area", "bad_neighborhood", "street_corner"],
+            weights=[8, 7, 5, 10], k=count), dtype=object).reshape(rows, columns)
+
+        # First matching rule wins: landmarks, then green space, then open lots; of the
+        # rest, the more built-up half gets alleys and the other half gets streets
+        return np.select(
+            [police > 0.05, bank > 0.05, high_value > 0.05,
+             park > 0.4, park > 0.15, plaza > 0.25, buildings > median],
+            ["police_station", "bank", "high_value",
+             "forest", "park", "plaza", block_types],
+            default=street_types
+        )
     
     def update(self, player_x, player_y):
         """Update the event system state"""
-        # Update cooldown
-        if self.event_cooldown > 0:
-            self.event_cooldown -= 1
-            
-        # Update active events
-        events_to_remove = []
-        for i, event in enumerate(self.active_events):
-            # Update event timing
-            event["time_remaining"] -= 1
-            
-            # Check if event should advance to next stage
-            if event["time_remaining"] <= 0:
-                if event["current_stage"] < len(event["template"]["stages"]) - 1:
-                    # Advance to next stage
-                    event["current_stage"] += 1
-                    stage = event["template"]["stages"][event["current_stage"]]
-                    event["time_remaining"] = stage["duration"]
-                    
-                    # Execute stage actions
-                    self.execute_stage_actions(stage, event["x"], event["y"])
-                else:
-                    # Event has completed all stages, mark for removal
-                    events_to_remove.append(i)
-        
-        # Remove completed events
-        for i in sorted(events_to_remove, reverse=True):
-            del self.active_events[i]
-            
-        # Update player region time
+        # Stage transitions run from the game's scheduler; only track the player here
+        now = self.game.scheduler.tick
         current_region = self.get_player_region(player_x, player_y)
+        if not current_region:
+            return
         
-        # Reset all region times if player moved to a new region
-        if current_region and current_region.get("id") not in self.player_time_in_region:
-            self.player_time_in_region = {current_region.get("id"): 1}
-        elif current_region:
-            # Increment time in current region
-            region_id = current_region.get("id")
-            self.player_time_in_region[region_id] = self.player_time_in_region.get(region_id, 0) + 1
+        # Restart the clock if player moved to a new region
+        if current_region["id"] != self.current_region_id:
+            self.current_region_id = current_region["id"]
+            self.region_entered_tick = now
+            return
             
-            # Check if player has been in this region long enough to trigger an event
-            if (self.player_time_in_region[region_id] >= self.hovering_threshold and 
-                self.event_cooldown <= 0 and len(self.active_events) < 3):
-                # Try to trigger an event
-                self.try_trigger_event(current_region, player_x, player_y)
+        # Check if player has been in this region long enough to trigger an event
+        if (now - self.region_entered_tick >= self.hovering_threshold and 
+            now >= self.cooldown_until and len(self.active_events) < 3):
+            # Try to trigger an event
+            self.try_trigger_event(current_region, player_x, player_y)
+    
+    def advance_event(self, event):
+        """Scheduler callback: move an event to its next stage or end it"""
+        if event["current_stage"] < len(event["template"]["stages"]) - 1:
+            # Advance to next stage
+            event["current_stage"] += 1
+            stage = event["template"]["stages"][event["current_stage"]]
+            event["timer"] = self.game.scheduler.schedule(stage["duration"], self.advance_event, event)
+            
+            # Execute stage actions
+            self.execute_stage_actions(stage, event["x"], event["y"])
+        elif event in self.active_events:
+            # Event has completed all stages
+            self.active_events.remove(event)
     
     def get_player_region(self, player_x, player_y):
         """Determine which region the player is currently in"""
-        for i, region in enumerate(self.event_regions):
-            if (region["x"] <= player_x < region["x"] + region["width"] and
-                region["y"] <= player_y < region["y"] + region["height"]):
-                # Add ID for tracking
-                region["id"] = i
-                return region
-        return None
+        # Block regions first (O(log n)), then the grid cell (O(1))
+        region = self.block_region_index.get(player_x, player_y)
+        if region is None:
+            region = self.region_grid.get(player_x, player_y)
+        return region
     
     def try_trigger_event(self, region, player_x, player_y):
         """Try to trigger an event in the current region"""
@@ -311,10 +299,7 @@ class EventSystem:
             return
             
         # Find event templates that can trigger in this region type
-        eligible_templates = []
-        for template in self.event_templates:
-            if region["type"] in template["trigger_locations"]:
-                eligible_templates.append(template)
+        eligible_templates = self.templates_by_location.get(region["type"])
                 
         # If no eligible templates, don't trigger anything
         if not eligible_templates:
@@ -323,15 +308,16 @@ class EventSystem:
         # Pick a random template
         template = random.choice(eligible_templates)
         
-        # Create the event
+        # Create the event; its stages advance on the scheduler
+        scheduler = self.game.scheduler
         event = {
             "template": template,
             "current_stage": 0,
-            "time_remaining": template["stages"][0]["duration"],
             "x": player_x,
             "y": player_y,
             "region": region
         }
+        event["timer"] = scheduler.schedule(template["stages"][0]["duration"], self.advance_event, event)
         
         # Add to active events
         self.active_events.append(event)
@@ -340,27 +326,18 @@ class EventSystem:
         self.execute_stage_actions(template["stages"][0], player_x, player_y)
         
         # Set cooldown
-        self.event_cooldown = self.min_cooldown
+        self.cooldown_until = scheduler.tick + self.min_cooldown
         
         # Reset time in region
-        self.player_time_in_region[region["id"]] = 0
+        self.region_entered_tick = scheduler.tick
     
     def execute_stage_actions(self, stage, event_x, event_y):
         """Execute the actions for an event stage"""
         for action in stage["actions"]:
-            if action["type"] == "spawn_entity":
-                self.spawn_entities(action, event_x, event_y)
-            elif action["type"] == "message":
-                self.show_message(action["text"])
-            elif action["type"] == "effect":
-                self.apply_effect(action)
+            action(event_x, event_y)
     
-    def spawn_entities(self, action, event_x, event_y):
+    def spawn_entities(self, spawner, count, distance, event_x, event_y):
         """Spawn entities around the event location"""
-        entity_type = action["entity"]
-        count = action["count"]
-        distance = action["distance"]
-        
         for _ in range(count):
             # Determine spawn position
             angle = random.uniform(0, 2 * math.pi)
@@ -368,15 +345,8 @@ class EventSystem:
             spawn_x = event_x + math.cos(angle) * radius
             spawn_y = event_y + math.sin(angle) * radius
             
-            # Create the entity based on type
-            if entity_type == "police":
-                self.spawn_police(spawn_x, spawn_y)
-            elif entity_type == "swat":
-                self.spawn_swat(spawn_x, spawn_y)
-            elif entity_type == "vehicle":
-                self.spawn_vehicle(spawn_x, spawn_y)
-            elif entity_type in ["cultist", "mime", "gang_member", "angry_driver", "rival_gang"]:
-                self.spawn_special_pedestrian(spawn_x, spawn_y, entity_type)
+            # Create the entity with its type's spawn handler
+            spawner(spawn_x, spawn_y)
     
     def spawn_police(self, x, y):
         """Spawn a police vehicle"""
@@ -488,7 +458,11 @@ class EventSystem:
             self.game.message = text
             self.game.message_timer = 180  # 3 seconds
     
-    def apply_effect(self, action):
+    def show_message_action(self, text, event_x, event_y):
+        """Message action handler (the event position is not needed)"""
+        self.show_message(text)
+    
+    def apply_effect(self, action, event_x=None, event_y=None):
         """Apply a special effect to the game"""
         effect_name = action["name"]
         duration = action.get("duration", 600)
@@ -501,7 +475,9 @@ class EventSystem:
             self.game.visual_effects.append({
                 "type": "strange_lights",
                 "duration": duration,
-                "time_remaining": duration
+                "time_remaining": duration,
+                "x": event_x if event_x is not None else self.game.player.x,
+                "y": event_y if event_y is not None else self.game.player.y
             })
             
         elif effect_name == "mime_rage":
@@ -529,16 +505,13 @@ class EventSystem:
         if not getattr(self.game, 'show_debug', False):
             return
             
-        # Draw regions
-        for region in self.event_regions:
+        view_rect = (camera_x, camera_y, screen.get_width(), screen.get_height())
+
+        # Draw regions that touch the screen
+        for region in self.region_index.query_rect(view_rect):
             screen_x = region["x"] - camera_x
             screen_y = region["y"] - camera_y
             
-            # Skip if off-screen
-            if (screen_x + region["width"] < 0 or screen_x > screen.get_width() or
-                screen_y + region["height"] < 0 or screen_y > screen.get_height()):
-                continue
-                
             # Draw region rectangle
             pygame.draw.rect(
                 screen, 
@@ -552,16 +525,15 @@ class EventSystem:
                 text = font.render(region["type"], True, (150, 150, 150))
                 screen.blit(text, (screen_x + 5, screen_y + 5))
                 
-        # Draw active events
-        for event in self.active_events:
+        # Draw active events that are on screen
+        if hasattr(self.game, 'entity_index'):
+            events = self.game.entity_index.query_rect(view_rect, "event")
+        else:
+            events = self.active_events
+        for event in events:
             screen_x = event["x"] - camera_x
             screen_y = event["y"] - camera_y
             
-            # Skip if off-screen
-            if (screen_x < 0 or screen_x > screen.get_width() or
-                screen_y < 0 or screen_y > screen.get_height()):
-                continue
-                
             # Draw event circle
             stage = event["template"]["stages"][event["current_stage"]]
             pygame.draw.circle(
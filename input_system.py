@@ -0,0 +1,166 @@
+"""
+Input mapping for GTA-style South Park Canadian game
+This module turns keyboard and touch events into one bitmask of game actions
+per tick, with pressed/released edges worked out once, and can record the
+per-tick masks and play them back in place of the real devices.
+"""
+import pygame
+
+# Action bits
+MOVE_UP = 1 << 0
+MOVE_DOWN = 1 << 1
+MOVE_LEFT = 1 << 2
+MOVE_RIGHT = 1 << 3
+FIRE = 1 << 4
+USE = 1 << 5
+PAUSE = 1 << 6
+
+ACTION_NAMES = {
+    MOVE_UP: "up",
+    MOVE_DOWN: "down",
+    MOVE_LEFT: "left",
+    MOVE_RIGHT: "right",
+    FIRE: "fire",
+    USE: "use",
+    PAUSE: "pause",
+}
+
+# Actions that make up cheat codes, with the key names the codes are written in
+CHEAT_KEYS = (
+    (MOVE_UP, "up"),
+    (MOVE_DOWN, "down"),
+    (MOVE_LEFT, "left"),
+    (MOVE_RIGHT, "right"),
+    (FIRE, "space"),
+)
+
+# Keyboard keys (WASD and arrows both move)
+KEY_BINDINGS = {
+    pygame.K_w: MOVE_UP,
+    pygame.K_UP: MOVE_UP,
+    pygame.K_s: MOVE_DOWN,
+    pygame.K_DOWN: MOVE_DOWN,
+    pygame.K_a: MOVE_LEFT,
+    pygame.K_LEFT: MOVE_LEFT,
+    pygame.K_d: MOVE_RIGHT,
+    pygame.K_RIGHT: MOVE_RIGHT,
+    pygame.K_SPACE: FIRE,
+    pygame.K_e: USE,
+    pygame.K_ESCAPE: PAUSE,
+}
+
+# On-screen touch buttons
+TOUCH_BINDINGS = {
+    "up": MOVE_UP,
+    "down": MOVE_DOWN,
+    "left": MOVE_LEFT,
+    "right": MOVE_RIGHT,
+    "shoot": FIRE,
+    "action": USE,
+    "pause": PAUSE,
+}
+
+class InputMapper:
+    """Collects device events and produces the action mask for each tick"""
+    def __init__(self, key_bindings=None, touch_bindings=None):
+        self.key_bindings = dict(KEY_BINDINGS if key_bindings is None else key_bindings)
+        self.touch_bindings = dict(TOUCH_BINDINGS if touch_bindings is None else touch_bindings)
+
+        self.keys_down = set()  # Bound keys currently held
+        self.touch = {}  # Touch button name -> held (also drawn by the touch overlay)
+        self.tapped = 0  # Actions pressed since the last tick, so quick taps aren't lost
+
+        # Per-tick state
+        self.held = 0
+        self.pressed = 0   # Held this tick but not the last
+        self.released = 0  # Held last tick but not this one
+
+        # Recording and playback of per-tick masks
+        self.recording = None  # List of masks while recording
+        self.playback = None   # Masks being replayed
+        self.playback_index = 0
+
+    def handle_event(self, event):
+        """Track a key event; returns True if the key is bound to an action"""
+        action = self.key_bindings.get(getattr(event, 'key', None))
+        if action is None:
+            return False
+        if event.type == pygame.KEYDOWN:
+            self.keys_down.add(event.key)
+            self.tapped |= action
+        elif event.type == pygame.KEYUP:
+            self.keys_down.discard(event.key)
+        return True
+
+    def touch_down(self, name):
+        """A touch button was pressed"""
+        self.touch[name] = True
+        self.tapped |= self.touch_bindings.get(name, 0)
+
+    def release_touch(self):
+        """All fingers lifted"""
+        for name in self.touch:
+            self.touch[name] = False
+
+    def device_mask(self):
+        """Actions held on the keyboard and touch buttons right now"""
+        mask = self.tapped
+        for key in self.keys_down:
+            mask |= self.key_bindings[key]
+        for name, active in self.touch.items():
+            if active:
+                mask |= self.touch_bindings.get(name, 0)
+        return mask
+
+    def begin_tick(self):
+        """Latch this tick's action mask and its edges"""
+        if self.playback is not None:
+            mask = self.playback[self.playback_index]
+            self.playback_index += 1
+            if self.playback_index >= len(self.playback):
+                self.playback = None
+        else:
+            mask = self.device_mask()
+        self.tapped = 0
+
+        if self.recording is not None:
+            self.recording.append(mask)
+
+        previous = self.held
+        self.held = mask
+        self.pressed = mask & ~previous
+        self.released = previous & ~mask
+        return mask
+
+    def is_held(self, action):
+        return bool(self.held & action)
+
+    def was_pressed(self, action):
+        return bool(self.pressed & action)
+
+    def was_released(self, action):
+        return bool(self.released & action)
+
+    def describe(self, mask=None):
+        """Names of the actions in a mask, for debug output"""
+        mask = self.held if mask is None else mask
+        return " ".join(name for action, name in ACTION_NAMES.items() if mask & action) or "-"
+
+    def start_recording(self):
+        """Record every tick's mask from now on"""
+        self.recording = []
+
+    def stop_recording(self):
+        """Stop recording and return the masks, one per tick"""
+        masks, self.recording = self.recording or [], None
+        return masks
+
+    def play(self, masks):
+        """Replay recorded masks instead of the devices, one per tick"""
+        masks = list(masks)
+        self.playback = masks if masks else None
+        self.playback_index = 0
+
+    @property
+    def playing(self):
+        return self.playback is not None
@@ -0,0 +1,128 @@
+"""
+Lighting system for GTA-style South Park Canadian game
+This module bakes the day/night cycle into a lookup table and composites the
+darkness overlay and additive light sprites (headlights, sirens, strange lights)
+through the renderer without allocating any surfaces during a frame.
+"""
+import math
+import pygame
+
+class LightingSystem:
+    """Precomputed day/night lighting with cached light sprites"""
+    def __init__(self, sky_colors, light_level_fn, resolution=256):
+        self.sky_colors = sky_colors
+        self.light_level_fn = light_level_fn  # time_of_day -> 0.0 (dark) .. 1.0 (bright)
+        self.resolution = resolution  # Number of lookup table steps per day
+        self.sky_table = []      # step -> sky colour
+        self.overlay_table = []  # step -> (tint, alpha)
+
+        # Current frame state
+        self.step = 0
+        self.tint = (0, 0, 0)
+        self.alpha = 0
+
+        # Light sprites: cached gradients plus the lights queued for this frame
+        self.intensity_levels = 8
+        self.light_sprites = {}  # (radius, color, level) -> Surface
+        self.lights = []         # [(world_x, world_y, radius, color), ...]
+
+        self.build_tables()
+
+    def build_tables(self):
+        """Bake sky colour and darkness tint/alpha for every time step"""
+        times = sorted(self.sky_colors.keys())
+        self.sky_table = []
+        self.overlay_table = []
+
+        for step in range(self.resolution):
+            time_of_day = step / self.resolution
+
+            # Interpolate the sky colour between the two surrounding key times
+            for i in range(1, len(times)):
+                if time_of_day <= times[i]:
+                    t1, t2 = times[i-1], times[i]
+                    break
+            else:
+                t1, t2 = times[-2], times[-1]
+            factor = (time_of_day - t1) / (t2 - t1) if t2 > t1 else 0.0
+            c1 = self.sky_colors[t1]
+            c2 = self.sky_colors[t2]
+            sky = tuple(int(c1[i] + (c2[i] - c1[i]) * factor) for i in range(3))
+            self.sky_table.append(sky)
+
+            # Darkness takes a faint tint of the sky so dusk reads warmer than midnight
+            alpha = int(255 * (1.0 - self.light_level_fn(time_of_day)))
+            tint = tuple(c // 4 for c in sky)
+            self.overlay_table.append((tint, max(0, min(255, alpha))))
+
+    def step_for(self, time_of_day):
+        """Return the lookup table step for a time of day"""
+        return int(time_of_day * self.resolution) % self.resolution
+
+    def sky_color(self, time_of_day):
+        """Return the sky colour for a time of day from the lookup table"""
+        return self.sky_table[self.step_for(time_of_day)]
+
+    def begin_frame(self, time_of_day):
+        """Select this frame's lighting from the lookup table"""
+        self.step = self.step_for(time_of_day)
+        self.tint, self.alpha = self.overlay_table[self.step]
+
+    def is_dark(self):
+        """True if the darkness overlay is visible this frame"""
+        return self.alpha > 0
+
+    def add_light(self, x, y, radius, color):
+        """Queue an additive light at a world position for this frame"""
+        # Lights are invisible in daylight, so don't even queue them
+        if self.alpha <= 0:
+            return
+        self.lights.append((x, y, radius, color))
+
+    def get_light_sprite(self, radius, color, level):
+        """Return a cached radial gradient sprite for a light"""
+        key = (radius, color, level)
+        sprite = self.light_sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((radius * 2, radius * 2))
+            sprite.fill((0, 0, 0))
+            strength = level / self.intensity_levels
+
+            # Concentric circles from the rim inwards, brightest at the center
+            for r in range(radius, 0, -2):
+                falloff = (1.0 - r / radius) ** 0.8 * strength
+                ring_color = tuple(int(c * falloff) for c in color)
+                pygame.draw.circle(sprite, ring_color, (radius, radius), r)
+
+            self.light_sprites[key] = sprite
+        return sprite
+
+    def apply(self, renderer, camera_x, camera_y):
+        """Composite the darkness overlay and queued lights through the renderer"""
+        lights = self.lights
+        self.lights = []
+
+        if self.alpha <= 0:
+            return
+
+        renderer.draw_darkness(self.tint, self.alpha)
+
+        if not lights:
+            return
+
+        # Lights get stronger the darker it is
+        level = max(1, math.ceil(self.alpha / 255 * self.intensity_levels))
+        screen_w, screen_h = renderer.screen.get_size()
+        sprites = []
+        for x, y, radius, color in lights:
+            screen_x = x - camera_x - radius
+            screen_y = y - camera_y - radius
+
+            # Skip lights that don't touch the screen
+            if (screen_x + radius * 2 < 0 or screen_x > screen_w or
+                screen_y + radius * 2 < 0 or screen_y > screen_h):
+                continue
+
+            sprites.append((self.get_light_sprite(radius, color, level), (screen_x, screen_y)))
+
+        renderer.draw_additive(sprites)
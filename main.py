@@ -1,10 +1,15 @@
+import time
+IMPORT_START = time.perf_counter()  # Start of the "imports" phase in the startup report
 import pygame
 import math
 import os
 import sys
 import random
 import logging
+import argparse
 import traceback
+import importlib.util
+from operator import attrgetter, itemgetter
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -36,6 +41,21 @@ def get_asset_path(filename, possible_dirs=None):
     logging.warning(f"Asset not found: {filename}")
     return None
 
+def lazy_import(name):
+    """Import a module on first attribute access (for modules most sessions never touch)"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
 try:
     # Import our module dependencies with error handling
     logging.info("Importing game modules...")
@@ -44,6 +64,20 @@ try:
     import side_activities  # Import side activities
     import cheat_system  # Import cheat code system
     import event_system  # Import escalating events system
+    import lighting  # Import day/night lighting compositor
+    import rendering  # Import sprite batching render queue
+    import profiler  # Import frame profiler
+    import spatial_index  # Import spatial hash for culling and proximity queries
+    import renderer  # Import surface/texture renderer backends
+    import scheduler  # Import tick scheduler for timers
+    import input_system  # Import action mapping for keyboard/touch input
+    import replay  # Import input recording and replay files
+    snapshot = lazy_import("snapshot")  # Import save-state snapshots (loaded by --load/--save)
+    import city_cache  # Import memory-mapped city cache
+    districts = lazy_import("districts")  # Import multi-process district simulation (loaded by --workers)
+    import background  # Import background thread pool for generation work
+    import traffic  # Import lane-following civilian traffic
+    import navmesh  # Import pedestrian walkway grid
     logging.info("All modules imported successfully")
 except ImportError as e:
     logging.error(f"Failed to import required module: {e}")
@@ -52,23 +86,114 @@ except Exception as e:
     logging.error(f"Unexpected error during module import: {e}")
     traceback.print_exc()
     sys.exit(1)
+IMPORT_END = time.perf_counter()
 
 class Map:
-    def __init__(self):
+    def __init__(self, scheduler, saved=None, city_seed=None, pool=None):
+        # Shared tick scheduler (body despawns)
+        self.scheduler = scheduler
+        # Background pool that paints the city's detail (None: paint it before returning)
+        self.pool = pool
+        self.city_jobs = []  # Chunk painting jobs until the city is finished
+        self.painted_chunks = []  # (surface, area) copied into map_image since the last draw
+        self.on_city_painted = []  # Called once the last chunk is in
+
         # Set default size first
         self.width = 2400  # Fixed size for consistent gameplay
         self.height = 1800
+        self.tile_size = 32
 
         # Initialize lists for game objects
         self.walls = []        # Collision walls (buildings, obstacles)
         self.roads = []        # Road areas for AI navigation
         self.buildings = []    # Visual buildings with metadata
         self.curbs = []        # Visual curbs along roads
+        self.blocks = []       # City blocks from the generator ({"rect", "type", "subtype"})
+        self.collision = None  # (height, width) uint8 wall bitmap, mapped from the city cache if there is one
+        self.road_nodes = None  # Road graph: intersections (N x 2) and
+        self.road_edges = None  # segments between them (E x 3: node, node, length)
+        self.traffic = traffic.VehicleBatch()  # Civilian cars, stepped along their lanes together each tick
+        self.navmesh = None  # Walkable grid for pedestrians, built on first use (see navmesh.py)
+        self.districts = None  # Worker processes simulating the city's districts (see districts.py)
+
+        # Time of day system
+        self.time_of_day = 0.3  # Starting at mid-morning
+        self.time_speed = 0.00005  # Slower time progression for more realistic day/night cycles
+        self.sky_colors = {
+            0.0: (10, 10, 40),     # Midnight
+            0.25: (200, 120, 40),  # Sunrise
+            0.5: (100, 150, 255),  # Noon
+            0.75: (255, 100, 50),  # Sunset
+            1.0: (10, 10, 40)      # Midnight again
+        }
+
+        if saved is not None:
+            # Resume a saved city (see snapshot.py) instead of generating one
+            snapshot.restore_map(saved, self, {
+                "vehicle": Vehicle, "police": PoliceVehicle, "pedestrian": Pedestrian})
+        else:
+            self.generate_city(city_seed)
+
+        if self.collision is None:
+            self.collision = city_cache.collision_bitmap(self.walls, self.width, self.height)
+            self.road_nodes, self.road_edges = city_cache.road_graph(self.roads)
+
+        # Bake the day/night cycle into a lookup table once
+        self.lighting = lighting.LightingSystem(self.sky_colors, self.light_level_at)
+
+        # Index static scenery so drawing only touches what's on screen
+        self.build_static_index()
+
+        # Road sample points for placing objectives, built on first use
+        self.road_sample_pools = {}  # clearance -> KDTree of (x, y)
+        self.road_sample_jobs = {}  # clearance -> background Job building that pool
+
+    def generate_city(self, city_seed=None):
+        """Load or generate the city, then populate the streets"""
+        if city_seed is None:
+            self.build_city()
+        elif not city_cache.load_city(self, city_seed):
+            # Generate from the city seed without using up the world RNG, so a
+            # cached and a freshly generated city go on to spawn the same entities
+            world_state = random.getstate()
+            random.seed(city_seed)
+            procedural = self.build_city()
+            random.setstate(world_state)
+
+            if procedural:
+                self.collision = city_cache.collision_bitmap(self.walls, self.width, self.height)
+                self.road_nodes, self.road_edges = city_cache.road_graph(self.roads)
+                if self.city_jobs:
+                    # Write the cache in the background once the detail is in (as the city
+                    # is now, before the lights change); this instance keeps its own image
+                    chunks = city_cache.city_chunks(self, raster=False)
+                    self.on_city_painted.append(lambda: self.write_city_cache(chunks, city_seed))
+                elif city_cache.save_city(self, city_seed):
+                    # Use the mapped copy so this process shares its pages with other instances
+                    city_cache.load_city(self, city_seed)
+
+        # Only initialize these lists if they don't already exist
+        # (the procedural generator already fills the walls list)
+        if not hasattr(self, 'vehicles'):
+            self.vehicles = []
+        if not hasattr(self, 'police_vehicles'):
+            self.police_vehicles = []
+        if not hasattr(self, 'pedestrians'):
+            self.pedestrians = []
 
+        # Spawn game entities
+        self.spawn_vehicles(15)
+        self.spawn_police(3)
+        self.spawn_pedestrians(30)
+
+    def build_city(self):
+        """Generate the city image, walls and roads; returns True if the procedural generator made them"""
+        procedural = False
         try:
             # First try to use our procedural map generator
             print("Generating procedural GTA-style map...")
-            self.map_image, building_rects = procedural_map.generate_city_map(self.width, self.height)
+            plan, building_rects, self.blocks = procedural_map.plan_city_map(self.width, self.height)
+            self.paint_city(plan)
 
             # Add the buildings to our walls for collision detection
             for rect in building_rects:
@@ -78,6 +203,7 @@ class Map:
             self.generate_roads_from_grid_pattern()
 
             print(f"Procedural map generated with {len(building_rects)} building collision areas and {len(self.roads)} road segments")
+            procedural = True
 
         except Exception as proc_error:
             print(f"Error generating procedural map: {proc_error}")
@@ -123,16 +249,6 @@ class Map:
                     pygame.draw.line(self.map_image, road_color, (0, y), (self.width, y), 20)
                 print("Fallback surface created.")
 
-        self.tile_size = 32
-        # Only initialize these lists if they don't already exist
-        # (the procedural generator already fills the walls list)
-        if not hasattr(self, 'vehicles'):
-            self.vehicles = []
-        if not hasattr(self, 'police_vehicles'):
-            self.police_vehicles = []
-        if not hasattr(self, 'pedestrians'):
-            self.pedestrians = []
-
         # Create game objects if needed
         # Only use create_city_layout if we don't already have walls from procedural generator
         if not self.walls:
@@ -140,22 +256,53 @@ class Map:
             self.create_city_layout()
         else:
             print(f"Using existing {len(self.walls)} collision walls from procedural generator")
+        return procedural
 
-        # Spawn game entities
-        self.spawn_vehicles(15)
-        self.spawn_police(3)
-        self.spawn_pedestrians(30)
+    def paint_city(self, plan):
+        """Paint a planned city: all at once, or as a placeholder the background pool fills in"""
+        if self.pool is None:
+            self.map_image = pygame.Surface((self.width, self.height))
+            plan.paint(self.map_image)
+            return
 
-        # Time of day system
-        self.time_of_day = 0.3  # Starting at mid-morning
-        self.time_speed = 0.00005  # Slower time progression for more realistic day/night cycles
-        self.sky_colors = {
-            0.0: (10, 10, 40),     # Midnight
-            0.25: (200, 120, 40),  # Sunrise
-            0.5: (100, 150, 255),  # Noon
-            0.75: (255, 100, 50),  # Sunset
-            1.0: (10, 10, 40)      # Midnight again
-        }
+        # Coarse city now, then detailed chunks from the middle (where the player starts) outwards
+        self.map_image = plan.placeholder()
+        self.city_jobs = [self.pool.submit(plan.paint_chunk, area, self.map_image, on_ready=self.place_chunk)
+                          for area in plan.chunks()]
+
+    def place_chunk(self, chunk):
+        """Copy a finished chunk into the city image (main thread, between frames)"""
+        surface, area = chunk
+        self.map_image.blit(surface, area)
+        self.painted_chunks.append(chunk)
+        if all(job.delivered for job in self.city_jobs):
+            self.city_jobs = []
+            callbacks, self.on_city_painted = self.on_city_painted, []
+            for callback in callbacks:
+                callback()
+
+    def finish_city(self):
+        """Wait for the city's detail to be painted in"""
+        if self.city_jobs:
+            self.pool.wait()
+
+    def write_city_cache(self, chunks, city_seed):
+        chunks["raster"] = pygame.image.tobytes(self.map_image, "BGRA")
+        self.pool.submit(city_cache.write_city, chunks, city_seed, self.width, self.height)
+
+    def build_static_index(self):
+        """Index curbs, buildings and traffic lights by position for view culling"""
+        self.static_index = spatial_index.SpatialHash(256)
+        for curb in self.curbs:
+            rect = curb["rect"]
+            self.static_index.insert(curb, rect.x, rect.y, rect.width, rect.height, "curb")
+        for building in self.buildings:
+            rect = building["rect"]
+            self.static_index.insert(building, rect.x, rect.y, rect.width, rect.height, "building")
+        for light in getattr(self, 'traffic_lights', []):
+            light_x, light_y = light['position']
+            # Light housings reach about 20 pixels from the pole
+            self.static_index.insert(light, light_x - 20, light_y - 20, 40, 40, "traffic_light")
 
     def create_city_layout(self):
         try:
@@ -287,7 +434,8 @@ class Map:
                         "color": random.choice([(200, 200, 200), (180, 180, 180), (160, 160, 160)])
                     })
 
-    def draw(self, screen, camera_x, camera_y):
+    def draw(self, backend, camera_x, camera_y):
+        screen = backend.screen
         try:
             # Draw the map image
             if not hasattr(self, 'map_image') or self.map_image is None:
@@ -303,11 +451,16 @@ class Map:
                         pygame.draw.rect(screen, (50, 50, 50), rect, 1)
             else:
                 # Draw a solid color background first to ensure something is visible
-                screen.fill((100, 100, 100))  # Medium gray background
+                backend.fill((100, 100, 100))  # Medium gray background
+
+                # Detail painted in since the last frame
+                for surface, area in self.painted_chunks:
+                    backend.update_region(self.map_image, surface, area)
+                self.painted_chunks = []
 
                 # Draw the map with fixed positioning (no view_rect)
                 map_pos = (-camera_x, -camera_y)
-                screen.blit(self.map_image, map_pos)
+                backend.draw_map(self.map_image, camera_x, camera_y)
 
                 if not hasattr(self, '_first_draw'):
                     print("Map drawn successfully")
@@ -345,45 +498,27 @@ class Map:
             if 0 <= center_x < screen.get_width() and 0 <= center_y < screen.get_height():
                 pygame.draw.circle(grid_surface, (255, 0, 0, 100), (int(center_x), int(center_y)), 10)
 
+            # Only scenery inside the camera view is fetched from the static index
+            view_rect = (camera_x, camera_y, screen.get_width(), screen.get_height())
+
             # Draw visual curbs (if they exist)
-            if hasattr(self, 'curbs'):
-                for curb in self.curbs:
-                    curb_rect = pygame.Rect(
-                        curb["rect"].x - camera_x,
-                        curb["rect"].y - camera_y,
-                        curb["rect"].width,
-                        curb["rect"].height
-                    )
-                    if (curb_rect.right >= 0 and curb_rect.left <= screen.get_width() and
-                        curb_rect.bottom >= 0 and curb_rect.top <= screen.get_height()):
-                        pygame.draw.rect(grid_surface, (120, 120, 100, 150), curb_rect)
+            for curb in self.static_index.query_rect(view_rect, "curb"):
+                curb_rect = curb["rect"].move(-camera_x, -camera_y)
+                pygame.draw.rect(grid_surface, (120, 120, 100, 150), curb_rect)
 
             # Draw buildings for better visibility
-            if hasattr(self, 'buildings'):
-                for building in self.buildings:
-                    building_rect = pygame.Rect(
-                        building["rect"].x - camera_x,
-                        building["rect"].y - camera_y,
-                        building["rect"].width,
-                        building["rect"].height
-                    )
-                    if (building_rect.right >= 0 and building_rect.left <= screen.get_width() and
-                        building_rect.bottom >= 0 and building_rect.top <= screen.get_height()):
-                        pygame.draw.rect(grid_surface, building["color"], building_rect)
+            for building in self.static_index.query_rect(view_rect, "building"):
+                building_rect = building["rect"].move(-camera_x, -camera_y)
+                pygame.draw.rect(grid_surface, building["color"], building_rect)
 
             # Draw traffic lights at intersections
             if hasattr(self, 'traffic_lights'):
-                for light in self.traffic_lights:
+                for light in self.static_index.query_rect(view_rect, "traffic_light"):
                     # Calculate screen position
                     light_x, light_y = light['position']
                     screen_x = light_x - camera_x
                     screen_y = light_y - camera_y
 
-                    # Skip if not on screen
-                    if (screen_x < -20 or screen_x > screen.get_width() + 20 or
-                        screen_y < -20 or screen_y > screen.get_height() + 20):
-                        continue
-
                     # Draw traffic light pole
                     pygame.draw.rect(grid_surface, (50, 50, 50), 
                                   (screen_x - 3, screen_y - 3, 6, 6))
@@ -412,199 +547,270 @@ class Map:
                                     light_box_size//2 - 1)
 
             # Blit grid to screen
-            screen.blit(grid_surface, (0, 0))
+            backend.draw_overlay(grid_surface)
 
             # Apply time of day lighting effect
         except Exception as e:
             print(f"Error in Map.draw(): {e}")
             import traceback
             traceback.print_exc()
-        light_level = self.get_light_level()
-        if light_level < 1.0:
-            # Create a semi-transparent dark overlay for night time
-            darkness = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
-            alpha = int(255 * (1.0 - light_level))
-            darkness.fill((0, 0, 0, alpha))
-            screen.blit(darkness, (0, 0))
-
-        # Draw other game objects (vehicles, pedestrians, etc.)
-        # Draw pedestrians in proper order
-        for pedestrian in self.pedestrians:
-            pedestrian.draw(screen, camera_x, camera_y)
 
-        # Draw regular vehicles
-        for vehicle in self.vehicles:
-            vehicle.draw(screen, camera_x, camera_y)
+        # Apply time of day lighting (persistent overlay plus queued light sprites)
+        self.lighting.begin_frame(self.time_of_day)
+        self.lighting.apply(backend, camera_x, camera_y)
 
-        # Draw police vehicles
-        for vehicle in self.police_vehicles:
-            vehicle.draw(screen, camera_x, camera_y)
+        # Vehicles and pedestrians are drawn by Game's render queue
 
-    def spawn_vehicles(self, count):
-        for _ in range(count):
-            # Find a random road
-            if not self.roads:  # Safety check
-                return
+    def road_spawn_point(self, near_x=None, near_y=None):
+        """Pick (x, y, rotation) on a random road, or on the road nearest a point"""
+        if not self.roads:  # Safety check
+            return None
 
+        if near_x is None or near_y is None:
             road = random.choice(self.roads)
-
-            # Determine if road is horizontal or vertical
-            is_horizontal = road["rect"].width > road["rect"].height
-
-            if is_horizontal:
-                # Place vehicle along horizontal road
+        else:
+            # Road whose rectangle is closest to the requested point
+            def distance_sq(road):
+                rect = road["rect"]
+                dx = max(rect.left - near_x, 0, near_x - rect.right)
+                dy = max(rect.top - near_y, 0, near_y - rect.bottom)
+                return dx * dx + dy * dy
+            road = min(self.roads, key=distance_sq)
+
+        # Determine if road is horizontal or vertical
+        is_horizontal = road["rect"].width > road["rect"].height
+
+        if is_horizontal:
+            # Place vehicle along horizontal road
+            y = road["rect"].y + road["rect"].height // 2  # Center in road
+            if near_x is None:
                 x = road["rect"].x + random.randint(0, road["rect"].width - 32)  # Account for vehicle width
-                y = road["rect"].y + road["rect"].height // 2  # Center in road
-                rotation = 0 if random.random() > 0.5 else 180  # Face left or right
             else:
-                # Place vehicle along vertical road
-                x = road["rect"].x + road["rect"].width // 2  # Center in road
+                x = max(road["rect"].left, min(near_x, road["rect"].right - 32))
+                x = self.clear_spot(road, x, y, True)
+            rotation = 0 if random.random() > 0.5 else 180  # Face left or right
+        else:
+            # Place vehicle along vertical road
+            x = road["rect"].x + road["rect"].width // 2  # Center in road
+            if near_y is None:
                 y = road["rect"].y + random.randint(0, road["rect"].height - 32)  # Account for vehicle length
-                rotation = 90 if random.random() > 0.5 else 270  # Face up or down
-
-            vehicle = Vehicle(x, y)
-            vehicle.rotation = rotation  # Set initial rotation based on road direction
+            else:
+                y = max(road["rect"].top, min(near_y, road["rect"].bottom - 32))
+                y = self.clear_spot(road, x, y, False)
+            rotation = 90 if random.random() > 0.5 else 270  # Face up or down
+
+        return x, y, rotation
+
+    def clear_spot(self, road, x, y, horizontal):
+        """Nearest spot along a road to (x, y) with no car or wall on it, stepping a car length plus a gap at a time"""
+        spacing = 50  # One car length (40) plus a gap, so cars spawned near the same point line up
+        rect = road["rect"]
+        along, low, high = (x, rect.left, rect.right - 32) if horizontal else (y, rect.top, rect.bottom - 32)
+        taken = [vehicle.x if horizontal else vehicle.y for vehicle in self.vehicles + self.police_vehicles
+                 if rect.collidepoint(vehicle.x, vehicle.y)]
+        height, width = self.collision.shape
+        for step in range(int((high - low) // spacing) + 1):
+            for spot in (along + step * spacing, along - step * spacing):
+                if not low <= spot <= high or any(abs(spot - other) < spacing for other in taken):
+                    continue
+                spot_x, spot_y = (spot, y) if horizontal else (x, spot)
+                if 0 <= spot_x < width and 0 <= spot_y < height and self.collision[int(spot_y), int(spot_x)]:
+                    continue  # Under a lake
+                return spot
+        return along
+
+    def prepare_road_samples(self, clearance=0, step=32):
+        """Start building a road sample pool in the background so its first use doesn't wait"""
+        if clearance in self.road_sample_pools or clearance in self.road_sample_jobs:
+            return
+        if self.pool is None:
+            self.road_sample_pool(clearance, step)
+            return
+        self.road_sample_jobs[clearance] = self.pool.submit(
+            self.build_road_sample_pool, clearance, step,
+            on_ready=lambda pool: self.store_road_samples(clearance, pool))
+
+    def store_road_samples(self, clearance, pool):
+        """Keep a pool built in the background (unless road_sample_pool() already took it)"""
+        self.road_sample_jobs.pop(clearance, None)
+        self.road_sample_pools.setdefault(clearance, pool)
+
+    def road_sample_pool(self, clearance=0, step=32):
+        """KD-tree of points on roads with no wall within clearance pixels"""
+        pool = self.road_sample_pools.get(clearance)
+        if pool is not None:
+            return pool
+
+        # Still building in the background: wait for it rather than build it twice
+        job = self.road_sample_jobs.pop(clearance, None)
+        if job is not None:
+            try:
+                pool = job.result()
+            except Exception:
+                pool = None  # Failed or cancelled; build it here
+        if pool is None:
+            pool = self.build_road_sample_pool(clearance, step)
+        self.road_sample_pools[clearance] = pool
+        return pool
+
+    def build_road_sample_pool(self, clearance, step):
+        """Sample the roads and drop points near walls (only reads the map, safe off the main thread)"""
+        walls = spatial_index.SpatialHash(256)
+        for wall in self.walls:
+            rect = wall["rect"]
+            walls.insert(wall, rect.x, rect.y, rect.width, rect.height)
+
+        # Sample every road on a fixed grid (intersections are only sampled once)
+        samples = set()
+        for road in self.roads:
+            rect = road["rect"]
+            for x in range(rect.left + step // 2, rect.right, step):
+                for y in range(rect.top + step // 2, rect.bottom, step):
+                    samples.add((x, y))
+
+        points = []
+        for x, y in samples:
+            if clearance > 0:
+                # Same test as a (2 * clearance) square colliding with a wall rect
+                check_rect = pygame.Rect(x - clearance, y - clearance, clearance * 2, clearance * 2)
+                if any(check_rect.colliderect(wall["rect"]) for wall in
+                       walls.query_rect((check_rect.x, check_rect.y, check_rect.width, check_rect.height))):
+                    continue
+            points.append((x, y, (x, y)))
+
+        return spatial_index.KDTree(points)
+
+    def spawn_vehicles(self, count, near_x=None, near_y=None):
+        spawned = []
+        for _ in range(count):
+            for attempt in range(10):
+                spawn = self.road_spawn_point(near_x, near_y)
+                if spawn is None:
+                    return spawned
+
+                vehicle = Vehicle(spawn[0], spawn[1])
+                vehicle.rotation = spawn[2]  # Set initial rotation based on road direction
+                if self.traffic.place(vehicle, self.roads, getattr(self, 'traffic_lights', []), self.walls):
+                    break  # Into its lane (a stretch of road under a lake has none, so try another spot)
             self.vehicles.append(vehicle)
+            spawned.append(vehicle)
+        return spawned
 
-    def spawn_police(self, count):
+    def spawn_police(self, count, near_x=None, near_y=None):
+        spawned = []
         for _ in range(count):
-            # Find a random road
-            if not self.roads:  # Safety check
-                return
-
-            road = random.choice(self.roads)
-
-            # Determine if road is horizontal or vertical
-            is_horizontal = road["rect"].width > road["rect"].height
-
-            if is_horizontal:
-                # Place police along horizontal road
-                x = road["rect"].x + random.randint(0, road["rect"].width - 32)
-                y = road["rect"].y + road["rect"].height // 2
-                rotation = 0 if random.random() > 0.5 else 180
-            else:
-                # Place police along vertical road
-                x = road["rect"].x + road["rect"].width // 2
-                y = road["rect"].y + random.randint(0, road["rect"].height - 32)
-                rotation = 90 if random.random() > 0.5 else 270
+            spawn = self.road_spawn_point(near_x, near_y)
+            if spawn is None:
+                break
 
-            police = PoliceVehicle(x, y)
-            police.rotation = rotation
+            police = PoliceVehicle(spawn[0], spawn[1])
+            police.rotation = spawn[2]
             self.police_vehicles.append(police)
+            spawned.append(police)
+        return spawned
 
     def spawn_pedestrians(self, count):
+        paths = self.pedestrian_paths()
         for _ in range(count):
-            # Find a random position near a road (sidewalk)
-            if not self.roads:
+            # Random spot on a sidewalk, crossing or park path
+            point = paths.random_point()
+            if point is None:
                 return
 
-            road = random.choice(self.roads)
-            road_rect = road["rect"]
-
-            # Determine sidewalk position
-            sidewalk_width = 10
-            if road["horizontal"]:
-                # Horizontal road - spawn on top or bottom sidewalk
-                x = road_rect.x + random.randint(0, road_rect.width)
-                if random.random() < 0.5:
-                    # Top sidewalk
-                    y = road_rect.y + sidewalk_width // 2
-                else:
-                    # Bottom sidewalk
-                    y = road_rect.y + road_rect.height - sidewalk_width // 2
-            else:
-                # Vertical road - spawn on left or right sidewalk
-                y = road_rect.y + random.randint(0, road_rect.height)
-                if random.random() < 0.5:
-                    # Left sidewalk
-                    x = road_rect.x + sidewalk_width // 2
-                else:
-                    # Right sidewalk
-                    x = road_rect.x + road_rect.width - sidewalk_width // 2
-
-            pedestrian = Pedestrian(x, y)
+            pedestrian = Pedestrian(*point)
             self.pedestrians.append(pedestrian)
 
+    def pedestrian_paths(self):
+        """The pedestrians' walkways (sidewalks, crossings and park paths) as a grid, built on first use"""
+        if self.navmesh is None:
+            self.navmesh = navmesh.NavMesh(navmesh.walkways(self.blocks, self.roads),
+                                           self.walls, self.width, self.height)
+        return self.navmesh
+
     def update(self, player):
         # Update time of day
         self.time_of_day = (self.time_of_day + self.time_speed) % 1.0
 
-        # Update traffic lights every 3 seconds (180 frames at 60fps)
-        if hasattr(self, 'traffic_lights') and hasattr(self, 'traffic_light_timer'):
-            self.traffic_light_timer += 1
-            if self.traffic_light_timer >= 180:  # 3 seconds at 60 fps
-                self.traffic_light_timer = 0
-                # Update all traffic lights
-                for light in self.traffic_lights:
-                    light['timer'] += 1
-                    if light['timer'] >= 180:  # Individual light changes every 3 seconds
-                        light['timer'] = 0
-                        light['horizontal_green'] = not light['horizontal_green']
-
-        # Update regular vehicles with traffic light awareness
-        for vehicle in self.vehicles:
-            # Check if vehicle is near any traffic light
-            at_traffic_light = False
-            should_stop = False
-
-            if hasattr(self, 'traffic_lights'):
-                for light in self.traffic_lights:
-                    # Calculate distance to traffic light
-                    light_x, light_y = light['position']
-                    distance = math.sqrt((vehicle.x - light_x)**2 + (vehicle.y - light_y)**2)
-
-                    # If vehicle is close to traffic light (within 60 pixels)
-                    if distance < 60:
-                        at_traffic_light = True
-                        # Determine if vehicle is moving horizontally or vertically
-                        is_horizontal = vehicle.rotation in [0, 180]  # Horizontal if facing left/right
-
-                        # Check if vehicle should stop based on light color and direction
-                        if is_horizontal and not light['horizontal_green']:
-                            should_stop = True  # Horizontal traffic has red light
-                        elif not is_horizontal and light['horizontal_green']:
-                            should_stop = True  # Vertical traffic has red light
-
-                        break  # Only consider the closest traffic light
-
-            # Simple AI behavior with traffic light awareness
-            if should_stop:
-                # Stop at red light
-                vehicle.move(0, 0, self.walls)  # No forward movement, no turning
+        if self.districts is not None:
+            # Police chase and traffic from this process; lights and pedestrians run in the district workers
+            for police in self.police_vehicles:
+                police.update_ai(player, self.walls, self.roads)
+            if self.districts.step(player):
+                # Traffic runs here, once the workers have changed the lights
+                self.drive_traffic(player)
             else:
-                # Basic AI - randomly change direction occasionally
-                if random.random() < 0.01:  # 1% chance to change direction each frame
-                    vehicle.rotation = random.choice([0, 90, 180, 270])  # Choose a cardinal direction
-
-                # Move forward at normal speed
-                vehicle.move(0.5, 0, self.walls)  # Move forward at half speed, no turning
-
-        # Update police AI (override traffic lights when in chase mode)
-        for police in self.police_vehicles:
-            police.update_ai(player, self.walls, self.roads)
-
-        # Update pedestrians and remove dead ones that have timed out
-        for pedestrian in self.pedestrians[:]:
-            should_remove = pedestrian.update_ai(
-                player, self.walls, self.roads, 
-                self.vehicles + self.police_vehicles + ([player.in_vehicle] if player.in_vehicle else []), 
-                player.bullets, self.pedestrians
-            )
-            if should_remove:
-                self.pedestrians.remove(pedestrian)
+                print("District workers stopped; simulating the city in this process")
+                self.districts = None
+                self.update_city(player, police=False)
+        else:
+            self.update_city(player)
 
         # Respawn pedestrians if needed
         if len(self.pedestrians) < 30:
             self.spawn_pedestrians(1)
 
+    def update_city(self, player, police=True):
+        """Traffic lights, traffic and pedestrians for one tick, all in this process"""
+        # Each light counts its own 3-second cycle (180 frames at 60fps) from its staggered starting timer
+        for light in getattr(self, 'traffic_lights', []):
+            light['timer'] += 1
+            if light['timer'] >= 180:  # Individual light changes every 3 seconds
+                light['timer'] = 0
+                light['horizontal_green'] = not light['horizontal_green']
+
+        self.drive_traffic(player)
+
+        # Update police AI (override traffic lights when in chase mode)
+        if police:
+            for police_vehicle in self.police_vehicles:
+                police_vehicle.update_ai(player, self.walls, self.roads)
+
+        # Update pedestrians
+        vehicles = self.vehicles + self.police_vehicles + ([player.in_vehicle] if player.in_vehicle else [])
+        paths = self.pedestrian_paths()
+        for pedestrian in self.pedestrians:
+            if not pedestrian.is_dead:
+                pedestrian.update_ai(player, self.walls, paths, vehicles, player.bullets, self.pedestrians,
+                                     self.pedestrian_died)
+
+    def drive_traffic(self, player):
+        """Move the civilian cars along their lanes, stopping for red lights (the player drives their own)"""
+        self.traffic.drive(self.vehicles, getattr(self, 'traffic_lights', []), self.roads, self.walls, player.in_vehicle)
+
+    def start_districts(self, workers, seed):
+        """Run lights and pedestrians in worker processes, one group of districts each"""
+        self.districts = districts.DistrictSimulation.start(
+            self, workers, seed, {"pedestrian": Pedestrian})
+        return self.districts is not None
+
+    def stop_districts(self):
+        if self.districts is not None:
+            self.districts.close()
+            self.districts = None
+
+    def pedestrian_died(self, pedestrian):
+        # Bodies despawn on the scheduler 10 seconds after death
+        if pedestrian.despawn_timer is None:
+            pedestrian.despawn_timer = self.scheduler.schedule(600, self.despawn_pedestrian, pedestrian)
+
+    def despawn_pedestrian(self, pedestrian):
+        # Scheduler callback: remove a body once its despawn time is up
+        if pedestrian in self.pedestrians:
+            self.pedestrians.remove(pedestrian)
+
     def get_light_level(self):
         # Returns light level between 0.0 (dark) and 1.0 (bright)
-        if self.time_of_day < 0.25:  # Midnight to sunrise
-            return 0.2 + (self.time_of_day / 0.25) * 0.8
-        elif self.time_of_day < 0.75:  # Sunrise to sunset
+        return self.light_level_at(self.time_of_day)
+
+    @staticmethod
+    def light_level_at(time_of_day):
+        # Light level for any time of day (used to bake the lighting table)
+        if time_of_day < 0.25:  # Midnight to sunrise
+            return 0.2 + (time_of_day / 0.25) * 0.8
+        elif time_of_day < 0.75:  # Sunrise to sunset
             return 1.0
         else:  # Sunset to midnight
-            return 0.2 + (1.0 - (self.time_of_day - 0.75) / 0.25) * 0.8
+            return 0.2 + (1.0 - (time_of_day - 0.75) / 0.25) * 0.8
 
     def generate_roads_from_grid_pattern(self):
         """Create road segments for AI navigation based on a grid pattern similar to GTA"""
@@ -624,16 +830,12 @@ class Map:
         if not hasattr(self, 'traffic_lights'):
             self.traffic_lights = []
 
-        # Time for traffic lights
-        if not hasattr(self, 'traffic_light_timer'):
-            self.traffic_light_timer = 0
-
-        # GTA-style city parameters
-        block_size = 320  # Same as in procedural map generator
-        road_width = 120  # Width of roads
+        # GTA-style city parameters (roads are the asphalt between the generator's blocks)
+        block_size = procedural_map.BLOCK_SIZE
+        road_width = procedural_map.STREET_WIDTH
 
         # Create horizontal roads
-        for y in range(road_width // 2, self.height, block_size):
+        for y in range(block_size, self.height, block_size):
             # Skip if too close to edge
             if y >= self.height - road_width // 2:
                 continue
@@ -645,7 +847,7 @@ class Map:
             })
 
         # Create vertical roads
-        for x in range(road_width // 2, self.width, block_size):
+        for x in range(block_size, self.width, block_size):
             # Skip if too close to edge
             if x >= self.width - road_width // 2:
                 continue
@@ -657,8 +859,8 @@ class Map:
             })
 
         # Create traffic lights at intersections
-        for x in range(road_width // 2, self.width, block_size):
-            for y in range(road_width // 2, self.height, block_size):
+        for x in range(block_size, self.width, block_size):
+            for y in range(block_size, self.height, block_size):
                 # Create a traffic light at each intersection
                 self.traffic_lights.append({
                     "position": (x, y),
@@ -670,25 +872,8 @@ class Map:
         print(f"Added {len(self.traffic_lights)} traffic lights at intersections")
 
     def get_sky_color(self):
-        # Find the two closest time points
-        times = sorted(self.sky_colors.keys())
-        for i in range(len(times)):
-            if self.time_of_day <= times[i]:
-                if i == 0:
-                    t1, t2 = times[-1], times[0]
-                    factor = self.time_of_day / times[0]
-                else:
-                    t1, t2 = times[i-1], times[i]
-                    factor = (self.time_of_day - t1) / (t2 - t1)
-                break
-        else:
-            t1, t2 = times[-1], times[0]
-            factor = (self.time_of_day - t1) / (1.0 - t1)
-
-        # Interpolate between colors
-        c1 = self.sky_colors[t1]
-        c2 = self.sky_colors[t2]
-        return tuple(int(c1[i] + (c2[i] - c1[i]) * factor) for i in range(3))
+        # Sky colours are interpolated once into the lighting lookup table
+        return self.lighting.sky_color(self.time_of_day)
 
     def draw_minimap(self, screen, player_x, player_y):
         # Draw minimap in top-right corner
@@ -730,6 +915,19 @@ class Map:
 
 
 class Vehicle:
+    body_surfaces = {}  # (color, size, lights) -> unrotated body sprite shared by all cars
+
+    # More varied and realistic car colors
+    COLORS = [
+        (200, 0, 0),    # Red
+        (0, 0, 200),    # Blue
+        (40, 40, 40),   # Dark Gray
+        (200, 200, 200),# Silver
+        (255, 255, 255),# White
+        (0, 100, 0),    # Dark Green
+    ]
+    POLICE_COLOR = (0, 0, 150)  # Police blue
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -741,16 +939,9 @@ class Vehicle:
         # GTA1/2 style: vehicles take up exactly one lane width (40 pixels)
         self.size = (40, 20)  # Increased to match GTA style (wider, proportionally longer)
         self.rect = pygame.Rect(x - self.size[0]/2, y - self.size[1]/2, self.size[0], self.size[1])
-        # More varied and realistic car colors
-        self.color = random.choice([
-            (200, 0, 0),    # Red
-            (0, 0, 200),    # Blue
-            (40, 40, 40),   # Dark Gray
-            (200, 200, 200),# Silver
-            (255, 255, 255),# White
-            (0, 100, 0),    # Dark Green
-        ])
+        self.color = random.choice(Vehicle.COLORS)
         self.stolen = False  # Flag to track if vehicle was stolen
+        self.lane_entry = float("-inf")  # Where it joined its lane (see traffic.py)
 
     def move(self, forward, turn, walls):
         # Update speed based on acceleration and direction
@@ -796,59 +987,86 @@ class Vehicle:
             self.y = new_y
             self.rect = new_rect
 
-    def draw(self, screen, camera_x, camera_y):
-        screen_x = self.x - camera_x
-        screen_y = self.y - camera_y
-
-        # Only draw if vehicle is on screen (with some margin)
-        screen_rect = screen.get_rect()
-        if (screen_x + self.size[0] < -50 or screen_x - self.size[0] > screen_rect.width + 50 or
-            screen_y + self.size[1] < -50 or screen_y - self.size[1] > screen_rect.height + 50):
-            return
-
-        # Create a surface for the rotated car with proper alpha
-        car_surface = pygame.Surface(self.size, pygame.SRCALPHA)
+    def get_sprites(self, camera_x, camera_y):
+        # Unrotated body plus angle; the renderer rotates it around the car's center
+        return [(self.get_body_surface(), (self.x - camera_x, self.y - camera_y), self.rotation)]
+
+    def get_body_surface(self):
+        # Car bodies only depend on colour, size and whether the lights are drawn, so share them
+        show_lights = self.rotation in [0, 180]
+        key = (self.color, self.size, show_lights)
+        car_surface = Vehicle.body_surfaces.get(key)
+        if car_surface is None:
+            car_surface = Vehicle.body_surfaces[key] = Vehicle.build_body(*key)
+        return car_surface
+
+    @staticmethod
+    def build_body(color, size, show_lights):
+        """Draw an unrotated car body (safe on a background thread)"""
+        # Create a surface for the car with proper alpha
+        car_surface = pygame.Surface(size, pygame.SRCALPHA)
 
         # Draw the vehicle body
-        pygame.draw.rect(car_surface, self.color, (0, 0, self.size[0], self.size[1]))
+        pygame.draw.rect(car_surface, color, (0, 0, size[0], size[1]))
 
         # Add windows (black rectangles with transparency)
         window_color = (30, 30, 30, 200)
-        window_width = self.size[0] // 4
-        window_height = self.size[1] // 2
+        window_width = size[0] // 4
+        window_height = size[1] // 2
 
         # Front window
         pygame.draw.rect(car_surface, window_color, 
-                        (self.size[0] - window_width - 4, 2, window_width, window_height))
+                        (size[0] - window_width - 4, 2, window_width, window_height))
         # Back window
         pygame.draw.rect(car_surface, window_color,
                         (4, 2, window_width, window_height))
 
         # Add headlights and taillights
         light_size = 3
-        if self.rotation in [0, 180]:  # Horizontal orientation
+        if show_lights:  # Horizontal orientation
             # Headlights (white)
             pygame.draw.rect(car_surface, (255, 255, 200),
-                           (self.size[0] - light_size - 1, 2, light_size, light_size))
+                           (size[0] - light_size - 1, 2, light_size, light_size))
             pygame.draw.rect(car_surface, (255, 255, 200),
-                           (self.size[0] - light_size - 1, self.size[1] - light_size - 2, light_size, light_size))
+                           (size[0] - light_size - 1, size[1] - light_size - 2, light_size, light_size))
             # Taillights (red)
             pygame.draw.rect(car_surface, (255, 0, 0),
                            (1, 2, light_size, light_size))
             pygame.draw.rect(car_surface, (255, 0, 0),
-                           (1, self.size[1] - light_size - 2, light_size, light_size))
-
-        # Rotate the surface
-        rotated_surface = pygame.transform.rotate(car_surface, -self.rotation)
-
-        # Draw the rotated vehicle
-        screen.blit(rotated_surface, (screen_x - rotated_surface.get_width()/2,
-                                    screen_y - rotated_surface.get_height()/2))
+                           (1, size[1] - light_size - 2, light_size, light_size))
+
+        return car_surface
+
+    @classmethod
+    def prepare_bodies(cls, pool, size=(40, 20)):
+        """Build the body of every standard car colour on the background pool"""
+        for color in cls.COLORS + [cls.POLICE_COLOR]:
+            for show_lights in (True, False):
+                key = (color, size, show_lights)
+                if key not in cls.body_surfaces:
+                    pool.submit(cls.build_body, *key,
+                                on_ready=lambda surface, key=key: cls.body_surfaces.setdefault(key, surface))
+
+    def emit_lights(self, lighting):
+        # Headlights: two soft cones just ahead of the front bumper
+        angle = math.radians(self.rotation)
+        forward_x = math.cos(angle)
+        forward_y = math.sin(angle)
+        reach = self.size[0] / 2 + 18
+        spread = self.size[1] / 3
+        for side in (-1, 1):
+            lighting.add_light(
+                self.x + forward_x * reach - forward_y * spread * side,
+                self.y + forward_y * reach + forward_x * spread * side,
+                24, (140, 140, 100)
+            )
 
 class PoliceVehicle(Vehicle):
+    siren_surfaces = {}  # current_siren -> siren sprite
+
     def __init__(self, x, y):
         super().__init__(x, y)
-        self.color = (0, 0, 150)  # Police blue
+        self.color = Vehicle.POLICE_COLOR
         self.max_speed = 4  # Faster than regular vehicles but more realistic for GTA1/2
         self.acceleration = 0.12  # Slightly better acceleration than civilian cars
         self.target = None
@@ -946,36 +1164,45 @@ class PoliceVehicle(Vehicle):
                 # Not on a road, try to find one
                 super().move(0.3, random.choice([-1, 0, 1]), walls)
 
-    def draw(self, screen, camera_x, camera_y):
-        super().draw(screen, camera_x, camera_y)
+    def get_sprites(self, camera_x, camera_y):
+        sprites = super().get_sprites(camera_x, camera_y)
 
         # Draw siren lights if active
         if self.siren_active:
             screen_x = self.x - camera_x
             screen_y = self.y - camera_y
 
-            # Create a surface for the siren with proper alpha
-            siren_surface = pygame.Surface((10, 6), pygame.SRCALPHA)
+            # Siren sprite for the current colour phase, shared by all police cars
+            siren_surface = PoliceVehicle.siren_surfaces.get(self.current_siren)
+            if siren_surface is None:
+                siren_surface = pygame.Surface((10, 6), pygame.SRCALPHA)
 
-            # Draw the siren lights on top of the car
-            pygame.draw.circle(siren_surface, self.siren_colors[self.current_siren], (3, 3), 3)
-            pygame.draw.circle(siren_surface, self.siren_colors[1-self.current_siren], (7, 3), 3)
-
-            # Rotate the surface with the car
-            rotated_siren = pygame.transform.rotate(siren_surface, -self.rotation)
+                # Draw the siren lights on top of the car
+                pygame.draw.circle(siren_surface, self.siren_colors[self.current_siren], (3, 3), 3)
+                pygame.draw.circle(siren_surface, self.siren_colors[1-self.current_siren], (7, 3), 3)
+                PoliceVehicle.siren_surfaces[self.current_siren] = siren_surface
 
             # Calculate offset to place siren on top of car
             angle = math.radians(self.rotation)
             offset_x = math.cos(angle+math.pi/2) * 10
             offset_y = math.sin(angle+math.pi/2) * 10
 
-            # Draw the siren
-            screen.blit(rotated_siren, (
-                screen_x - rotated_siren.get_width()/2 + offset_x,
-                screen_y - rotated_siren.get_height()/2 + offset_y
-            ))
+            # Draw the siren on top of the car, rotated with it
+            sprites.append((siren_surface, (screen_x + offset_x, screen_y + offset_y), self.rotation))
+
+        return sprites
+
+    def emit_lights(self, lighting):
+        super().emit_lights(lighting)
+
+        # Siren glow alternates with the siren animation
+        if self.siren_active:
+            lighting.add_light(self.x, self.y, 48, self.siren_colors[self.current_siren])
 
 class Player:
+    bullet_surface = None  # Shared bullet sprite, built on first use
+    rocket_surface = None  # Shared rocket sprite, built on first use
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -1003,8 +1230,11 @@ class Player:
         self.has_weapon = True  # Player starts with a weapon
         self.shooting = False
         self.shoot_cooldown = 0
+        self.shoot_cooldown_time = 20  # Frames between shots
         self.bullet_speed = 10
         self.bullets = []
+        self.rockets = False  # Fire rockets instead of bullets (cheat)
+        self.invincible = False  # Ignore damage (cheat)
 
         # Wanted system
         self.wanted_level = 0
@@ -1084,7 +1314,8 @@ class Player:
         # Update player rectangle after movement
         self.rect = pygame.Rect(self.x - self.size/2, self.y - self.size/2, self.size, self.size)
 
-    def draw(self, screen, camera_x, camera_y):
+    def get_sprites(self, camera_x, camera_y):
+        # Build this frame's sprites as [(surface, screen_pos), ...] for the render queue
         try:
             screen_x = self.x - camera_x
             screen_y = self.y - camera_y
@@ -1172,14 +1403,15 @@ class Player:
             if self.direction == 'left':
                 char_surface = pygame.transform.flip(char_surface, True, False)
 
-            # Draw the character surface onto the screen
-            screen.blit(char_surface, 
-                       (screen_x - char_surface.get_width()/2,
-                        screen_y - char_surface.get_height()/2))
+            # Position the character surface around the player
+            return [(char_surface, 
+                     (screen_x - char_surface.get_width()/2,
+                      screen_y - char_surface.get_height()/2))]
         except Exception as e:
             print(f"Error in player.draw(): {e}")
             import traceback
             traceback.print_exc()
+            return []
 
     def enter_exit_vehicle(self, vehicles):
         if self.vehicle_entry_cooldown > 0:
@@ -1209,7 +1441,7 @@ class Player:
             return
 
         self.shooting = True
-        self.shoot_cooldown = 20  # Cooldown between shots
+        self.shoot_cooldown = self.shoot_cooldown_time  # Cooldown between shots
 
         # Calculate bullet starting position and velocity based on player direction
         if self.direction == 'right':
@@ -1230,13 +1462,19 @@ class Player:
         start_y = self.y + math.sin(math.radians(angle)) * (self.size + 5)
 
         # Add bullet to list
-        self.bullets.append({
+        bullet = {
             "x": start_x,
             "y": start_y,
             "dx": bullet_dx,
             "dy": bullet_dy,
             "life": 60  # Bullet disappears after 60 frames
-        })
+        }
+        if self.rockets:
+            # Rockets are bigger, hit harder and explode on impact
+            bullet["is_rocket"] = True
+            bullet["size"] = 8
+            bullet["damage"] = 3
+        self.bullets.append(bullet)
 
         # Shooting increases wanted level
         self.wanted_level += 0.2
@@ -1254,8 +1492,10 @@ class Player:
             bullet["y"] += bullet["dy"]
             bullet["life"] -= 1
 
-            if bullet["life"] <= 0:
+            # Spent, or stopped by a wall or a vehicle: rockets explode either way
+            if bullet["life"] <= 0 or self.bullet_blocked(bullet):
                 self.bullets.remove(bullet)
+                self.bullet_hit(bullet)
 
         # Update wanted level
         if self.wanted_cooldown > 0:
@@ -1263,19 +1503,42 @@ class Player:
         elif self.wanted_level > 0:
             self.wanted_level = max(0, self.wanted_level - 0.001)  # Gradually decrease wanted level
 
-    def draw_bullets(self, screen, camera_x, camera_y):
-        for bullet in self.bullets:
-            screen_x = bullet["x"] - camera_x
-            screen_y = bullet["y"] - camera_y
-
-            # Only draw if bullet is on screen
-            screen_rect = screen.get_rect()
-            if (screen_x < 0 or screen_x > screen_rect.width or
-                screen_y < 0 or screen_y > screen_rect.height):
-                continue
-
-            # Draw bullet
-            pygame.draw.circle(screen, (255, 255, 0), (int(screen_x), int(screen_y)), 2)
+    def bullet_blocked(self, bullet):
+        # Walls and vehicles (other than the player's own) stop bullets
+        if self.game is None:
+            return False
+        x, y = int(bullet["x"]), int(bullet["y"])
+        collision = self.game.map.collision
+        height, width = collision.shape
+        if 0 <= x < width and 0 <= y < height and collision[y, x]:
+            return True
+        return any(vehicle is not self.in_vehicle and vehicle.rect.collidepoint(x, y)
+                   for vehicle in self.game.entity_index.query_radius(x, y, 40, "vehicle"))
+
+    def take_damage(self, amount):
+        # Every hit on the player goes through here, so invincibility covers them all
+        if self.invincible or not hasattr(self, 'health'):
+            return False
+        self.health -= amount
+        return True
+
+    def bullet_hit(self, bullet):
+        # A bullet struck something; rockets explode where they land
+        bullet["hit"] = True
+        if bullet.get("is_rocket") and self.game and hasattr(self.game, 'cheat_system'):
+            self.game.cheat_system.explode_rocket(bullet)
+
+    def get_bullet_sprite(self, bullet, camera_x, camera_y):
+        # Bullets share one small cached sprite, rockets another
+        if bullet.get("is_rocket"):
+            if Player.rocket_surface is None:
+                Player.rocket_surface = pygame.Surface((8, 8), pygame.SRCALPHA)
+                pygame.draw.circle(Player.rocket_surface, (255, 100, 0), (4, 4), 4)
+            return (Player.rocket_surface, (bullet["x"] - camera_x - 4, bullet["y"] - camera_y - 4))
+        if Player.bullet_surface is None:
+            Player.bullet_surface = pygame.Surface((4, 4), pygame.SRCALPHA)
+            pygame.draw.circle(Player.bullet_surface, (255, 255, 0), (2, 2), 2)
+        return (Player.bullet_surface, (bullet["x"] - camera_x - 2, bullet["y"] - camera_y - 2))
 
     def draw_wanted_level(self, screen):
         if self.wanted_level > 0:
@@ -1283,11 +1546,14 @@ class Player:
             star_count = min(5, int(self.wanted_level))
             for i in range(star_count):
                 # Draw a simple star (or just use text for now)
-                font = pygame.font.SysFont(None, 30)
+                font = rendering.font(None, 30)
                 star_text = font.render("★", True, (255, 255, 0))
                 screen.blit(star_text, (10 + i * 25, 10))
 
 class Pedestrian:
+    body_surfaces = {}  # (colors, size, pose) -> body sprite shared by all pedestrians
+    WALK_STEPS = 4  # Cached poses per animation frame (frames advance 0.1-0.3 a tick)
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -1330,17 +1596,14 @@ class Pedestrian:
         self.flee_target = None
         self.health = 1  # 0 = dead
         self.is_dead = False
-        self.dead_timer = 0
+        self.despawn_timer = None  # Scheduler handle set by the map once dead
 
     def check_collision(self, obj_rect):
         return self.rect.colliderect(obj_rect)
 
-    def update_ai(self, player, walls, roads, vehicles, bullets, other_pedestrians):
+    def update_ai(self, player, walls, paths, vehicles, bullets, other_pedestrians, on_death=None):
         if self.is_dead:
-            self.dead_timer += 1
-            if self.dead_timer > 600:  # Despawn after 10 seconds
-                return True  # Signal to remove this pedestrian
-            return False
+            return False  # Bodies are despawned by the map's scheduler
 
         # Check for bullet hits
         for bullet in bullets:
@@ -1348,7 +1611,10 @@ class Pedestrian:
             if self.rect.colliderect(bullet_rect):
                 self.health = 0
                 self.is_dead = True
+                if on_death:
+                    on_death(self)
                 bullets.remove(bullet)
+                player.bullet_hit(bullet)
                 # Shooting pedestrians increases wanted level significantly
                 player.wanted_level += 2
                 return False
@@ -1359,6 +1625,8 @@ class Pedestrian:
                 if vehicle.speed > 2:  # Only die if car is moving somewhat fast
                     self.health = 0
                     self.is_dead = True
+                    if on_death:
+                        on_death(self)
                     # Being run over increases wanted level
                     if vehicle == player.in_vehicle:
                         player.wanted_level += 1
@@ -1368,8 +1636,8 @@ class Pedestrian:
         self.ai_timer -= 1
         if self.ai_timer <= 0:
             if self.ai_state == "wander":
-                # Randomly choose a new direction or wait
-                self.direction = random.choice(['up', 'down', 'left', 'right'])
+                # Randomly choose a new direction (along the walkway) or wait
+                self.direction = paths.turn(self.x, self.y)
                 self.ai_state = random.choice(["wander", "wander", "wander", "wait"])
                 self.ai_timer = random.randint(30, 120)
             elif self.ai_state == "wait":
@@ -1398,28 +1666,8 @@ class Pedestrian:
         # Execute behavior based onstate
         if self.ai_state == "wander":
             self.moving = True
-            # Try to follow roads if on them
-            on_sidewalk = False
-            for road in roads:
-                road_rect = road["rect"]
-                # Check if pedestrian is near road edge (sidewalk)
-                sidewalk_width = 10
-                road_inner = pygame.Rect(
-                    road_rect.x + sidewalk_width, 
-                    road_rect.y + sidewalk_width,
-                    road_rect.width - sidewalk_width * 2,
-                    road_rect.height - sidewalk_width * 2
-                )
-
-                if road_rect.collidepoint(self.x, self.y) and not road_inner.collidepoint(self.x, self.y):
-                    on_sidewalk = True
-                    # Follow road direction
-                    if road["horizontal"]:
-                        if random.random() < 0.8:  # 80% chance to follow road
-                            self.direction = 'left' if random.random() < 0.5 else 'right'
-                    else:  # vertical road
-                        if random.random() < 0.8:  # 80% chance to follow road
-                            self.direction = 'up' if random.random() < 0.5 else 'down'
+            # Follow the walkway (or head back to it)
+            self.direction = paths.wander(self.x, self.y, self.direction)
 
             # Move in current direction
             if self.direction == 'right':
@@ -1438,14 +1686,15 @@ class Pedestrian:
             # Update collision rect
             new_rect = pygame.Rect(new_x - self.size/2, new_y - self.size/2, self.size, self.size)
 
-            # Check collision with walls
+            # Check collision with walls (nothing to test on the walkways, which keep clear of them)
             can_move = True
-            for wall in walls:
-                if new_rect.colliderect(wall["rect"]):
-                    can_move = False
-                    # Change direction when hitting wall
-                    self.direction = random.choice(['up', 'down', 'left', 'right'])
-                    break
+            if not paths.clear(new_x, new_y):
+                for wall in walls:
+                    if new_rect.colliderect(wall["rect"]):
+                        can_move = False
+                        # Change direction when hitting wall
+                        self.direction = paths.turn(self.x, self.y)
+                        break
 
             # Check collision with other pedestrians
             for ped in other_pedestrians:
@@ -1491,17 +1740,18 @@ class Pedestrian:
                 # Update collision rect
                 new_rect = pygame.Rect(new_x - self.size/2, new_y - self.size/2, self.size, self.size)
 
-                # Check collision with walls
+                # Check collision with walls (none near the walkways)
                 can_move = True
-                for wall in walls:
-                    if new_rect.colliderect(wall["rect"]):
-                        can_move = False
-                        # Try another direction when fleeing
-                        if abs(dx) > abs(dy):
-                            self.direction = random.choice(['up', 'down'])
-                        else:
-                            self.direction = random.choice(['left', 'right'])
-                        break
+                if not paths.clear(new_x, new_y):
+                    for wall in walls:
+                        if new_rect.colliderect(wall["rect"]):
+                            can_move = False
+                            # Try another direction when fleeing
+                            if abs(dx) > abs(dy):
+                                self.direction = random.choice(['up', 'down'])
+                            else:
+                                self.direction = random.choice(['left', 'right'])
+                            break
 
                 if can_move:
                     self.x = new_x
@@ -1520,67 +1770,87 @@ class Pedestrian:
     def distance_to_pos(self, x, y):
         return math.sqrt((self.x - x)**2 + (self.y - y)**2)
 
-    def draw(self, screen, camera_x, camera_y):
+    def get_sprites(self, camera_x, camera_y):
+        # Build this frame's sprites as [(surface, screen_pos), ...] for the render queue
         screen_x = self.x - camera_x
         screen_y = self.y - camera_y
+        char_surface = self.get_body_surface()
 
-        # Only draw if on screen
-        screen_rect = screen.get_rect()
-        if (screen_x + self.size < 0 or screen_x - self.size > screen_rect.width or
-            screen_y + self.size < 0 or screen_y - self.size > screen_rect.height):
-            return
+        if self.is_dead:
+            # Rotate randomly for varied death poses (applied by the renderer)
+            seed = hash(f"{self.x}_{self.y}") % 360  # Consistent rotation based on position
+            return [(char_surface, (screen_x, screen_y), -seed)]
 
-        # Create a surface for the character with transparency
-        char_surface = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
+        # Position the character surface around the pedestrian
+        return [(char_surface, 
+                 (screen_x - char_surface.get_width()/2,
+                  screen_y - char_surface.get_height()/2))]
 
+    def get_body_surface(self):
+        # Bodies only depend on colours, size and pose; the walk cycle repeats every 2 frames
         if self.is_dead:
+            pose = None
+        else:
+            step = int(self.animation_frame % 2 * Pedestrian.WALK_STEPS)
+            pose = (self.moving, step, self.direction == 'left')
+        key = (tuple(sorted(self.colors.items())), self.size, pose)
+        char_surface = Pedestrian.body_surfaces.get(key)
+        if char_surface is None:
+            char_surface = Pedestrian.body_surfaces[key] = Pedestrian.build_body(dict(key[0]), self.size, pose)
+        return char_surface
+
+    @staticmethod
+    def build_body(colors, size, pose):
+        # Draw one pose with transparency; pose is None for a body, else (moving, walk step, facing left)
+        char_surface = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+
+        if pose is None:
             # Draw dead pedestrian (lying on ground)
             pygame.draw.ellipse(
                 char_surface,
-                self.colors['shirt'],
-                (self.size - self.size * 0.8, self.size - self.size * 0.4, self.size * 1.6, self.size * 0.8)
+                colors['shirt'],
+                (size - size * 0.8, size - size * 0.4, size * 1.6, size * 0.8)
             )
             # Head
             pygame.draw.circle(
                 char_surface,
-                self.colors['skin'],
-                (self.size - self.size * 0.5, self.size),
-                self.size * 0.3
+                colors['skin'],
+                (size - size * 0.5, size),
+                size * 0.3
             )
             # Blood puddle
             pygame.draw.ellipse(
                 char_surface,
                 (150, 0, 0, 180),  # Semi-transparent red
-                (self.size - self.size * 0.9, self.size - self.size * 0.5, self.size * 1.8, self.size)
+                (size - size * 0.9, size - size * 0.5, size * 1.8, size)
             )
 
-            # Rotate randomly for varied death poses
-            seed = hash(f"{self.x}_{self.y}") % 360  # Consistent rotation based on position
-            char_surface = pygame.transform.rotate(char_surface, seed)
-
         else:
+            moving, step, _ = pose
+            frame = step / Pedestrian.WALK_STEPS
+
             # Animation offsets
-            walk_offset = math.sin(self.animation_frame * math.pi) * 2 if self.moving else 0
-            head_bob = math.sin(self.animation_frame * math.pi * 2) * 1.5  # South Park style head bob
+            walk_offset = math.sin(frame * math.pi) * 2 if moving else 0
+            head_bob = math.sin(frame * math.pi * 2) * 1.5  # South Park style head bob
 
             # Draw character from top-down perspective
             # Head (South Park Canadian style)
-            head_top = self.size - head_bob
-            head_bottom = self.size + head_bob
-            head_width = self.size * 0.7  # Slightly smaller than player
+            head_top = size - head_bob
+            head_bottom = size + head_bob
+            head_width = size * 0.7  # Slightly smaller than player
 
             # Top of head
             pygame.draw.ellipse(
                 char_surface,
-                self.colors['skin'],
-                (self.size - head_width/2, head_top - head_width/2, head_width, head_width)
+                colors['skin'],
+                (size - head_width/2, head_top - head_width/2, head_width, head_width)
             )
 
             # Bottom of head
             pygame.draw.ellipse(
                 char_surface,
-                self.colors['skin'],
-                (self.size - head_width/2, head_bottom - head_width/2, head_width * 0.8, head_width * 0.4)
+                colors['skin'],
+                (size - head_width/2, head_bottom - head_width/2, head_width * 0.8, head_width * 0.4)
             )
 
             # Beady eyes
@@ -1588,82 +1858,79 @@ class Pedestrian:
             eye_spacing = 4
             pygame.draw.circle(
                 char_surface,
-                self.colors['eyes'],
-                (self.size - eye_spacing, self.size),
+                colors['eyes'],
+                (size - eye_spacing, size),
                 eye_size
             )
             pygame.draw.circle(
                 char_surface,
-                self.colors['eyes'],
-                (self.size + eye_spacing, self.size),
+                colors['eyes'],
+                (size + eye_spacing, size),
                 eye_size
             )
 
             # Body (simple oval shape)
             body_points = [
-                (self.size - self.size * 0.3, self.size + head_width * 0.3),    # Top left
-                (self.size + self.size * 0.3, self.size + head_width * 0.3),    # Top right
-                (self.size + self.size * 0.4, self.size + self.size * 0.6),     # Bottom right
-                (self.size - self.size * 0.4, self.size + self.size * 0.6)      # Bottom left
+                (size - size * 0.3, size + head_width * 0.3),    # Top left
+                (size + size * 0.3, size + head_width * 0.3),    # Top right
+                (size + size * 0.4, size + size * 0.6),     # Bottom right
+                (size - size * 0.4, size + size * 0.6)      # Bottom left
             ]
-            pygame.draw.polygon(char_surface, self.colors['shirt'], body_points)
+            pygame.draw.polygon(char_surface, colors['shirt'], body_points)
 
             # Legs with walking animation
-            if self.moving:
+            if moving:
                 leg_offset = walk_offset * 1.5
                 # Left leg
                 left_leg = [
-                    (self.size - self.size * 0.25, self.size + self.size * 0.5),
-                    (self.size - self.size * 0.15, self.size + self.size * 0.5),
-                    (self.size - self.size * 0.2 + leg_offset, self.size + self.size * 0.8),
-                    (self.size - self.size * 0.3 + leg_offset, self.size + self.size * 0.8)
+                    (size - size * 0.25, size + size * 0.5),
+                    (size - size * 0.15, size + size * 0.5),
+                    (size - size * 0.2 + leg_offset, size + size * 0.8),
+                    (size - size * 0.3 + leg_offset, size + size * 0.8)
                 ]
                 # Right leg
                 right_leg = [
-                    (self.size + self.size * 0.15, self.size + self.size * 0.5),
-                    (self.size + self.size * 0.25, self.size + self.size * 0.5),
-                    (self.size + self.size * 0.3 - leg_offset, self.size + self.size * 0.8),
-                    (self.size + self.size * 0.2 - leg_offset, self.size + self.size * 0.8)
+                    (size + size * 0.15, size + size * 0.5),
+                    (size + size * 0.25, size + size * 0.5),
+                    (size + size * 0.3 - leg_offset, size + size * 0.8),
+                    (size + size * 0.2 - leg_offset, size + size * 0.8)
                 ]
-                pygame.draw.polygon(char_surface, self.colors['pants'], left_leg)
-                pygame.draw.polygon(char_surface, self.colors['pants'], right_leg)
+                pygame.draw.polygon(char_surface, colors['pants'], left_leg)
+                pygame.draw.polygon(char_surface, colors['pants'], right_leg)
 
                 # Shoes
-                pygame.draw.circle(char_surface, self.colors['shoes'],
-                                 (self.size - self.size * 0.25 + leg_offset, self.size + self.size * 0.8), 3)
-                pygame.draw.circle(char_surface, self.colors['shoes'],
-                                 (self.size + self.size * 0.25 - leg_offset, self.size + self.size * 0.8), 3)
+                pygame.draw.circle(char_surface, colors['shoes'],
+                                 (size - size * 0.25 + leg_offset, size + size * 0.8), 3)
+                pygame.draw.circle(char_surface, colors['shoes'],
+                                 (size + size * 0.25 - leg_offset, size + size * 0.8), 3)
             else:
                 # Standing still legs
                 left_leg = [
-                    (self.size - self.size * 0.25, self.size + self.size * 0.5),
-                    (self.size- self.size * 0.15, self.size + self.size * 0.5),
-                    (self.size - self.size * 0.2, self.size + self.size * 0.8),
-                    (self.size - self.size * 0.3, self.size + self.size * 0.8)
+                    (size - size * 0.25, size + size * 0.5),
+                    (size- size * 0.15, size + size * 0.5),
+                    (size - size * 0.2, size + size * 0.8),
+                    (size - size * 0.3, size + size * 0.8)
                 ]
                 right_leg = [
-                    (self.size + self.size * 0.15, self.size + self.size * 0.5),
-                    (self.size + self.size * 0.25, self.size + self.size * 0.5),
-                    (self.size + self.size * 0.3, self.size + self.size * 0.8),
-                    (self.size + self.size * 0.2, self.size + self.size * 0.8)
+                    (size + size * 0.15, size + size * 0.5),
+                    (size + size * 0.25, size + size * 0.5),
+                    (size + size * 0.3, size + size * 0.8),
+                    (size + size * 0.2, size + size * 0.8)
                 ]
-                pygame.draw.polygon(char_surface, self.colors['pants'], left_leg)
-                pygame.draw.polygon(char_surface, self.colors['pants'], right_leg)
+                pygame.draw.polygon(char_surface, colors['pants'], left_leg)
+                pygame.draw.polygon(char_surface, colors['pants'], right_leg)
 
                 # Shoes
-                pygame.draw.circle(char_surface, self.colors['shoes'],
-                                 (self.size - self.size * 0.25, self.size + self.size * 0.8), 3)
-                pygame.draw.circle(char_surface, self.colors['shoes'],
-                                 (self.size + self.size * 0.25, self.size + self.size * 0.8), 3)
+                pygame.draw.circle(char_surface, colors['shoes'],
+                                 (size - size * 0.25, size + size * 0.8), 3)
+                pygame.draw.circle(char_surface, colors['shoes'],
+                                 (size + size * 0.25, size + size * 0.8), 3)
 
         # Apply character direction
-        if self.direction == 'left':
+        if pose is not None and pose[2]:
             char_surface = pygame.transform.flip(char_surface, True, False)
 
-        # Draw the character surface onto the screen
-        screen.blit(char_surface, 
-                   (screen_x - char_surface.get_width()/2,
-                    screen_y - char_surface.get_height()/2))
+        return char_surface
 
     class Map:
         def __init__(self):
@@ -1766,18 +2033,7 @@ class Pedestrian:
                 darkness.fill((0, 0, 0, alpha))
                 screen.blit(darkness, (0, 0))
 
-            # Draw other game objects (vehicles, pedestrians, etc.)
-            # Draw pedestrians in proper order
-            for pedestrian in self.pedestrians:
-                pedestrian.draw(screen, camera_x, camera_y)
-
-            # Draw regular vehicles
-            for vehicle in self.vehicles:
-                vehicle.draw(screen, camera_x, camera_y)
-
-            # Draw police vehicles
-            for vehicle in self.police_vehicles:
-                vehicle.draw(screen, camera_x, camera_y)
+            # Vehicles and pedestrians are drawn by Game's render queue
 
         def spawn_vehicles(self, count):
             for _ in range(count):
@@ -1956,7 +2212,10 @@ class Pedestrian:
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, seeds=None, saved=None, workers=0, startup=None):
+        # Startup phase timings up to the first frame (main() passes one that includes the imports)
+        self.startup = startup or profiler.StartupProfile()
+
         # Only set SDL variables for Replit environment
         if os.environ.get('REPL_ID'):
             os.environ['SDL_VIDEODRIVER'] = 'x11'
@@ -1984,18 +2243,28 @@ class Game:
             # Use resizable window for desktop mode
             is_desktop = not os.environ.get('REPL_ID') and not detect_mobile()
 
+            # Surface (CPU blits) or texture (SDL2 renderer) backend, picked via GAME_RENDERER
+            self.renderer = renderer.create_renderer()
+            try:
+                self.screen = self.renderer.open((self.width, self.height), resizable=is_desktop)
+            except Exception as e:
+                if self.renderer.name == "surface":
+                    raise
+                print(f"Error opening {self.renderer.name} renderer: {e}, using surface renderer")
+                self.renderer = renderer.SurfaceRenderer()
+                self.screen = self.renderer.open((self.width, self.height), resizable=is_desktop)
+
             if is_desktop:
-                self.screen = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
-                pygame.display.set_caption("GTA-Style Game - Desktop Mode (Resizable)")
+                self.renderer.set_caption("GTA-Style Game - Desktop Mode (Resizable)")
                 print("Desktop mode detected, using resizable window")
             else:
-                self.screen = pygame.display.set_mode((self.width, self.height))
-                pygame.display.set_caption("GTA-Style Game")
+                self.renderer.set_caption("GTA-Style Game")
 
-            print(f"Display mode set: {self.width}x{self.height}")
+            print(f"Display mode set: {self.width}x{self.height} ({self.renderer.name} renderer)")
         except Exception as e:
             print(f"Error setting display mode: {e}")
             raise
+        self.startup.mark("display")
 
         # Print control instructions
         print("=== GAME CONTROLS ===")
@@ -2005,8 +2274,27 @@ class Game:
         print("P or ESC: Pause game")
         print("====================")
 
+        # Seed the world RNGs; a replay passes the seeds it was recorded with
+        # and a saved game (snapshot.load) brings its own
+        if saved is not None:
+            seeds = saved.seeds
+        self.seeds = dict(seeds) if seeds else replay.new_seeds()
+        self.seeds.setdefault("city", self.seeds["world"])
+        random.seed(self.seeds["world"])
+
         # Create game objects
-        self.map = Map()
+        # Shared tick scheduler: systems register "fire at tick T" callbacks
+        self.scheduler = scheduler.Scheduler()
+        if saved is not None:
+            self.scheduler.tick = saved.tick  # Restored timers count from here
+
+        # Slow generation (city detail, sprite variants, cache files) runs on background threads
+        self.background = background.TaskPool()
+
+        # Instances given the same city seed share one memory-mapped city (city_cache.py)
+        self.map = Map(self.scheduler, saved, self.seeds["city"], self.background)
+        Vehicle.prepare_bodies(self.background)
+        self.startup.mark("map")
 
         # Find a valid spawn point on a road
         spawn_x = self.map.width // 2
@@ -2025,17 +2313,36 @@ class Game:
         # Force camera to valid position
         self.camera_x = max(0, min(self.camera_x, self.map.width - self.width))
         self.camera_y = max(0, min(self.camera_y, self.map.height - self.height))
+
+        # World-space camera view, refreshed by update_camera()
+        self.view_margin = 50  # Extra space so rotated sprites don't pop at the edges
+        self.view_rect = pygame.Rect(0, 0, 0, 0)
+        self.cull_rect = pygame.Rect(0, 0, 0, 0)
+        self.update_view_rect()
+
+        # Spatial index of moving entities, synced once per simulation tick
+        self.entity_index = spatial_index.SpatialHash(128)
         
+        self.startup.mark("player")
+
         # Initialize side activities system
-        self.side_activities = []
         self.init_side_activities()
+        self.startup.mark("side activities")
         
         # Initialize cheat code system
         self.cheat_system = cheat_system.CheatSystem(self)
         self.dialogue_system = cheat_system.DialogueSystem(self, self.cheat_system)
+        self.startup.mark("cheats")
         
         # Initialize escalating events system
         self.event_system = event_system.EventSystem(self)
+        self.startup.mark("events")
+
+        # Index the starting entities so the first frame can cull
+        self.index_entities()
+
+        # Per-tick simulation systems, run once each by simulate()
+        self.init_systems()
 
         print(f"Initial player position: ({self.player.x}, {self.player.y})")
         print(f"Initial camera position: ({self.camera_x}, {self.camera_y})")
@@ -2045,11 +2352,18 @@ class Game:
         self.paused = False
         self.clock = pygame.time.Clock()
         self.frame_count = 0  # Add frame counter for timing events
+        self.frame_limit = 60  # Target FPS (0 = run as fast as possible)
+        self.max_frames = 0  # Stop after this many frames (0 = no limit)
+        self.replaying = False  # Input comes from a replay file
+
+        # Rendering and profiling
+        self.render_queue = rendering.RenderQueue()
+        self.profiler = profiler.FrameProfiler()
 
         # Debug info
         self.show_debug = False
-        self.font = pygame.font.SysFont(None, 24)
-        self.big_font = pygame.font.SysFont(None, 48)
+        self.font = rendering.font(None, 24)
+        self.big_font = rendering.font(None, 48)
 
         # Mobile touch controls
         self.touch_enabled = True
@@ -2064,7 +2378,9 @@ class Game:
         self.touch_button_radius = 40
         self.touch_button_margin = 20
         self.touch_button_alpha = 180  # Semi-transparent
-        self.touch_active = {}  # Track which buttons are being pressed
+        # Keyboard/touch events become one action bitmask per tick
+        self.input = input_system.InputMapper()
+        self.touch_active = self.input.touch  # Track which buttons are being pressed
 
         # Initialize touch controls
         self.init_touch_controls()
@@ -2078,6 +2394,21 @@ class Game:
         }
         self.pause_active = False
 
+        self.startup.mark("ui")
+
+        if saved is not None:
+            # Put the player, events, cheats and activities back where they were
+            snapshot.restore_game(saved, self)
+            self.startup.mark("restore snapshot")
+
+        # Optionally simulate the city's districts in worker processes (forked once
+        # the background threads are idle, so no half-held lock is copied into them)
+        if workers:
+            self.background.wait()
+        self.district_workers = workers if workers and self.map.start_districts(workers, self.seeds["world"]) else 0
+        if workers:
+            self.startup.mark("districts")
+
     def draw_debug_info(self):
         if not self.show_debug:
             return
@@ -2092,6 +2423,7 @@ class Game:
             f"Auto-control: {hasattr(self, 'auto_control_enabled') and self.auto_control_enabled}",
             f"Auto-timer: {hasattr(self, 'auto_control_timer') and self.auto_control_timer}"
         ]
+        debug_info.extend(self.profiler.report_lines())
 
         y = 10
         for info in debug_info:
@@ -2148,97 +2480,19 @@ class Game:
                 # Debug output for key presses to help diagnose issues
                 print(f"Key pressed: {pygame.key.name(event.key)} (key code: {event.key})")
                 
-                # Update our custom key states for KEYDOWN events
-                if event.key == pygame.K_w:
-                    self.key_states['w'] = True
-                    print("W key pressed - state set to True")
-                elif event.key == pygame.K_a:
-                    self.key_states['a'] = True
-                    print("A key pressed - state set to True")
-                elif event.key == pygame.K_s:
-                    self.key_states['s'] = True
-                    print("S key pressed - state set to True")
-                elif event.key == pygame.K_d:
-                    self.key_states['d'] = True
-                    print("D key pressed - state set to True")
-                elif event.key == pygame.K_UP:
-                    self.key_states['up'] = True
-                    print("UP key pressed - state set to True")
-                    # Send to cheat system for cheat code sequence
-                    self.cheat_system.process_input("up")
-                elif event.key == pygame.K_DOWN:
-                    self.key_states['down'] = True
-                    print("DOWN key pressed - state set to True")
-                    # Send to cheat system for cheat code sequence
-                    self.cheat_system.process_input("down")
-                elif event.key == pygame.K_LEFT:
-                    self.key_states['left'] = True
-                    print("LEFT key pressed - state set to True")
-                    # Send to cheat system for cheat code sequence
-                    self.cheat_system.process_input("left")
-                elif event.key == pygame.K_RIGHT:
-                    self.key_states['right'] = True
-                    print("RIGHT key pressed - state set to True")
-                    # Send to cheat system for cheat code sequence
-                    self.cheat_system.process_input("right")
-                elif event.key == pygame.K_SPACE:
-                    self.key_states['space'] = True
-                    # Send to cheat system for cheat code sequence
-                    self.cheat_system.process_input("space")
-                    if not self.paused:
-                        self.player.shoot()
-                elif event.key == pygame.K_e:
-                    self.key_states['e'] = True
-                    if not self.paused:
-                        # Check if dialogue is active first
-                        if self.dialogue_system.active:
-                            self.dialogue_system.advance_dialogue()
-                        else:
-                            # Try to interact with a nearby pedestrian for dialogue
-                            for ped in self.map.pedestrians:
-                                # Check if player is close to pedestrian
-                                dx = ped.x - self.player.x
-                                dy = ped.y - self.player.y
-                                distance = math.sqrt(dx*dx + dy*dy)
-                                if distance < 50:  # 50 pixels interaction range
-                                    # Start dialogue with this pedestrian
-                                    self.dialogue_system.start_dialogue(ped)
-                                    break
-                            else:
-                                # If no dialogue started, try to enter/exit vehicle
-                                self.player.enter_exit_vehicle(self.map.vehicles + self.map.police_vehicles)
-                elif event.key == pygame.K_F3:
+                # Movement, fire and use go through the input mapper
+                if self.input.handle_event(event):
+                    continue
+                
+                if event.key == pygame.K_F3:
                     self.show_debug = not self.show_debug
-                elif event.key == pygame.K_ESCAPE:
-                    # Toggle pause state with ESC key
-                    self.paused = not self.paused
                 # Add a quick exit key for PC testing
                 elif event.key == pygame.K_q and pygame.key.get_mods() & pygame.KMOD_CTRL:
                     print("Ctrl+Q pressed - exiting game")
                     self.running = False
                     
             elif event.type == pygame.KEYUP:
-                # Update our custom key states for KEYUP events
-                if event.key == pygame.K_w:
-                    self.key_states['w'] = False
-                elif event.key == pygame.K_a:
-                    self.key_states['a'] = False
-                elif event.key == pygame.K_s:
-                    self.key_states['s'] = False
-                elif event.key == pygame.K_d:
-                    self.key_states['d'] = False
-                elif event.key == pygame.K_UP:
-                    self.key_states['up'] = False
-                elif event.key == pygame.K_DOWN:
-                    self.key_states['down'] = False
-                elif event.key == pygame.K_LEFT:
-                    self.key_states['left'] = False
-                elif event.key == pygame.K_RIGHT:
-                    self.key_states['right'] = False
-                elif event.key == pygame.K_SPACE:
-                    self.key_states['space'] = False
-                elif event.key == pygame.K_e:
-                    self.key_states['e'] = False
+                self.input.handle_event(event)
             # Handle window resize events for PC mode
             elif event.type == pygame.VIDEORESIZE:
                 # Only handle resize events when not on Replit
@@ -2246,7 +2500,8 @@ class Game:
                     print(f"Window resized to {event.w}x{event.h}")
                     self.width = event.w
                     self.height = event.h
-                    self.screen = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
+                    self.screen = self.renderer.resize((self.width, self.height))
+                    self.update_view_rect()
 
             # Touch support for mobile
             elif event.type == pygame.MOUSEBUTTONDOWN and self.touch_enabled:
@@ -2255,8 +2510,8 @@ class Game:
                 pause_pos = self.pause_button["pos"]
                 pause_distance = math.sqrt((pos[0] - pause_pos[0])**2 + (pos[1] - pause_pos[1])**2)
                 if pause_distance <= self.pause_button["radius"]:
-                    # Toggle pause state
-                    self.paused = not self.paused
+                    # Toggle pause state (on the next tick, like ESC)
+                    self.input.touch_down("pause")
                     self.pause_active = True
                     continue  # Skip other button checks when pause is pressed
 
@@ -2269,36 +2524,12 @@ class Game:
                         distance = math.sqrt((pos[0] - button_pos[0])**2 + (pos[1] - button_pos[1])**2)
 
                         if distance <= button["radius"]:
-                            self.touch_active[name] = True
-
-                            # Perform action immediately for action buttons
-                            if name == "action":
-                                # Similar logic to E key press
-                                if self.dialogue_system.active:
-                                    self.dialogue_system.advance_dialogue()
-                                else:
-                                    # Try to interact with a nearby pedestrian for dialogue
-                                    for ped in self.map.pedestrians:
-                                        # Check if player is close to pedestrian
-                                        dx = ped.x - self.player.x
-                                        dy = ped.y - self.player.y
-                                        distance = math.sqrt(dx*dx + dy*dy)
-                                        if distance < 50:  # 50 pixels interaction range
-                                            # Start dialogue with this pedestrian
-                                            self.dialogue_system.start_dialogue(ped)
-                                            break
-                                    else:
-                                        # If no dialogue started, try to enter/exit vehicle
-                                        self.player.enter_exit_vehicle(self.map.vehicles + self.map.police_vehicles)
-                            elif name == "shoot":
-                                # Send to cheat system for cheat code sequence
-                                self.cheat_system.process_input("space")
-                                self.player.shoot()
+                            # Actions fire on the next tick's press edge
+                            self.input.touch_down(name)
 
             elif event.type == pygame.MOUSEBUTTONUP and self.touch_enabled:
                 # Reset all touch buttons and pause button
-                for name in self.touch_active:
-                    self.touch_active[name] = False
+                self.input.release_touch()
                 self.pause_active = False
 
             # Track touch movement for continuous control (only when not paused)
@@ -2340,7 +2571,7 @@ class Game:
         pygame.draw.circle(button_surface, color, self.pause_button["pos"], self.pause_button["radius"])
 
         # Add label
-        font = pygame.font.SysFont(None, 36)
+        font = rendering.font(None, 36)
         if self.paused:
             label = font.render("▶", True, (255, 255, 255))  # Play symbol when paused
         else:
@@ -2393,14 +2624,9 @@ class Game:
 
     def init_side_activities(self):
         """Initialize side activities"""
-        # Add illegal taxi activity
-        self.side_activities.append(side_activities.IllegalTaxi(self))
-        
-        # Add garbage truck race activity
-        self.side_activities.append(side_activities.GarbageTruckRace(self))
-        
-        # Add parking lot fight club activity
-        self.side_activities.append(side_activities.ParkingLotFightClub(self))
+        # The manager creates every registered activity (taxi, garbage race, fight club)
+        self.activity_manager = side_activities.ActivityManager(self)
+        self.side_activities = self.activity_manager.activities
     
     def init_touch_controls(self):
         """Initialize touch control buttons and their positions"""
@@ -2488,7 +2714,7 @@ class Game:
             pygame.draw.circle(control_surface, color, button["pos"], button["radius"])
 
             # Add button label
-            font = pygame.font.SysFont(None, 36)
+            font = rendering.font(None, 36)
             label = font.render(button["label"], True, (255, 255, 255))
             label_rect = label.get_rect(center=button["pos"])
             control_surface.blit(label, label_rect)
@@ -2501,6 +2727,76 @@ class Game:
         self.message = text
         self.message_timer = 180  # 3 seconds @ 60 FPS
     
+    def update_visual_effects(self):
+        """Count down timed visual effects and drop expired ones"""
+        for effect in self.visual_effects[:]:
+            effect["time_remaining"] -= 1
+            if effect["time_remaining"] <= 0:
+                self.visual_effects.remove(effect)
+
+    def collect_lights(self):
+        """Queue this frame's light sources with the map's lighting system"""
+        lighting = self.map.lighting
+        lighting.begin_frame(self.map.time_of_day)
+
+        # Nothing to light up in daylight
+        if not lighting.is_dark():
+            return
+
+        for vehicle in self.map.vehicles + self.map.police_vehicles:
+            vehicle.emit_lights(lighting)
+
+        # Strange lights circle slowly around the spot where the ritual started
+        for effect in self.visual_effects:
+            if effect["type"] != "strange_lights":
+                continue
+            phase = self.frame_count * 0.03
+            for i, color in enumerate([(160, 0, 200), (0, 200, 120), (200, 60, 0), (60, 60, 255)]):
+                angle = phase + i * math.pi / 2
+                lighting.add_light(
+                    effect["x"] + math.cos(angle) * 70,
+                    effect["y"] + math.sin(angle) * 70,
+                    40, color
+                )
+
+    def index_entities(self):
+        """Track moving entities in the spatial index after the simulation step"""
+        index = self.entity_index
+        body = attrgetter('x', 'y')
+        point = itemgetter('x', 'y')
+        index.track("vehicles", self.map.vehicles, "vehicle", body)
+        index.track("police", self.map.police_vehicles, "vehicle", body)
+        index.track("pedestrians", self.map.pedestrians, "pedestrian", body)
+        index.track("bullets", self.player.bullets, "bullet", point)
+        for activity in self.side_activities:
+            index.track(activity, activity.target_markers if activity.active else (),
+                        ("marker", activity.type), itemgetter(0, 1))
+        index.track("events", self.event_system.active_events, "event", point)
+
+    def visible(self, kind):
+        """Entities of one kind inside the camera view (plus margin)"""
+        return self.entity_index.query_rect(self.cull_rect, kind)
+
+    def queue_entities(self):
+        """Submit every visible entity's sprites to the render queue"""
+        queue = self.render_queue
+
+        for vehicle in self.visible("vehicle"):
+            queue.submit(vehicle, rendering.LAYER_VEHICLES, vehicle.y,
+                         vehicle.get_sprites(self.camera_x, self.camera_y))
+
+        for ped in self.visible("pedestrian"):
+            layer = rendering.LAYER_GROUND if ped.is_dead else rendering.LAYER_CHARACTERS
+            queue.submit(ped, layer, ped.y, ped.get_sprites(self.camera_x, self.camera_y))
+
+        if not self.player.in_vehicle:
+            queue.submit(self.player, rendering.LAYER_CHARACTERS, self.player.y,
+                         self.player.get_sprites(self.camera_x, self.camera_y))
+
+        for bullet in self.visible("bullet"):
+            queue.submit(bullet, rendering.LAYER_EFFECTS, bullet["y"],
+                         [self.player.get_bullet_sprite(bullet, self.camera_x, self.camera_y)])
+
     def update_camera(self):
         # Use a much tighter zoom level for authentic GTA1/2 view
         # This creates a very zoomed-in view focused primarily on the player and immediate surroundings
@@ -2520,432 +2816,390 @@ class Game:
         self.camera_x = max(margin, min(self.camera_x, self.map.width - self.width - margin))
         self.camera_y = max(margin, min(self.camera_y, self.map.height - self.height - margin))
 
-    def run(self):
-        print("Game.run() started")
+        self.update_view_rect()
+
+    def update_view_rect(self):
+        """Recompute the world-space rectangles seen by the camera"""
+        self.view_rect.update(int(self.camera_x), int(self.camera_y), self.width, self.height)
+        self.cull_rect.update(self.view_rect.inflate(self.view_margin * 2, self.view_margin * 2))
+
+    def init_systems(self):
+        """Register the simulation systems in the order they run each tick"""
+        self.systems = []  # [(name, update), ...]
+        self.register_system("player", self.player.update)
+        self.register_system("map", lambda: self.map.update(self.player))
+        self.register_system("events", lambda: self.event_system.update(self.player.x, self.player.y))
+        self.register_system("cheats", self.cheat_system.update)
+        self.register_system("dialogue", self.dialogue_system.update)
+        self.register_system("activities", lambda: self.activity_manager.update(self.player))
+        self.register_system("visual_effects", self.update_visual_effects)
+
+    def register_system(self, name, update):
+        """Add a per-tick update; every system runs exactly once per tick"""
+        if any(existing == name for existing, _ in self.systems):
+            raise ValueError(f"System '{name}' is already registered")
+        self.systems.append((name, update))
+
+    def run_systems(self):
+        """Tick every registered system once, timing each in the profiler"""
+        for name, update in self.systems:
+            with self.profiler.section(name):
+                update()
+
+    def read_input(self):
+        """Input phase: poll events, latch this tick's actions and act on new presses"""
+        # Handle window events and feed keys/touches to the input mapper
+        self.handle_events()
+        actions = self.input.begin_tick()
+
+        # ESC or the pause button toggles pause (part of the action stream so replays pause too)
+        if self.input.was_pressed(input_system.PAUSE):
+            self.paused = not self.paused
+
+        # Print debug once to see if we're getting here
+        if hasattr(self, '_first_run') == False:
+            print("First frame rendering...")
+            self._first_run = True
+
+        if not self.paused:
+            self.handle_interactions()
+
+        return actions
+
+    def handle_interactions(self):
+        """Act on this tick's presses: activities, dialogue, vehicles, shooting and cheats"""
+        # Newly pressed directions and fire feed the cheat code matcher
+        self.cheat_system.process_actions(self.input.pressed)
+        use_pressed = self.input.was_pressed(input_system.USE)
         
-        # Define direct keyboard state variables that bypass pygame.key.get_pressed()
-        # This will help with environments where key presses aren't properly detected
-        self.key_states = {
-            'up': False,
-            'down': False,
-            'left': False,
-            'right': False,
-            'w': False,
-            'a': False,
-            's': False,
-            'd': False,
-            'space': False,
-            'e': False
-        }
+        # Check for side activities that can be triggered
+        for activity in self.activity_manager.triggerable(self.player.x, self.player.y):
+            self.show_message(f"Press E to start: {activity.name}")
+            # Check if E is pressed to trigger the activity
+            if use_pressed:
+                self.activity_manager.trigger(activity)
+                use_pressed = False  # One press starts one thing
         
-        # Reset auto-control timer for this game session
-        self.auto_control_timer = 0
+        # Check for pedestrian interactions (for dialogue)
+        nearby_ped = None
+        if not self.dialogue_system.active and not self.player.in_vehicle:
+            for ped in self.entity_index.query_radius(self.player.x, self.player.y, 50, "pedestrian"):
+                if not getattr(ped, 'is_dead', False):
+                    # Close enough to talk
+                    nearby_ped = ped
+                    self.show_message("Press E to talk")
+                    break
         
-        while self.running:
-            # Handle events and update our custom key state tracking
-            self.handle_events()
-
-            # Get keyboard state - force refresh before checking
-            pygame.event.pump()  # Process event queue to ensure key state is current
-            keys = pygame.key.get_pressed()
-            
-            # Update our custom key tracking from pygame's key states
-            # This gives us two layers of key tracking for robustness
-            self.key_states['up'] = keys[pygame.K_UP]
-            self.key_states['down'] = keys[pygame.K_DOWN]
-            self.key_states['left'] = keys[pygame.K_LEFT]
-            self.key_states['right'] = keys[pygame.K_RIGHT]
-            self.key_states['w'] = keys[pygame.K_w]
-            self.key_states['a'] = keys[pygame.K_a]
-            self.key_states['s'] = keys[pygame.K_s]
-            self.key_states['d'] = keys[pygame.K_d]
-            self.key_states['space'] = keys[pygame.K_SPACE]
-            self.key_states['e'] = keys[pygame.K_e]
-
-            # Clear screen for each frame
-            self.screen.fill((0, 0, 0))
-
-            # Print debug once to see if we're getting here
-            if hasattr(self, '_first_run') == False:
-                print("First frame rendering...")
-                self._first_run = True
-
-            # Only update game state if not paused
-            if not self.paused:
-                # Update systems
-                self.event_system.update(self.player.x, self.player.y)
-                self.cheat_system.update()
-                
-                # Update dialogue system
-                if self.dialogue_system.active:
-                    self.dialogue_system.update()
-                
-                # Check for side activities that can be triggered
-                for activity in self.side_activities:
-                    if not activity.active and activity.can_trigger(self.player.x, self.player.y):
-                        self.show_message(f"Press E to start: {activity.name}")
-                        # Check if E is pressed to trigger the activity
-                        if self.key_states['e']:
-                            activity.trigger()
-                
-                # Update active side activities
-                for activity in self.side_activities:
-                    if activity.active:
-                        activity.update(self.player, self.map.walls, 
-                                      self.map.vehicles + self.map.police_vehicles, 
-                                      self.map.pedestrians)
-                
-                # Check for pedestrian interactions (for dialogue)
-                if not self.dialogue_system.active and not self.player.in_vehicle:
-                    for ped in self.map.pedestrians:
-                        if not getattr(ped, 'is_dead', False):
-                            # Check if we're close enough to talk
-                            dx = self.player.x - ped.x
-                            dy = self.player.y - ped.y
-                            distance = math.sqrt(dx*dx + dy*dy)
-                            
-                            if distance < 50:  # Close enough to talk
-                                self.show_message("Press E to talk")
-                                if self.key_states['e']:
-                                    self.dialogue_system.start_dialogue(ped)
-                                    break
-                            
+        if use_pressed:
+            if self.dialogue_system.active:
                 # Check for dialogue continuation
-                if self.dialogue_system.active and self.key_states['e']:
-                    self.dialogue_system.advance_dialogue()
-                
-                # Process cheat code input from key states
-                for key in ['up', 'down', 'left', 'right', 'space']:
-                    if self.key_states[key] and not getattr(self, '_prev_key_states', {}).get(key, False):
-                        # Key just pressed this frame
-                        self.cheat_system.process_input(key)
+                self.dialogue_system.advance_dialogue()
+            elif nearby_ped is not None:
+                self.dialogue_system.start_dialogue(nearby_ped)
+            else:
+                # If no dialogue started, try to enter/exit vehicle
+                self.player.enter_exit_vehicle(self.map.vehicles + self.map.police_vehicles)
+        
+        if self.input.was_pressed(input_system.FIRE):
+            self.player.shoot()
+
+    def simulate(self, actions):
+        """Simulate phase: advance the game by one tick"""
+        # Fire timers due this tick (event stages, cheat expiry, despawns, time limits)
+        self.scheduler.advance()
+
+        self.control_player(actions)
+        self.run_systems()
+
+        self.update_camera()
+        self.index_entities()
+
+    def control_player(self, actions):
+        """Move the player (or the player's vehicle) from this tick's actions or auto-control"""
+        up = actions & input_system.MOVE_UP
+        down = actions & input_system.MOVE_DOWN
+        left = actions & input_system.MOVE_LEFT
+        right = actions & input_system.MOVE_RIGHT
+        
+        if not self.player.in_vehicle:
+            dx = 0
+            dy = 0
+            if actions:
+                print(f"DEBUG: Actions - {self.input.describe(actions)}")
+
+            # Keyboard and touch buttons both arrive through the action mask
+            if up: 
+                dy -= 3  # Faster movement
+            if down: 
+                dy += 3  # Faster movement
+            if left: 
+                dx -= 3  # Faster movement
+            if right: 
+                dx += 3  # Faster movement
+
+            # VNC auto-control for players when keyboard isn't working
+            # For players in VNC or other environments where keyboard might not work
+            if dx == 0 and dy == 0 and self.touch_enabled and self.auto_control_enabled:
+                # Update the auto-control timer
+                self.auto_control_timer += 1
                 
-                # Store previous key states for next frame
-                self._prev_key_states = self.key_states.copy()
-                if not self.player.in_vehicle:
-                    dx = 0
-                    dy = 0
-                    # Add a much clearer key press debug
-                    print(f"DEBUG: Key states - W:{keys[pygame.K_w]} A:{keys[pygame.K_a]} S:{keys[pygame.K_s]} D:{keys[pygame.K_d]}")
-                    print(f"DEBUG: Arrow keys - UP:{keys[pygame.K_UP]} LEFT:{keys[pygame.K_LEFT]} DOWN:{keys[pygame.K_DOWN]} RIGHT:{keys[pygame.K_RIGHT]}")
-                    print(f"DEBUG: Custom key tracking - W:{self.key_states['w']} A:{self.key_states['a']} S:{self.key_states['s']} D:{self.key_states['d']}")
-                    print(f"DEBUG: Custom arrow tracking - UP:{self.key_states['up']} LEFT:{self.key_states['left']} DOWN:{self.key_states['down']} RIGHT:{self.key_states['right']}")
-
-                    # First check our custom key state tracking
-                    if self.key_states['w'] or self.key_states['up']: 
-                        dy -= 3  # Faster movement
-                        print("UP control active - Moving UP FAST")
-                    if self.key_states['s'] or self.key_states['down']: 
-                        dy += 3  # Faster movement
-                        print("DOWN control active - Moving DOWN FAST")
-                    if self.key_states['a'] or self.key_states['left']: 
-                        dx -= 3  # Faster movement
-                        print("LEFT control active - Moving LEFT FAST")
-                    if self.key_states['d'] or self.key_states['right']: 
-                        dx += 3  # Faster movement
-                        print("RIGHT control active - Moving RIGHT FAST")
-                    
-                    # Fallback to normal pygame key detection if our custom tracking fails
-                    if dx == 0 and dy == 0:
-                        if keys[pygame.K_w] or keys[pygame.K_UP]: 
-                            dy -= 3
-                            print("Fallback UP key detected")
-                        if keys[pygame.K_s] or keys[pygame.K_DOWN]: 
-                            dy += 3
-                            print("Fallback DOWN key detected")
-                        if keys[pygame.K_a] or keys[pygame.K_LEFT]: 
-                            dx -= 3
-                            print("Fallback LEFT key detected")
-                        if keys[pygame.K_d] or keys[pygame.K_RIGHT]: 
-                            dx += 3
-                            print("Fallback RIGHT key detected")
-
-                    # Touch input
-                    if self.touch_enabled:
-                        # Make sure touch_active dictionary is initialized
-                        if not hasattr(self, 'touch_active') or self.touch_active is None:
-                            self.touch_active = {}
-
-                        # Debug touch button states
-                        print(f"Touch states: UP:{self.touch_active.get('up', False)} DOWN:{self.touch_active.get('down', False)} LEFT:{self.touch_active.get('left', False)} RIGHT:{self.touch_active.get('right', False)}")
-
-                        if self.touch_active.get("up", False): 
-                            dy -= 3  # Faster movement to match keyboard
-                            print("Touch UP active - Moving UP FAST")
-                        if self.touch_active.get("down", False): 
-                            dy += 3  # Faster movement to match keyboard
-                            print("Touch DOWN active - Moving DOWN FAST")
-                        if self.touch_active.get("left", False): 
-                            dx -= 3  # Faster movement to match keyboard
-                            print("Touch LEFT active - Moving LEFT FAST")
-                        if self.touch_active.get("right", False): 
-                            dx += 3  # Faster movement to match keyboard
-                            print("Touch RIGHT active - Moving RIGHT FAST")
-
-                        # VNC auto-control for players when keyboard isn't working
-                        # For players in VNC or other environments where keyboard might not work
-                        if dx == 0 and dy == 0 and self.auto_control_enabled:
-                            # Update the auto-control timer
-                            self.auto_control_timer += 1
-                            
-                            # Determine current phase of movement based on timer
-                            if self.auto_control_type == "rotate4":
-                                # Cycle through 4 directions: left, up, right, down
-                                phase = (self.auto_control_timer // self.auto_control_duration) % 4
-                                
-                                # Only start auto-control after a delay to let real input take precedence
-                                if self.auto_control_timer > 120:  # Wait 2 seconds (120 frames at 60fps)
-                                    if phase == 0:
-                                        dx = -3  # left (faster)
-                                        dy = 0
-                                        # Set key states for visual feedback in debug
-                                        self.key_states['left'] = True
-                                        self.key_states['a'] = True
-                                        print("AUTO: Moving LEFT")
-                                    elif phase == 1:
-                                        dx = 0 
-                                        dy = -3  # up (faster)
-                                        self.key_states['up'] = True
-                                        self.key_states['w'] = True
-                                        print("AUTO: Moving UP")
-                                    elif phase == 2:
-                                        dx = 3  # right (faster)
-                                        dy = 0
-                                        self.key_states['right'] = True
-                                        self.key_states['d'] = True
-                                        print("AUTO: Moving RIGHT")
-                                    else:
-                                        dx = 0
-                                        dy = 3  # down (faster)
-                                        self.key_states['down'] = True
-                                        self.key_states['s'] = True
-                                        print("AUTO: Moving DOWN")
-                                    
-                                    # After each movement cycle, trigger a random action
-                                    if self.auto_control_timer % (self.auto_control_duration * 4) == 0:
-                                        # Press E to try to enter/exit vehicles
-                                        print("AUTO: Trying to enter/exit vehicle")
-                                        self.key_states['e'] = True
-                                        self.player.enter_exit_vehicle(self.map.vehicles + self.map.police_vehicles)
-                                    
-                                    # Fire weapon occasionally
-                                    if self.auto_control_timer % (self.auto_control_duration * 7) == 0:
-                                        print("AUTO: Firing weapon")
-                                        self.key_states['space'] = True
-                                        self.player.shoot()
-                            
-                            # Reset auto-control states after every 4000 frames to avoid potential issues
-                            if self.auto_control_timer > 4000:
-                                self.auto_control_timer = 0
-
-                    # Debug info about input values
-                    if dx != 0 or dy != 0:
-                        print(f"Movement input values: dx={dx}, dy={dy}")
-
-                    self.player.move(dx, dy, self.map.walls)
-                else:
-                    # Vehicle controls
-                    forward = 0
-                    turn = 0
-                    
-                    # Print debugging info for keyboard states
-                    print(f"DEBUG: Vehicle - Custom key states - W:{self.key_states['w']} S:{self.key_states['s']} A:{self.key_states['a']} D:{self.key_states['d']}")
-                    print(f"DEBUG: Vehicle - Custom arrow states - UP:{self.key_states['up']} DOWN:{self.key_states['down']} LEFT:{self.key_states['left']} RIGHT:{self.key_states['right']}")
-                    
-                    # First try custom key state tracking
-                    if self.key_states['w'] or self.key_states['up']: forward = 1
-                    if self.key_states['s'] or self.key_states['down']: forward = -1
-                    if self.key_states['a'] or self.key_states['left']: turn = -1
-                    if self.key_states['d'] or self.key_states['right']: turn = 1
-                    
-                    # If no input from custom tracking, try standard pygame key detection
-                    if forward == 0 and turn == 0:
-                        if keys[pygame.K_w] or keys[pygame.K_UP]: forward = 1
-                        if keys[pygame.K_s] or keys[pygame.K_DOWN]: forward = -1
-                        if keys[pygame.K_a] or keys[pygame.K_LEFT]: turn = -1
-                        if keys[pygame.K_d] or keys[pygame.K_RIGHT]: turn = 1
+                # Determine current phase of movement based on timer
+                if self.auto_control_type == "rotate4":
+                    # Cycle through 4 directions: left, up, right, down
+                    phase = (self.auto_control_timer // self.auto_control_duration) % 4
                     
-                    # Debug output for vehicle controls
-                    if forward != 0 or turn != 0:
-                        print(f"Vehicle controls: forward={forward}, turn={turn}")
-
-                    # Touch input
-                    if self.touch_enabled:
-                        if self.touch_active["up"]: forward = 1
-                        if self.touch_active["down"]: forward = -1
-                        if self.touch_active["left"]: turn = -1
-                        if self.touch_active["right"]: turn = 1
-                    
-                    # Auto-control for vehicle if no input detected
-                    if forward == 0 and turn == 0 and self.auto_control_enabled:
-                        # Update auto-control timer
-                        self.auto_control_timer += 1
+                    # Only start auto-control after a delay to let real input take precedence
+                    if self.auto_control_timer > 120:  # Wait 2 seconds (120 frames at 60fps)
+                        if phase == 0:
+                            dx = -3  # left (faster)
+                            dy = 0
+                            print("AUTO: Moving LEFT")
+                        elif phase == 1:
+                            dx = 0 
+                            dy = -3  # up (faster)
+                            print("AUTO: Moving UP")
+                        elif phase == 2:
+                            dx = 3  # right (faster)
+                            dy = 0
+                            print("AUTO: Moving RIGHT")
+                        else:
+                            dx = 0
+                            dy = 3  # down (faster)
+                            print("AUTO: Moving DOWN")
                         
-                        # Only start auto-control after a delay
-                        if self.auto_control_timer > 180:  # Wait 3 seconds (180 frames)
-                            phase = (self.auto_control_timer // self.auto_control_duration) % 6
-                            
-                            # More complex vehicle behavior - drive forward with occasional turns
-                            if phase == 0:
-                                forward = 1  # Drive forward
-                                turn = 0
-                                self.key_states['w'] = True
-                                self.key_states['up'] = True
-                                print("AUTO VEHICLE: Driving forward")
-                            elif phase == 1:
-                                forward = 1  # Turn right while moving
-                                turn = 1
-                                self.key_states['w'] = True
-                                self.key_states['d'] = True
-                                print("AUTO VEHICLE: Turning right")
-                            elif phase == 2:
-                                forward = 1  # Drive forward again
-                                turn = 0
-                                self.key_states['w'] = True
-                                self.key_states['up'] = True
-                                print("AUTO VEHICLE: Driving forward")
-                            elif phase == 3:
-                                forward = 1  # Turn left while moving
-                                turn = -1
-                                self.key_states['w'] = True
-                                self.key_states['a'] = True
-                                print("AUTO VEHICLE: Turning left")
-                            elif phase == 4:
-                                forward = 1  # More forward
-                                turn = 0
-                                self.key_states['w'] = True
-                                self.key_states['up'] = True
-                                print("AUTO VEHICLE: Driving forward")
-                            else:
-                                forward = -1  # Occasional reverse
-                                turn = 0
-                                self.key_states['s'] = True
-                                self.key_states['down'] = True
-                                print("AUTO VEHICLE: Reversing")
-                            
-                            # Occasionally exit the vehicle
-                            if self.auto_control_timer % (self.auto_control_duration * 12) == 0:
-                                print("AUTO: Trying to exit vehicle")
-                                self.key_states['e'] = True
-                                self.player.enter_exit_vehicle(self.map.vehicles + self.map.police_vehicles)
-
-                    self.player.in_vehicle.move(forward, turn, self.map.walls)
-                    # Update player position to vehicle position
-                    self.player.x = self.player.in_vehicle.x
-                    self.player.y = self.player.in_vehicle.y
-
-                # Update game objects
-                self.player.update()
-                self.map.update(self.player)
-                
-                # Update new systems
-                self.cheat_system.update()
-                self.dialogue_system.update()
-                self.event_system.update(self.player.x, self.player.y)
-                
-                # Update side activities
-                for activity in self.side_activities:
-                    if activity.active:
-                        activity.update(self.player, self.map.walls, self.map.vehicles, self.map.pedestrians)
+                        # After each movement cycle, trigger a random action
+                        if self.auto_control_timer % (self.auto_control_duration * 4) == 0:
+                            # Press E to try to enter/exit vehicles
+                            print("AUTO: Trying to enter/exit vehicle")
+                            self.player.enter_exit_vehicle(self.map.vehicles + self.map.police_vehicles)
+                        
+                        # Fire weapon occasionally
+                        if self.auto_control_timer % (self.auto_control_duration * 7) == 0:
+                            print("AUTO: Firing weapon")
+                            self.player.shoot()
                 
-                self.update_camera()
-
-            # Draw everything
-            self.screen.fill(self.map.get_sky_color())  # Clear screen with sky color
-            self.map.draw(self.screen, self.camera_x, self.camera_y)
+                # Reset auto-control states after every 4000 frames to avoid potential issues
+                if self.auto_control_timer > 4000:
+                    self.auto_control_timer = 0
 
-            # Draw vehicles
-            for vehicle in self.map.vehicles + self.map.police_vehicles:
-                vehicle.draw(self.screen, self.camera_x, self.camera_y)
+            # Debug info about input values
+            if dx != 0 or dy != 0:
+                print(f"Movement input values: dx={dx}, dy={dy}")
 
-            # Draw pedestrians
-            for ped in self.map.pedestrians:
-                ped.draw(self.screen, self.camera_x, self.camera_y)
-
-            # Draw player and bullets
-            if not self.player.in_vehicle:
-                self.player.draw(self.screen, self.camera_x, self.camera_y)
-            self.player.draw_bullets(self.screen, self.camera_x, self.camera_y)
-
-            # Draw UI elements
-            self.player.draw_wanted_level(self.screen)
-            self.map.draw_minimap(self.screen, self.player.x, self.player.y)
+            self.player.move(dx, dy, self.map.walls)
+        else:
+            # Vehicle controls
+            forward = 0
+            turn = 0
             
-            # Draw auto-control information if active
-            self.draw_auto_control_info()
+            if up: forward = 1
+            if down: forward = -1
+            if left: turn = -1
+            if right: turn = 1
             
-            # Draw event system visualization (only in debug mode)
-            if self.show_debug:
-                self.event_system.draw(self.screen, self.camera_x, self.camera_y, self.font)
+            # Debug output for vehicle controls
+            if forward != 0 or turn != 0:
+                print(f"Vehicle controls: forward={forward}, turn={turn}")
+
+            # Auto-control for vehicle if no input detected
+            if forward == 0 and turn == 0 and self.auto_control_enabled:
+                # Update auto-control timer
+                self.auto_control_timer += 1
                 
-            # Draw active side activities
-            for activity in self.side_activities:
-                if activity.active or getattr(activity, 'completed', False):
-                    activity.draw(self.screen, self.camera_x, self.camera_y, self.font)
+                # Only start auto-control after a delay
+                if self.auto_control_timer > 180:  # Wait 3 seconds (180 frames)
+                    phase = (self.auto_control_timer // self.auto_control_duration) % 6
+                    
+                    # More complex vehicle behavior - drive forward with occasional turns
+                    if phase == 0:
+                        forward = 1  # Drive forward
+                        turn = 0
+                        print("AUTO VEHICLE: Driving forward")
+                    elif phase == 1:
+                        forward = 1  # Turn right while moving
+                        turn = 1
+                        print("AUTO VEHICLE: Turning right")
+                    elif phase == 2:
+                        forward = 1  # Drive forward again
+                        turn = 0
+                        print("AUTO VEHICLE: Driving forward")
+                    elif phase == 3:
+                        forward = 1  # Turn left while moving
+                        turn = -1
+                        print("AUTO VEHICLE: Turning left")
+                    elif phase == 4:
+                        forward = 1  # More forward
+                        turn = 0
+                        print("AUTO VEHICLE: Driving forward")
+                    else:
+                        forward = -1  # Occasional reverse
+                        turn = 0
+                        print("AUTO VEHICLE: Reversing")
+                    
+                    # Occasionally exit the vehicle
+                    if self.auto_control_timer % (self.auto_control_duration * 12) == 0:
+                        print("AUTO: Trying to exit vehicle")
+                        self.player.enter_exit_vehicle(self.map.vehicles + self.map.police_vehicles)
+
+            self.player.in_vehicle.move(forward, turn, self.map.walls)
+            # Update player position to vehicle position
+            self.player.x = self.player.in_vehicle.x
+            self.player.y = self.player.in_vehicle.y
+
+    def render_frame(self):
+        """Render phase: draw the world, entities and UI for this frame"""
+        # Take in background work finished since the last frame (city chunks, sprites)
+        self.background.poll()
+
+        self.renderer.begin_frame(self.map.get_sky_color())  # Clear screen with sky color
+        self.collect_lights()
+        self.map.draw(self.renderer, self.camera_x, self.camera_y)
+
+        # Draw vehicles, pedestrians, the player and bullets in one sorted batch
+        self.queue_entities()
+        self.render_queue.flush(self.renderer, self.profiler)
+
+        # Draw UI elements
+        self.player.draw_wanted_level(self.screen)
+        self.map.draw_minimap(self.screen, self.player.x, self.player.y)
+        
+        # Draw auto-control information if active
+        self.draw_auto_control_info()
+        
+        # Draw event system visualization (only in debug mode)
+        if self.show_debug:
+            self.event_system.draw(self.screen, self.camera_x, self.camera_y, self.font)
             
-            # Draw dialogue system if active
-            if self.dialogue_system.active:
-                self.dialogue_system.draw(self.screen, self.camera_x, self.camera_y)
-                
-            # Draw cheat system UI
-            self.cheat_system.draw(self.screen, self.font)
+        # Draw active side activities
+        self.activity_manager.draw(self.screen, self.camera_x, self.camera_y, self.font)
+        
+        # Draw dialogue system if active
+        if self.dialogue_system.active:
+            self.dialogue_system.draw(self.screen, self.camera_x, self.camera_y)
             
-            # Draw message
-            if self.message_timer > 0:
-                self.message_timer -= 1
-                message_surface = self.font.render(self.message, True, (255, 255, 255))
-                message_x = self.width // 2 - message_surface.get_width() // 2
-                message_y = 50
-                
-                # Draw semi-transparent background
-                bg_rect = message_surface.get_rect()
-                bg_rect.x = message_x - 10
-                bg_rect.y = message_y - 5
-                bg_rect.width += 20
-                bg_rect.height += 10
-                
-                s = pygame.Surface((bg_rect.width, bg_rect.height), pygame.SRCALPHA)
-                s.fill((0, 0, 0, 150))  # Black with 150 alpha
-                self.screen.blit(s, (bg_rect.x, bg_rect.y))
-                
-                # Draw text
-                self.screen.blit(message_surface, (message_x, message_y))
+        # Draw cheat system UI
+        self.cheat_system.draw(self.screen, self.font)
+        
+        # Draw message
+        if self.message_timer > 0:
+            self.message_timer -= 1
+            message_surface = self.font.render(self.message, True, (255, 255, 255))
+            message_x = self.width // 2 - message_surface.get_width() // 2
+            message_y = 50
+            
+            # Draw semi-transparent background
+            bg_rect = message_surface.get_rect()
+            bg_rect.x = message_x - 10
+            bg_rect.y = message_y - 5
+            bg_rect.width += 20
+            bg_rect.height += 10
+            
+            s = pygame.Surface((bg_rect.width, bg_rect.height), pygame.SRCALPHA)
+            s.fill((0, 0, 0, 150))  # Black with 150 alpha
+            self.screen.blit(s, (bg_rect.x, bg_rect.y))
+            
+            # Draw text
+            self.screen.blit(message_surface, (message_x, message_y))
 
-            # Only show controls help when not paused
-            if not self.paused:
-                self.draw_controls_help()
+        # Only show controls help when not paused
+        if not self.paused:
+            self.draw_controls_help()
 
-            self.draw_debug_info()
+        self.draw_debug_info()
 
-            # Draw touch controls if not paused
-            if self.touch_enabled and not self.paused:
-                self.draw_touch_controls()
+        # Draw touch controls if not paused
+        if self.touch_enabled and not self.paused:
+            self.draw_touch_controls()
 
-            # Always draw pause button
-            if self.touch_enabled:
-                self.draw_pause_button()
+        # Always draw pause button
+        if self.touch_enabled:
+            self.draw_pause_button()
 
-            # Draw pause menu if paused
-            if self.paused:
-                self.draw_pause_menu()
+        # Draw pause menu if paused
+        if self.paused:
+            self.draw_pause_menu()
+
+    def replay_flags(self):
+        """Settings that change how recorded input plays out"""
+        flags = 0
+        if self.auto_control_enabled:
+            flags |= replay.FLAG_AUTO_CONTROL
+        if self.touch_enabled:
+            flags |= replay.FLAG_TOUCH
+        flags |= self.district_workers << replay.WORKERS_SHIFT
+        return flags
+
+    def start_recording(self):
+        """Record every tick's input actions from now on"""
+        # Setup work must not depend on how fast this machine is
+        self.activity_manager.budget = 0
+        self.input.start_recording()
+
+    def save_recording(self, path):
+        """Write the recorded input and this session's seeds to a replay file"""
+        masks = self.input.stop_recording()
+        replay.save(path, self.seeds, masks, self.replay_flags())
+        print(f"Recorded {len(masks)} ticks to {path}")
+
+    def save_snapshot(self, path):
+        """Write the whole world to a snapshot file"""
+        self.map.finish_city()  # Save the finished city image, not the placeholder
+        size = snapshot.save(path, self)
+        print(f"Saved snapshot of tick {self.scheduler.tick} to {path} ({size // 1024} KB)")
+
+    def start_replay(self, masks, flags):
+        """Drive the game from recorded input until it runs out"""
+        self.auto_control_enabled = bool(flags & replay.FLAG_AUTO_CONTROL)
+        self.touch_enabled = bool(flags & replay.FLAG_TOUCH)
+        self.activity_manager.budget = 0
+        self.input.play(masks)
+        self.replaying = True
+
+    def run(self):
+        print("Game.run() started")
+        
+        # Reset auto-control timer for this game session
+        self.auto_control_timer = 0
+        
+        while self.running:
+            # A replay ends once its last recorded tick has run
+            if self.replaying and not self.input.playing:
+                break
+            if self.max_frames and self.frame_count >= self.max_frames:
+                break
+
+            self.profiler.begin_frame()
+
+            # Input: window events, key states and the interactions they trigger
+            with self.profiler.section("input"):
+                actions = self.read_input()
+
+            # Simulate: one tick of every system, skipped while paused
+            if not self.paused:
+                with self.profiler.section("simulate"):
+                    self.simulate(actions)
+
+            # Render: world, entities and UI
+            with self.profiler.section("render"):
+                self.render_frame()
 
             # Ensure the display is updated
             try:
-                # Use both update and flip to ensure rendering
-                pygame.display.update()
-                pygame.display.flip()
+                self.renderer.present()
 
                 if not hasattr(self, '_display_updated'):
                     print("First display update successful")
                     self._display_updated = True
+                    self.startup.first_frame_presented()
             except Exception as e:
                 print(f"Error updating display: {e}")
 
             # Increment frame counter
             self.frame_count += 1
+            self.profiler.end_frame()
 
             # Control frame rate
-            self.clock.tick(60)
+            self.clock.tick(self.frame_limit)
 
 def detect_mobile():
     """Try to detect if we're running on a mobile device"""
@@ -2957,9 +3211,43 @@ def detect_mobile():
         # Fallback - assume desktop
         return False
 
-def main():
+def parse_args(argv=None):
+    """Command line options for recording, replaying and headless benchmark runs"""
+    parser = argparse.ArgumentParser(description="GTA-style South Park Canadian game")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record this session's input and RNG seeds to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recorded session from FILE")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a visible window or frame limit (for benchmarks)")
+    parser.add_argument("--frames", type=int, default=0,
+                        help="stop after this many frames")
+    parser.add_argument("--seed", type=int,
+                        help="seed the world RNGs (ignored with --replay)")
+    parser.add_argument("--city-seed", type=int,
+                        help="city layout seed; instances with the same one share a cached city")
+    parser.add_argument("--load", metavar="FILE",
+                        help="start from a saved snapshot instead of a new world")
+    parser.add_argument("--save", metavar="FILE",
+                        help="save a snapshot of the world to FILE on exit")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="simulate city districts in this many worker processes (0: all in one)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Startup phases from the first import to the first frame on screen
+    startup = profiler.StartupProfile(IMPORT_START)
+    startup.add("imports", IMPORT_END - IMPORT_START)
+
     # Configure logging for the main function
     logging.info("Starting game application")
+
+    if args.headless:
+        # No window or audio device; nothing waits on the display
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
     
     # Environment setup with validation
     display_env = os.environ.get('DISPLAY', '')
@@ -2968,7 +3256,7 @@ def main():
         logging.info("Setting DISPLAY=:0 for Replit environment")
     
     # Check if we're on Replit and set x11 driver
-    if os.environ.get('REPL_ID'):
+    if os.environ.get('REPL_ID') and not args.headless:
         logging.info("Running in Replit environment, using x11 driver")
         os.environ['SDL_VIDEODRIVER'] = 'x11'
         os.environ['LIBGL_ALWAYS_SOFTWARE'] = '1'
@@ -3004,8 +3292,33 @@ def main():
         except Exception as pygame_error:
             logging.error(f"Error initializing Pygame: {pygame_error}")
             raise
-
-        game = Game()
+        startup.mark("pygame init")
+
+        # Replays rebuild the world from the seeds they were recorded with
+        seeds = None
+        if args.replay:
+            seeds, masks, flags = replay.load(args.replay)
+            logging.info(f"Replaying {len(masks)} ticks from {args.replay}")
+        elif args.seed is not None or args.city_seed is not None:
+            seeds = replay.new_seeds()
+            if args.seed is not None:
+                seeds = {"world": args.seed, "regions": args.seed, "city": args.seed}
+            if args.city_seed is not None:
+                seeds["city"] = args.city_seed
+
+        # A snapshot replaces the new world (replays recorded from it still work)
+        saved = None
+        if args.load:
+            start = time.perf_counter()
+            saved = snapshot.load(args.load)
+            logging.info(f"Loaded snapshot {args.load} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        startup.mark("load snapshot" if args.load else "arguments")
+
+        start = time.perf_counter()
+        # Replays run with the worker count they were recorded with (it decides the AI's random draws)
+        workers = flags >> replay.WORKERS_SHIFT if args.replay else args.workers
+        game = Game(seeds, saved, workers, startup)
+        logging.info(f"Game created in {(time.perf_counter() - start) * 1000:.1f}ms")
 
         # Set touch mode based on device
         game.touch_enabled = is_mobile
@@ -3015,7 +3328,42 @@ def main():
             print("Mobile device detected, enabling touch controls")
             # Could adjust other settings here like UI scaling
 
-        game.run()
+        if args.headless:
+            game.frame_limit = 0
+        # Frames count from here (a restored game keeps its frame counter)
+        first_frame = game.frame_count
+        game.max_frames = first_frame + args.frames if args.frames else 0
+        if args.replay:
+            game.start_replay(masks, flags)
+        elif args.record:
+            game.start_recording()
+
+        start = time.perf_counter()
+        try:
+            try:
+                game.run()
+            finally:
+                game.map.stop_districts()
+            elapsed = time.perf_counter() - start
+
+            if args.record and not args.replay:
+                game.save_recording(args.record)
+            if args.save:
+                game.save_snapshot(args.save)  # Waits for the city's detail, so the pool must still be up
+            game.background.wait()  # Let background cache writes finish
+        finally:
+            game.background.shutdown()
+
+        if args.headless or args.replay:
+            # Benchmark summary for comparing builds
+            frames = game.frame_count - first_frame
+            fps = frames / elapsed if elapsed > 0 else 0.0
+            print(f"Ran {frames} frames in {elapsed:.2f}s ({fps:.1f} fps)")
+            for line in game.profiler.report_lines():
+                print(f"  {line}")
+            print("Startup:")
+            for line in game.startup.report_lines():
+                print(f"  {line}")
     except Exception as e:
         print(f"Error in main: {e}")
         import traceback
@@ -0,0 +1,88 @@
+"""
+Attribute modifiers for GTA-style South Park Canadian game
+This module implements stacks of typed modifiers (add, multiply, override)
+on entity attributes. The resolved value is written straight onto the
+entity when a stack changes, so reading a modified attribute costs nothing
+and removing the last modifier restores the original value.
+"""
+
+# Modifier types, applied in this order when resolving a stack
+ADD = "add"
+MULTIPLY = "multiply"
+OVERRIDE = "override"
+
+class Modifier:
+    """One change to an attribute, owned by a source (e.g. a cheat effect)"""
+    __slots__ = ("source", "kind", "value")
+
+    def __init__(self, source, kind, value):
+        self.source = source
+        self.kind = kind
+        self.value = value
+
+class ModifierStack:
+    """Modifiers on one attribute of one entity, plus its unmodified value"""
+    def __init__(self, target, attribute):
+        self.target = target
+        self.attribute = attribute
+        self.base = getattr(target, attribute)
+        self.modifiers = []
+
+    def resolve(self):
+        """Compute the modified value from the base value"""
+        value = self.base
+        for kind in (ADD, MULTIPLY):
+            for modifier in self.modifiers:
+                if modifier.kind == kind:
+                    value = value + modifier.value if kind == ADD else value * modifier.value
+        # The most recent override wins
+        for modifier in reversed(self.modifiers):
+            if modifier.kind == OVERRIDE:
+                value = modifier.value
+                break
+        return value
+
+    def apply(self):
+        """Write the resolved value onto the entity"""
+        setattr(self.target, self.attribute, self.resolve())
+
+    def restore(self):
+        """Put the unmodified value back"""
+        setattr(self.target, self.attribute, self.base)
+
+class ModifierRegistry:
+    """All modifier stacks in the game, looked up by entity and attribute"""
+    def __init__(self):
+        self.stacks = {}  # (id(target), attribute) -> ModifierStack
+
+    def add(self, target, attribute, kind, value, source):
+        """Register a modifier and update the attribute's value"""
+        key = (id(target), attribute)
+        stack = self.stacks.get(key)
+        if stack is None or stack.target is not target:
+            stack = self.stacks[key] = ModifierStack(target, attribute)
+        stack.modifiers.append(Modifier(source, kind, value))
+        stack.apply()
+
+    def remove_source(self, source):
+        """Remove every modifier a source registered, restoring emptied attributes"""
+        for key, stack in list(self.stacks.items()):
+            kept = [modifier for modifier in stack.modifiers if modifier.source != source]
+            if len(kept) == len(stack.modifiers):
+                continue
+            stack.modifiers = kept
+            if kept:
+                stack.apply()
+            else:
+                stack.restore()
+                del self.stacks[key]
+
+    def base_value(self, target, attribute):
+        """The attribute's value without any modifiers"""
+        stack = self.stacks.get((id(target), attribute))
+        if stack is not None and stack.target is target:
+            return stack.base
+        return getattr(target, attribute)
+
+    def __len__(self):
+        return len(self.stacks)
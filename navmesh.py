@@ -0,0 +1,164 @@
+"""
+Pedestrian navigation for GTA-style South Park Canadian game
+This module turns the walkable parts of the city (the sidewalks round each
+block, crossings at the block corners and the paths through parks) into a
+grid that pedestrians read instead of testing every road and wall. Each cell
+knows whether it is walkable, which directions lead on to walkable cells and
+which of those follow the corridor it lies on. Where corridors meet (sidewalk
+corners, crossings, path ends) a cell carries the directions of both, which
+is where pedestrians can turn off. Cells off the walkways point the way back
+to the nearest walkable cell.
+
+Everything is worked out once from the city layout, so a wandering pedestrian
+costs one cell lookup per tick.
+"""
+import random
+
+import numpy as np
+
+import procedural_map
+
+CELL = 10  # Pixels per grid cell (at least half a pedestrian, so one cell of margin clears walls)
+
+DIRECTIONS = ("up", "down", "left", "right")
+OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))  # (row, column) step for each direction
+BITS = {direction: 1 << i for i, direction in enumerate(DIRECTIONS)}
+ALONG = {True: BITS["left"] | BITS["right"], False: BITS["up"] | BITS["down"]}  # By horizontal corridor
+CHOICES = [tuple(direction for direction in DIRECTIONS if mask & BITS[direction]) for mask in range(16)]
+
+EDGE_WIDTH = 10  # Road-edge walkways for layouts without generator blocks
+
+def walkways(blocks, roads):
+    """Walkable corridors as (rect, horizontal): the generator's sidewalks, corner crossings and park paths"""
+    corridors = []
+    if not blocks:
+        # No blocks (image layouts): walk along the edges of the roads
+        for road in roads:
+            x, y, w, h = road["rect"]
+            if road["horizontal"]:
+                corridors += [((x, y, w, EDGE_WIDTH), True), ((x, y + h - EDGE_WIDTH, w, EDGE_WIDTH), True)]
+            else:
+                corridors += [((x, y, EDGE_WIDTH, h), False), ((x + w - EDGE_WIDTH, y, EDGE_WIDTH, h), False)]
+        return corridors
+
+    sidewalk = procedural_map.SIDEWALK_WIDTH
+    crossing = procedural_map.STREET_WIDTH + 2 * sidewalk  # Sidewalk to sidewalk across a street
+    corners = {(block["rect"][0], block["rect"][1]) for block in blocks}
+    for block in blocks:
+        x, y, w, h = block["rect"]
+        left, top = x - sidewalk, y - sidewalk
+        right, bottom = x + w, y + h  # Where the far strips start
+        corridors += [
+            ((left, top, w + 2 * sidewalk, sidewalk), True),
+            ((left, bottom, w + 2 * sidewalk, sidewalk), True),
+            ((left, top, sidewalk, h + 2 * sidewalk), False),
+            ((right, top, sidewalk, h + 2 * sidewalk), False),
+        ]
+
+        # Crossings over the street to the next block along and the next block down
+        if (x + procedural_map.BLOCK_SIZE, y) in corners:
+            corridors += [((right, top, crossing, sidewalk), True), ((right, bottom, crossing, sidewalk), True)]
+        if (x, y + procedural_map.BLOCK_SIZE) in corners:
+            corridors += [((left, bottom, sidewalk, crossing), False), ((right, bottom, sidewalk, crossing), False)]
+
+        if block.get("type") == "park":
+            path = procedural_map.PATH_WIDTH
+            corridors += [((x, y + h // 2 - path // 2, w, path), True),
+                          ((x + w // 2 - path // 2, y, path, h), False)]
+    return corridors
+
+def shift(grid, direction, fill):
+    """grid[r, c] moved so each cell holds its neighbour's value in this direction"""
+    d_row, d_column = OFFSETS[DIRECTIONS.index(direction)]
+    shifted = np.full_like(grid, fill)
+    rows, columns = grid.shape
+    shifted[max(-d_row, 0):rows - max(d_row, 0), max(-d_column, 0):columns - max(d_column, 0)] = \
+        grid[max(d_row, 0):rows - max(-d_row, 0), max(d_column, 0):columns - max(-d_column, 0)]
+    return shifted
+
+class NavMesh:
+    """Walkable grid with per-cell open and preferred directions"""
+    def __init__(self, corridors, walls, width, height):
+        self.rows = -(-height // CELL)
+        self.columns = -(-width // CELL)
+        shape = (self.rows, self.columns)
+
+        # Corridor cells (by cell centre) and the directions along them
+        along = np.zeros(shape, dtype=np.uint8)
+        for (x, y, w, h), horizontal in corridors:
+            rows, columns = self.span(y, h, self.rows), self.span(x, w, self.columns)
+            along[rows, columns] |= ALONG[horizontal]
+
+        # Cells a wall touches, and the eight round them (a pedestrian centred further off can't reach a wall)
+        wall_cells = np.zeros(shape, dtype=bool)
+        for wall in walls:
+            x, y, w, h = wall["rect"]
+            if w > 0 and h > 0:
+                wall_cells[max(y // CELL, 0):(y + h - 1) // CELL + 1, max(x // CELL, 0):(x + w - 1) // CELL + 1] = True
+        near_wall = wall_cells | shift(wall_cells, "up", False) | shift(wall_cells, "down", False)
+        near_wall |= shift(near_wall, "left", False) | shift(near_wall, "right", False)
+
+        self.walkable = (along > 0) & ~near_wall
+        self.open = np.zeros(shape, dtype=np.uint8)  # Directions whose next cell is walkable
+        for direction in DIRECTIONS:
+            self.open[shift(self.walkable, direction, False)] |= BITS[direction]
+        self.preferred = np.where(self.walkable, along & self.open, 0).astype(np.uint8)
+
+        # Off the walkways: the first step of a shortest way back, spreading out from the walkable cells
+        self.toward = np.full(shape, -1, dtype=np.int8)
+        reached = self.walkable.copy()
+        frontier = self.walkable
+        while frontier.any():
+            found = np.zeros(shape, dtype=bool)
+            for i, direction in enumerate(DIRECTIONS):
+                step = shift(frontier, direction, False) & ~reached & ~found & ~wall_cells
+                self.toward[step] = i
+                found |= step
+            reached |= found
+            frontier = found
+
+        self.cells = np.flatnonzero(self.walkable)  # For spawning
+
+    @staticmethod
+    def span(start, length, count):
+        """Cells whose centres lie in [start, start + length)"""
+        first = int(np.ceil((start - CELL / 2) / CELL))
+        last = int(np.ceil((start + length - CELL / 2) / CELL))
+        return slice(max(first, 0), min(max(last, 0), count))
+
+    def cell(self, x, y):
+        return (min(max(int(y // CELL), 0), self.rows - 1), min(max(int(x // CELL), 0), self.columns - 1))
+
+    def clear(self, x, y):
+        """Whether a pedestrian standing here is on the walkways (and so clear of every wall)"""
+        return bool(self.walkable[self.cell(x, y)])
+
+    def wander(self, x, y, direction):
+        """Direction to keep walking in: along the walkway, round its ends, or back onto it"""
+        cell = self.cell(x, y)
+        if not self.walkable[cell]:
+            toward = self.toward[cell]
+            return DIRECTIONS[toward] if toward >= 0 else direction
+        preferred = self.preferred[cell]
+        if preferred & BITS.get(direction, 0):
+            return direction
+        choices = CHOICES[preferred] or CHOICES[self.open[cell]]
+        return random.choice(choices) if choices else direction
+
+    def turn(self, x, y):
+        """A new direction when a pedestrian decides to change course"""
+        cell = self.cell(x, y)
+        choices = CHOICES[self.preferred[cell]]
+        if not choices:
+            toward = self.toward[cell]
+            if toward >= 0:
+                return DIRECTIONS[toward]
+            choices = DIRECTIONS
+        return random.choice(choices)
+
+    def random_point(self):
+        """A random spot on the walkways, or None if there are none"""
+        if not len(self.cells):
+            return None
+        row, column = divmod(int(self.cells[random.randrange(len(self.cells))]), self.columns)
+        return column * CELL + random.randint(0, CELL - 1), row * CELL + random.randint(0, CELL - 1)
@@ -4,29 +4,138 @@ import random
 import os
 import numpy as np
 
+# Special block colours and what they represent
+SPECIAL_BUILDINGS = {
+    (200, 50, 50): "fire_station",
+    (50, 50, 180): "police",
+    (180, 180, 50): "mall",
+    (80, 140, 180): "hospital",
+    (120, 50, 120): "entertainment",
+}
+
+BLOCK_SIZE = 320  # GTA-style city block size (roads run along the block grid)
+ROAD_WIDTH = 120  # Gap between two blocks: a sidewalk, the street and another sidewalk
+SIDEWALK_WIDTH = 30
+STREET_WIDTH = ROAD_WIDTH - 2 * SIDEWALK_WIDTH  # Asphalt between the sidewalks
+PATH_WIDTH = 12  # Footpaths across parks
+
+class CityPlan:
+    """Everything the city map is drawn from, in drawing order
+
+    Planning makes every random choice up front, so the picture can be painted
+    whole, in chunks on other threads, or as a coarse placeholder without
+    the details, and always comes out the same for the same RNG state.
+    """
+    def __init__(self, width, height, background):
+        self.width = width
+        self.height = height
+        self.background = background  # Colour under everything (asphalt)
+        self.shapes = []  # (kind, color, geometry, detail)
+        self.bounds = []  # (x, y, w, h) each shape covers
+        self.bounds_array = None
+
+    def rect(self, color, rect, width=0, detail=False):
+        rect = pygame.Rect(rect)
+        if width:
+            # An outline is drawn around the part inside the map, as four solid bands
+            # (pygame outlines the clipped rect, so a chunk would put edges in the wrong place)
+            rect = rect.clip(0, 0, self.width, self.height)
+            width = min(width, rect.width, rect.height)
+            for band in ((rect.left, rect.top, rect.width, width),
+                         (rect.left, rect.bottom - width, rect.width, width),
+                         (rect.left, rect.top, width, rect.height),
+                         (rect.right - width, rect.top, width, rect.height)):
+                self.rect(color, band, detail=detail)
+            return
+        self.shapes.append(("rect", color, rect, detail))
+        self.bounds.append(tuple(rect))
+
+    def circle(self, color, center, radius, detail=False):
+        self.shapes.append(("circle", color, (center, radius), detail))
+        self.bounds.append((center[0] - radius, center[1] - radius, radius * 2 + 1, radius * 2 + 1))
+
+    def shapes_in(self, area):
+        """Indexes of the shapes overlapping an area, in drawing order"""
+        if self.bounds_array is None:
+            self.bounds_array = np.array(self.bounds, dtype=np.int64).reshape(-1, 4)
+        x, y, w, h = self.bounds_array.T
+        hits = (x < area.right) & (x + w > area.left) & (y < area.bottom) & (y + h > area.top)
+        return np.flatnonzero(hits).tolist()
+
+    def paint(self, surface, area=None, detail=True, scale=1):
+        """Draw the part of the city inside area (default: all of it) onto surface at its origin"""
+        area = pygame.Rect(area) if area is not None else pygame.Rect(0, 0, self.width, self.height)
+        surface.fill(self.background)
+        bounds = surface.get_rect()
+        for index in self.shapes_in(area):
+            kind, color, geometry, is_detail = self.shapes[index]
+            if is_detail and not detail:
+                continue
+            if kind == "rect":
+                rect = geometry.move(-area.x, -area.y)
+                if scale != 1:
+                    rect = pygame.Rect(round(rect.x * scale), round(rect.y * scale),
+                                       max(1, round(rect.width * scale)), max(1, round(rect.height * scale)))
+                surface.fill(color, rect.clip(bounds))  # fill() misplaces rects hanging off the top/left
+            else:
+                (center_x, center_y), radius = geometry
+                center = ((center_x - area.x) * scale, (center_y - area.y) * scale)
+                pygame.draw.circle(surface, color, center, max(1, radius * scale))
+
+    def paint_chunk(self, area, like=None):
+        """A fully detailed surface of one area (in like's pixel format); returns (surface, area)"""
+        area = pygame.Rect(area)
+        surface = pygame.Surface(area.size, 0, like) if like is not None else pygame.Surface(area.size)
+        self.paint(surface, area)
+        return surface, area
+
+    def placeholder(self, scale=0.25):
+        """The city without details at reduced resolution, scaled back up to full size"""
+        small = pygame.Surface((max(1, round(self.width * scale)), max(1, round(self.height * scale))))
+        self.paint(small, detail=False, scale=scale)
+        surface = pygame.Surface((self.width, self.height))
+        pygame.transform.scale(small, surface.get_size(), surface)
+        return surface
+
+    def chunks(self, size=BLOCK_SIZE, focus=None):
+        """Areas of the map on the block grid, nearest the focus point (default: centre) first"""
+        focus_x, focus_y = focus if focus is not None else (self.width / 2, self.height / 2)
+        areas = [pygame.Rect(x, y, min(size, self.width - x), min(size, self.height - y))
+                 for y in range(0, self.height, size) for x in range(0, self.width, size)]
+        areas.sort(key=lambda area: (area.centerx - focus_x) ** 2 + (area.centery - focus_y) ** 2)
+        return areas
+
 def generate_city_map(width=2400, height=1800):
     """
     Generate a procedural city map with streets and buildings styled like GTA 1
-    Returns a pygame Surface with the map and a list of building rectangles for collision
+    Returns a pygame Surface with the map, a list of building rectangles for collision
+    and a list of city blocks ({"rect", "type", "subtype"}) describing what each block holds
     """
-    # Create a blank surface
+    plan, building_rects, block_info = plan_city_map(width, height)
     surface = pygame.Surface((width, height))
-    
-    # Create a numpy array for collision map (1 = collision, 0 = passable)
-    collision_map = np.zeros((width, height), dtype=np.int8)
+    plan.paint(surface)
+    return surface, building_rects, block_info
+
+def plan_city_map(width=2400, height=1800):
+    """
+    Make every layout decision for a procedural city without drawing anything
+    Returns a CityPlan to paint the map from, plus the building rectangles and
+    city blocks generate_city_map returns
+    """
     building_rects = []  # List to store building rectangles
+    block_info = []  # What each block turned into (buildings, park, parking, special)
     
     # Fill with a dark gray color as the street base (asphalt)
     street_color = (60, 60, 60)  # Dark gray for streets
-    surface.fill(street_color)
+    plan = CityPlan(width, height, street_color)
     
     # Use a more organized grid like in GTA 1
-    block_size = 320  # GTA-style city block size
-    road_width = 120  # Main road width
+    block_size = BLOCK_SIZE
+    road_width = ROAD_WIDTH  # Main road width
     
     # Sidewalk colors and parameters
     sidewalk_color = (180, 180, 180)  # Light gray for sidewalks
-    sidewalk_width = 30  # Width of sidewalks
+    sidewalk_width = SIDEWALK_WIDTH  # Width of sidewalks
     
     # Street parameters
     street_line_color = (220, 220, 0)  # Yellow street lines
@@ -55,16 +164,16 @@ def generate_city_map(width=2400, height=1800):
                 blocks.append((block_x, block_y, block_w, block_h))
                 
                 # Draw sidewalks around the block (like in GTA 1)
-                pygame.draw.rect(surface, sidewalk_color, 
+                plan.rect(sidewalk_color, 
                                 (block_x - sidewalk_width, block_y - sidewalk_width, 
                                  block_w + sidewalk_width*2, block_h + sidewalk_width*2))
                 
                 # Draw the block interior (grass/dirt)
                 block_interior_color = (100, 120, 80)  # Slightly green for grass/lots
-                pygame.draw.rect(surface, block_interior_color, (block_x, block_y, block_w, block_h))
+                plan.rect(block_interior_color, (block_x, block_y, block_w, block_h))
     
     # 2. Add yellow street lines on horizontal streets
-    for y in range(road_width // 2, height, block_size):
+    for y in range(block_size, height, block_size):  # Streets run between the blocks
         # Skip if too close to edge
         if y >= height - road_width // 2:
             continue
@@ -73,10 +182,10 @@ def generate_city_map(width=2400, height=1800):
         line_y = y
         for x in range(0, width, 40):  # Dashed lines
             if x + 20 < width:
-                pygame.draw.rect(surface, street_line_color, (x, line_y - 2, 20, 4))
+                plan.rect(street_line_color, (x, line_y - 2, 20, 4), detail=True)
     
     # 3. Add yellow street lines on vertical streets
-    for x in range(road_width // 2, width, block_size):
+    for x in range(block_size, width, block_size):
         # Skip if too close to edge
         if x >= width - road_width // 2:
             continue
@@ -85,7 +194,7 @@ def generate_city_map(width=2400, height=1800):
         line_x = x
         for y in range(0, height, 40):  # Dashed lines
             if y + 20 < height:
-                pygame.draw.rect(surface, street_line_color, (line_x - 2, y, 4, 20))
+                plan.rect(street_line_color, (line_x - 2, y, 4, 20), detail=True)
     
     # 4. Add buildings in blocks
     for block_x, block_y, block_w, block_h in blocks:
@@ -95,6 +204,7 @@ def generate_city_map(width=2400, height=1800):
             weights=[0.7, 0.1, 0.15, 0.05],
             k=1
         )[0]
+        block_subtype = None
         
         if block_type == "buildings":
             # Standard building block
@@ -146,30 +256,30 @@ def generate_city_map(width=2400, height=1800):
                         
                         # Draw building
                         rect = pygame.Rect(int(bldg_x), int(bldg_y), int(bldg_width), int(bldg_height))
-                        pygame.draw.rect(surface, bldg_color, rect)
+                        plan.rect(bldg_color, rect)
                         
                         # Add to collision rectangles
                         building_rects.append(rect)
                         
                         # Add details to buildings (windows, doors)
-                        add_building_details(surface, rect, bldg_color)
+                        add_building_details(plan, rect, bldg_color)
         
         elif block_type == "park":
             # Create a park with trees and paths
             park_color = (40, 120, 40)  # Darker green for parks
-            pygame.draw.rect(surface, park_color, (block_x, block_y, block_w, block_h))
+            plan.rect(park_color, (block_x, block_y, block_w, block_h))
             
             # Add paths
             path_color = (170, 170, 150)
-            path_width = 12
+            path_width = PATH_WIDTH
             
             # Horizontal path
-            pygame.draw.rect(surface, path_color, 
+            plan.rect(path_color, 
                            (block_x, block_y + block_h//2 - path_width//2, 
                             block_w, path_width))
                             
             # Vertical path
-            pygame.draw.rect(surface, path_color, 
+            plan.rect(path_color, 
                            (block_x + block_w//2 - path_width//2, block_y, 
                             path_width, block_h))
             
@@ -186,16 +296,16 @@ def generate_city_map(width=2400, height=1800):
                     continue
                     
                 tree_color = (30, 100, 30)  # Dark green
-                pygame.draw.circle(surface, tree_color, (tree_x, tree_y), tree_radius)
+                plan.circle(tree_color, (tree_x, tree_y), tree_radius, detail=True)
                 
                 # Tree trunk
                 trunk_color = (80, 50, 30)  # Brown
-                pygame.draw.circle(surface, trunk_color, (tree_x, tree_y), tree_radius//2)
+                plan.circle(trunk_color, (tree_x, tree_y), tree_radius//2, detail=True)
         
         elif block_type == "parking":
             # Create a parking lot
             lot_color = (80, 80, 80)  # Slightly lighter than roads
-            pygame.draw.rect(surface, lot_color, (block_x, block_y, block_w, block_h))
+            plan.rect(lot_color, (block_x, block_y, block_w, block_h))
             
             # Add parking lines
             line_color = (220, 220, 220)  # White
@@ -206,7 +316,7 @@ def generate_city_map(width=2400, height=1800):
             # Horizontal parking lines
             for y in range(block_y + 10, block_y + block_h - 10, line_spacing):
                 for x in range(block_x + 10, block_x + block_w - 10, 40):
-                    pygame.draw.rect(surface, line_color, (x, y, line_length, line_width))
+                    plan.rect(line_color, (x, y, line_length, line_width), detail=True)
         
         elif block_type == "special":
             # Special buildings (larger) like malls, police stations, etc.
@@ -226,8 +336,9 @@ def generate_city_map(width=2400, height=1800):
                 block_h - 2*margin
             )
             
-            pygame.draw.rect(surface, special_color, special_rect)
+            plan.rect(special_color, special_rect)
             building_rects.append(special_rect)
+            block_subtype = SPECIAL_BUILDINGS[special_color]
             
             # Add details (special markings)
             if special_color == (80, 140, 180):  # Hospital
@@ -237,16 +348,22 @@ def generate_city_map(width=2400, height=1800):
                 h_x = block_x + block_w//2 - h_width//2
                 h_y = block_y + block_h//2 - h_height//2
                 
-                pygame.draw.rect(surface, (255, 255, 255), 
+                plan.rect((255, 255, 255), 
                                (h_x, h_y, h_width, h_height//3))  # Horizontal bar
-                pygame.draw.rect(surface, (255, 255, 255), 
+                plan.rect((255, 255, 255), 
                                (h_x + h_width//3, h_y, h_width//3, h_height))  # Vertical bar
             
             elif special_color == (50, 50, 180):  # Police
                 # Add police markings
-                pygame.draw.rect(surface, (255, 255, 255), 
+                plan.rect((255, 255, 255), 
                                (block_x + block_w//2 - 20, block_y + block_h//2 - 5, 40, 10))
     
+        block_info.append({
+            "rect": pygame.Rect(block_x, block_y, block_w, block_h),
+            "type": block_type,
+            "subtype": block_subtype
+        })
+    
     # 5. Add water bodies (blue areas) sometimes cutting across blocks
     num_water_features = random.randint(1, 3)
     for _ in range(num_water_features):
@@ -257,12 +374,12 @@ def generate_city_map(width=2400, height=1800):
         
         water_color = (50, 100, 200)  # Blue
         water_rect = pygame.Rect(water_x, water_y, water_width, water_height)
-        pygame.draw.rect(surface, water_color, water_rect)
+        plan.rect(water_color, water_rect)
         
         # Add shoreline
         shore_color = (200, 180, 130)  # Sandy color
         shore_width = 8
-        pygame.draw.rect(surface, shore_color, 
+        plan.rect(shore_color, 
                        (water_x - shore_width, water_y - shore_width, 
                        water_width + 2*shore_width, water_height + 2*shore_width), 
                        shore_width)
@@ -270,9 +387,9 @@ def generate_city_map(width=2400, height=1800):
         # Add building collision for water
         building_rects.append(water_rect)
     
-    return surface, building_rects
+    return plan, building_rects, block_info
 
-def add_building_details(surface, building_rect, base_color):
+def add_building_details(plan, building_rect, base_color):
     """Add windows and details to buildings"""
     # Lighten color for windows
     window_color = (min(base_color[0] + 30, 255), 
@@ -295,8 +412,8 @@ def add_building_details(surface, building_rect, base_color):
             if random.random() < 0.2:
                 continue
                 
-            pygame.draw.rect(surface, window_color, 
-                           (x, y, window_size, window_size))
+            plan.rect(window_color, 
+                           (x, y, window_size, window_size), detail=True)
 
 def save_map(map_surface, filename="generated_map.jpeg"):
     """Save the generated map to a file"""
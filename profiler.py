@@ -0,0 +1,125 @@
+"""
+Frame profiler for GTA-style South Park Canadian game
+This module collects per-frame section timings and counters (draw calls,
+sprites submitted, entities updated...) so they can be shown in the debug
+overlay and compared between builds, and times the startup phases up to the
+first frame.
+"""
+import time
+
+class ProfileSection:
+    """Context manager that adds its elapsed time to a profiler section"""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        elapsed = time.perf_counter() - self.start
+        sections = self.profiler.sections
+        sections[self.name] = sections.get(self.name, 0.0) + elapsed
+        return False
+
+class FrameProfiler:
+    """Per-frame timings and counters with smoothed averages for display"""
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing  # Weight of the newest frame in the averages
+        self.frame_start = 0.0
+        self.sections = {}  # name -> seconds spent this frame
+        self.counters = {}  # name -> count this frame
+        self.open_sections = {}  # name -> start time for begin()/end()
+        self.last_sections = {}
+        self.last_counters = {}
+        self.averages = {}  # name -> smoothed milliseconds
+        self.frames = 0
+
+    def begin_frame(self):
+        """Start collecting a new frame"""
+        self.frame_start = time.perf_counter()
+        self.sections = {}
+        self.counters = {}
+        self.open_sections = {}
+
+    def end_frame(self):
+        """Finish the frame and fold it into the running averages"""
+        self.sections["frame"] = time.perf_counter() - self.frame_start
+        self.last_sections = self.sections
+        self.last_counters = self.counters
+        self.frames += 1
+
+        for name, seconds in self.sections.items():
+            ms = seconds * 1000.0
+            if name in self.averages:
+                self.averages[name] += (ms - self.averages[name]) * self.smoothing
+            else:
+                self.averages[name] = ms
+
+    def section(self, name):
+        """Time a block of code: `with profiler.section("render"): ...`"""
+        return ProfileSection(self, name)
+
+    def begin(self, name):
+        """Start timing a section that spans code a `with` block can't wrap"""
+        self.open_sections[name] = time.perf_counter()
+
+    def end(self, name):
+        """Stop timing a section started with begin()"""
+        start = self.open_sections.pop(name, None)
+        if start is not None:
+            self.sections[name] = self.sections.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        """Add to a per-frame counter"""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report_lines(self):
+        """Lines of text for the debug overlay"""
+        lines = []
+        for name, ms in sorted(self.averages.items(), key=lambda item: -item[1]):
+            lines.append(f"{name}: {ms:.2f} ms")
+        for name, value in sorted(self.last_counters.items()):
+            lines.append(f"{name}: {value}")
+        return lines
+
+class StartupProfile:
+    """Wall-clock time of each startup phase, up to the first frame on screen"""
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.last_mark = time.perf_counter()
+        self.sections = {}  # phase name -> seconds, in the order the phases ran
+        self.first_frame = None  # Seconds from start to the first presented frame
+
+    def section(self, name):
+        """Time a startup phase: `with startup.section("load snapshot"): ...`"""
+        return ProfileSection(self, name)
+
+    def add(self, name, seconds):
+        """Record a phase timed elsewhere (the imports run before any profile exists)"""
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def mark(self, name):
+        """End a phase: the time since the previous mark is charged to name"""
+        now = time.perf_counter()
+        self.add(name, now - self.last_mark)
+        self.last_mark = now
+
+    def first_frame_presented(self):
+        """Stop the clock when the first frame reaches the screen"""
+        if self.first_frame is None:
+            self.mark("first frame")
+            self.first_frame = self.last_mark - self.start
+
+    def report_lines(self):
+        """Phase breakdown, slowest first, then time to first frame"""
+        lines = []
+        for name, seconds in sorted(self.sections.items(), key=lambda item: -item[1]):
+            lines.append(f"{name}: {seconds * 1000:.1f} ms")
+        if self.first_frame is not None:
+            lines.append(f"time to first frame: {self.first_frame * 1000:.1f} ms")
+        return lines
@@ -0,0 +1,264 @@
+"""
+Renderer backends for GTA-style South Park Canadian game
+This module hides how a frame is composited: the Surface backend blits
+everything onto the display surface on the CPU, while the texture backend
+uploads the city and sprites to SDL2 textures (pygame._sdl2.video) once and
+rotates/scales them at draw time.
+"""
+import os
+import weakref
+import pygame
+
+try:
+    from pygame._sdl2 import video as sdl2_video
+except ImportError:
+    sdl2_video = None
+
+# SDL texture blend modes
+BLENDMODE_BLEND = 1
+BLENDMODE_ADD = 2
+
+# Environment variable that picks the backend ("surface" or "texture")
+RENDERER_ENV = "GAME_RENDERER"
+
+class RotationCache:
+    """Rotated copies of sprite surfaces, keyed by source surface and whole degree"""
+    def __init__(self):
+        # Weak keys: a sprite's rotations are dropped together with the sprite
+        self.rotated = weakref.WeakKeyDictionary()  # surface -> {degrees: surface}
+
+    def get(self, surface, angle):
+        """Return the surface rotated clockwise by angle degrees"""
+        degrees = int(round(angle)) % 360
+        by_angle = self.rotated.get(surface)
+        if by_angle is None:
+            by_angle = self.rotated[surface] = {}
+        rotated = by_angle.get(degrees)
+        if rotated is None:
+            rotated = by_angle[degrees] = pygame.transform.rotate(surface, -degrees)
+        return rotated
+
+    def resolve(self, sprites):
+        """Turn sprites into blit-ready [(surface, top_left), ...]
+
+        A sprite is either (surface, top_left) or (surface, center, angle);
+        the second form is rotated around its center.
+        """
+        resolved = []
+        for sprite in sprites:
+            if len(sprite) == 3:
+                surface, (center_x, center_y), angle = sprite
+                if angle:
+                    surface = self.get(surface, angle)
+                resolved.append((surface, (center_x - surface.get_width() / 2,
+                                           center_y - surface.get_height() / 2)))
+            else:
+                resolved.append(sprite)
+        return resolved
+
+# Shared by the Surface backend and the entities' stand-alone draw() methods
+sprite_rotations = RotationCache()
+
+class SurfaceRenderer:
+    """CPU backend: everything is blitted onto the pygame display surface"""
+    name = "surface"
+
+    def __init__(self):
+        self.screen = None
+        self.resizable = False
+
+        # Persistent darkness overlay, refilled only when its colour changes
+        self.darkness = None
+        self.darkness_key = None
+
+    def open(self, size, resizable=False):
+        """Create (or recreate) the window and return the surface to draw UI on"""
+        self.resizable = resizable
+        flags = pygame.RESIZABLE if resizable else 0
+        self.screen = pygame.display.set_mode(size, flags)
+        return self.screen
+
+    def resize(self, size):
+        """Follow a window resize"""
+        return self.open(size, self.resizable)
+
+    def set_caption(self, caption):
+        pygame.display.set_caption(caption)
+
+    def begin_frame(self, clear_color):
+        """Start a new frame cleared to a colour"""
+        self.screen.fill(clear_color)
+
+    def fill(self, color):
+        """Fill the whole frame with a colour"""
+        self.screen.fill(color)
+
+    def draw_map(self, image, camera_x, camera_y):
+        """Draw the visible part of the city image"""
+        self.screen.blit(image, (-camera_x, -camera_y))
+
+    def update_region(self, surface, patch, area):
+        """Part of a long-lived surface was redrawn (blits read it directly, so nothing to do)"""
+
+    def draw_overlay(self, surface):
+        """Draw a full-screen (usually transparent) surface over the world"""
+        self.screen.blit(surface, (0, 0))
+
+    def draw_sprites(self, sprites):
+        """Draw a batch of sprites in order with a single blits() call"""
+        if sprites:
+            self.screen.blits(sprite_rotations.resolve(sprites), doreturn=False)
+
+    def draw_darkness(self, color, alpha):
+        """Darken the whole frame with a tinted, translucent fill"""
+        if self.darkness is None or self.darkness.get_size() != self.screen.get_size():
+            self.darkness = pygame.Surface(self.screen.get_size())
+            self.darkness_key = None
+
+        if self.darkness_key != (color, alpha):
+            self.darkness.fill(color)
+            self.darkness.set_alpha(alpha)
+            self.darkness_key = (color, alpha)
+
+        self.screen.blit(self.darkness, (0, 0))
+
+    def draw_additive(self, sprites):
+        """Add sprites' colours onto the frame (lights)"""
+        if sprites:
+            self.screen.blits([(surface, pos, None, pygame.BLEND_RGB_ADD)
+                               for surface, pos in sprites], doreturn=False)
+
+    def present(self):
+        """Show the finished frame"""
+        # Use both update and flip to ensure rendering
+        pygame.display.update()
+        pygame.display.flip()
+
+class TextureRenderer:
+    """SDL2 backend: the city and sprites live in textures, UI is one overlay per frame"""
+    name = "texture"
+
+    def __init__(self):
+        if sdl2_video is None:
+            raise RuntimeError("pygame._sdl2.video is not available")
+        self.window = None
+        self.renderer = None
+        self.screen = None  # Transparent UI layer, uploaded once per frame
+        self.caption = "GTA-Style Game"
+
+        # Textures for surfaces that outlive a frame (city image, cached sprites)
+        self.textures = weakref.WeakKeyDictionary()  # surface -> Texture
+        self.layers = {}  # name -> streaming Texture for full-screen overlays
+
+    def open(self, size, resizable=False):
+        """Create the window and renderer and return the UI layer surface"""
+        if self.window is None:
+            self.window = sdl2_video.Window(self.caption, size=size, resizable=resizable)
+            self.renderer = sdl2_video.Renderer(self.window)
+        else:
+            self.window.size = size
+        self.renderer.draw_blend_mode = BLENDMODE_BLEND
+
+        self.screen = pygame.Surface(size, pygame.SRCALPHA)
+        self.layers = {}
+        return self.screen
+
+    def resize(self, size):
+        """Follow a window resize"""
+        return self.open(size)
+
+    def set_caption(self, caption):
+        self.caption = caption
+        if self.window is not None:
+            self.window.title = caption
+
+    def texture_for(self, surface):
+        """Return the texture for a surface, uploading it on first use"""
+        texture = self.textures.get(surface)
+        if texture is None:
+            texture = sdl2_video.Texture.from_surface(self.renderer, surface)
+            texture.blend_mode = BLENDMODE_BLEND
+            self.textures[surface] = texture
+        return texture
+
+    def update_region(self, surface, patch, area):
+        """Part of a long-lived surface was redrawn: copy the patch into its texture"""
+        texture = self.textures.get(surface)
+        if texture is not None:
+            texture.update(patch, area)
+
+    def layer(self, name):
+        """Return a streaming texture the size of the window for a full-screen overlay"""
+        texture = self.layers.get(name)
+        if texture is None:
+            texture = sdl2_video.Texture(self.renderer, self.screen.get_size(), streaming=True)
+            texture.blend_mode = BLENDMODE_BLEND
+            self.layers[name] = texture
+        return texture
+
+    def begin_frame(self, clear_color):
+        """Start a new frame cleared to a colour with an empty UI layer"""
+        self.fill(clear_color)
+        self.screen.fill((0, 0, 0, 0))
+
+    def fill(self, color):
+        """Fill the whole frame with a colour"""
+        self.renderer.draw_color = tuple(color[:3]) + (255,)
+        self.renderer.clear()
+
+    def draw_map(self, image, camera_x, camera_y):
+        """Draw the visible part of the city texture"""
+        width, height = self.screen.get_size()
+        self.texture_for(image).draw(
+            srcrect=(int(camera_x), int(camera_y), width, height),
+            dstrect=(0, 0, width, height))
+
+    def draw_overlay(self, surface):
+        """Draw a full-screen (usually transparent) surface over the world"""
+        texture = self.layer("overlay")
+        texture.update(surface)
+        texture.draw()
+
+    def draw_sprites(self, sprites):
+        """Draw a batch of sprites in order, rotating on the renderer"""
+        for sprite in sprites:
+            surface = sprite[0]
+            texture = self.texture_for(surface)
+            width, height = surface.get_size()
+            if len(sprite) == 3:
+                _, (center_x, center_y), angle = sprite
+                texture.draw(dstrect=(int(center_x - width / 2), int(center_y - height / 2),
+                                      width, height),
+                             angle=angle)
+            else:
+                x, y = sprite[1]
+                texture.draw(dstrect=(int(x), int(y), width, height))
+
+    def draw_darkness(self, color, alpha):
+        """Darken the whole frame with a tinted, translucent fill"""
+        self.renderer.draw_color = tuple(color[:3]) + (alpha,)
+        self.renderer.fill_rect((0, 0) + self.screen.get_size())
+
+    def draw_additive(self, sprites):
+        """Add sprites' colours onto the frame (lights)"""
+        for surface, (x, y) in sprites:
+            texture = self.texture_for(surface)
+            texture.blend_mode = BLENDMODE_ADD
+            texture.draw(dstrect=(int(x), int(y)) + surface.get_size())
+
+    def present(self):
+        """Composite the UI layer and show the finished frame"""
+        ui = self.layer("ui")
+        ui.update(self.screen)
+        ui.draw()
+        self.renderer.present()
+
+def create_renderer(name=None):
+    """Create the backend named by the argument or GAME_RENDERER, falling back to surfaces"""
+    name = (name or os.environ.get(RENDERER_ENV, "surface")).lower()
+    if name == "texture":
+        try:
+            return TextureRenderer()
+        except Exception as e:
+            print(f"Texture renderer unavailable ({e}), using surface renderer")
+    return SurfaceRenderer()
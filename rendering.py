@@ -0,0 +1,66 @@
+"""
+Sprite batching for GTA-style South Park Canadian game
+This module implements a render queue that collects the sprites of every
+entity system, de-duplicates entities submitted more than once, sorts them
+by layer and depth and hands them to the renderer as one batch. It also
+keeps the UI fonts, so text drawn every frame doesn't reload them.
+"""
+import pygame
+
+FONTS = {}  # (name, size) -> pygame.font.Font
+
+# Draw layers, lowest first
+LAYER_GROUND = 0      # Dead pedestrians, decals
+LAYER_VEHICLES = 1    # Cars and police
+LAYER_CHARACTERS = 2  # Pedestrians and the player
+LAYER_EFFECTS = 3     # Bullets, sirens, sparks
+
+def font(name, size):
+    """Cached pygame.font.SysFont (the first named lookup scans every system font)"""
+    key = (name, size)
+    cached = FONTS.get(key)
+    if cached is None:
+        cached = FONTS[key] = pygame.font.SysFont(name, size)
+    return cached
+
+class RenderQueue:
+    """Collects sprites for one frame and submits them as one batch"""
+    def __init__(self):
+        self.items = {}  # id(owner) -> (layer, sort_y, order, sprites)
+        self.order = 0
+        self.duplicates = 0
+
+    def submit(self, owner, layer, sort_y, sprites):
+        """Queue an entity's sprites for this frame
+
+        Sprites are (surface, top_left) or (surface, center, angle) tuples.
+        """
+        key = id(owner)
+        if key in self.items:
+            # Entity already queued by another system this frame
+            self.duplicates += 1
+            return
+        self.items[key] = (layer, sort_y, self.order, sprites)
+        self.order += 1
+
+    def __len__(self):
+        return len(self.items)
+
+    def flush(self, renderer, profiler=None):
+        """Sort queued sprites by layer/y and draw them as one batch"""
+        ordered = sorted(self.items.values())
+        blit_sequence = []
+        for _, _, _, sprites in ordered:
+            blit_sequence.extend(sprites)
+
+        renderer.draw_sprites(blit_sequence)
+
+        if profiler:
+            profiler.count("draw_calls", 1 if blit_sequence else 0)
+            profiler.count("sprites", len(blit_sequence))
+            profiler.count("duplicate_submits", self.duplicates)
+
+        self.items = {}
+        self.order = 0
+        self.duplicates = 0
+        return len(blit_sequence)
@@ -0,0 +1,77 @@
+"""
+Input replays for GTA-style South Park Canadian game
+This module saves a session's RNG seeds, game settings and per-tick input
+action masks to a small binary file and loads them back, so a recorded
+session can be re-run headlessly as a repeatable benchmark workload.
+
+File layout (little-endian):
+    header: magic "GTAR", version (u16), flags (u16), world seed (u64),
+            region seed (u64), city seed (u64), tick count (u32), run count (u32)
+    runs:   run count x (action mask (u8), ticks (u16))
+"""
+import random
+import struct
+
+MAGIC = b"GTAR"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHQQQII")
+RUN = struct.Struct("<BH")
+MAX_RUN = 0xFFFF
+
+# Settings that change how the same input plays out
+FLAG_AUTO_CONTROL = 1 << 0
+FLAG_TOUCH = 1 << 1
+WORKERS_SHIFT = 8  # High byte: district worker processes (see districts.py)
+
+def new_seeds():
+    """Fresh seeds for the world RNG, the event-region RNG and the city layout"""
+    system_random = random.SystemRandom()
+    return {
+        "world": system_random.getrandbits(64),
+        "regions": system_random.getrandbits(64),
+        "city": system_random.getrandbits(64),
+    }
+
+def encode_runs(masks):
+    """Run-length encode per-tick masks as [(mask, ticks), ...]"""
+    runs = []
+    for mask in masks:
+        if runs and runs[-1][0] == mask and runs[-1][1] < MAX_RUN:
+            runs[-1][1] += 1
+        else:
+            runs.append([mask, 1])
+    return runs
+
+def save(path, seeds, masks, flags=0):
+    """Write a replay file"""
+    runs = encode_runs(masks)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, seeds["world"], seeds["regions"],
+                            seeds.get("city", seeds["world"]), len(masks), len(runs)))
+        f.write(b"".join(RUN.pack(mask, ticks) for mask, ticks in runs))
+
+def load(path):
+    """Read a replay file; returns (seeds, masks, flags)"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is too short to be a replay")
+    magic, version, flags, world_seed, region_seed, city_seed, tick_count, run_count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a replay file")
+    if version != VERSION:
+        # Version 1 replays drew the city from the world RNG and can't be re-run exactly
+        raise ValueError(f"Unsupported replay version {version} (expected {VERSION})")
+    if len(data) != HEADER.size + run_count * RUN.size:
+        raise ValueError(f"{path} is truncated or corrupt")
+
+    masks = []
+    for mask, ticks in RUN.iter_unpack(data[HEADER.size:]):
+        masks.extend([mask] * ticks)
+    if len(masks) != tick_count:
+        raise ValueError(f"{path} holds {len(masks)} ticks, header says {tick_count}")
+
+    seeds = {"world": world_seed, "regions": region_seed, "city": city_seed}
+    return seeds, masks, flags
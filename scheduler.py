@@ -0,0 +1,60 @@
+"""
+Tick scheduler for GTA-style South Park Canadian game
+This module implements a min-heap of "fire at tick T" callbacks shared by all
+game systems, so timers that are just waiting cost nothing per frame.
+"""
+import heapq
+
+class TimerHandle:
+    """A scheduled callback; keep it to cancel the timer or ask how long is left"""
+    __slots__ = ("time", "callback", "args", "cancelled")
+
+    def __init__(self, time, callback, args):
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+class Scheduler:
+    """Runs callbacks when the game tick reaches their due time"""
+    def __init__(self):
+        self.tick = 0
+        self.queue = []  # Heap of (time, sequence, handle)
+        self.sequence = 0  # Keeps callbacks due on the same tick in scheduling order
+
+    def schedule(self, delay, callback, *args):
+        """Call callback(*args) after delay ticks (at least one)"""
+        return self.schedule_at(self.tick + max(1, int(delay)), callback, *args)
+
+    def schedule_at(self, time, callback, *args):
+        """Call callback(*args) when the tick counter reaches time"""
+        handle = TimerHandle(time, callback, args)
+        heapq.heappush(self.queue, (time, self.sequence, handle))
+        self.sequence += 1
+        return handle
+
+    def cancel(self, handle):
+        """Cancel a pending timer (it is dropped lazily when it reaches the top)"""
+        if handle is not None:
+            handle.cancelled = True
+
+    def remaining(self, handle):
+        """Ticks until a timer fires, 0 if it has fired or was cancelled"""
+        if handle is None or handle.cancelled:
+            return 0
+        return max(0, handle.time - self.tick)
+
+    def advance(self):
+        """Move to the next tick and run every callback that is now due"""
+        self.tick += 1
+        queue = self.queue
+        while queue and queue[0][0] <= self.tick:
+            _, _, handle = heapq.heappop(queue)
+            if handle.cancelled:
+                continue
+            # Mark as done first so remaining() reports 0 inside the callback
+            handle.cancelled = True
+            handle.callback(*handle.args)
+
+    def __len__(self):
+        return len(self.queue)
@@ -5,10 +5,16 @@ in the style of GTA 1/2 with South Park Canadian characters.
 """
 import random
 import math
+import time
+from collections import deque
 import pygame
+import spatial_index
 
 class SideActivity:
     """Base class for all side activities"""
+    # Progress attributes saved in snapshots (subclasses add their own)
+    saved_fields = ("active", "completed", "stage", "progress", "message", "target_markers")
+
     def __init__(self, game, activity_type, name, description):
         self.game = game
         self.type = activity_type
@@ -17,27 +23,58 @@ class SideActivity:
         self.active = False
         self.completed = False
         self.failed = False
-        self.timer = 0
+        self.timeout = None  # Scheduler handle behind self.timer
+        self.message_expires = 0  # Scheduler tick when the message disappears
         self.max_time = 0
         self.progress = 0
         self.required_progress = 100
         self.reward = 100
         self.stage = 0
         self.message = ""
-        self.message_timer = 0
         self.trigger_points = []  # [(x, y, radius), ...] locations where activity can be triggered
         self.target_markers = []  # [(x, y, type), ...] markers for objectives
 
-    def can_trigger(self, player_x, player_y):
-        """Check if player is near a trigger point"""
-        if self.active or self.completed:
-            return False
-            
-        for x, y, radius in self.trigger_points:
-            if math.sqrt((player_x - x) ** 2 + (player_y - y) ** 2) < radius:
-                return True
-        return False
-    
+    @property
+    def timer(self):
+        """Ticks left on the activity clock (0 when stopped)"""
+        return self.game.scheduler.remaining(self.timeout)
+
+    @timer.setter
+    def timer(self, ticks):
+        # Restart the clock on the game's scheduler; 0 stops it
+        self.game.scheduler.cancel(self.timeout)
+        self.timeout = self.game.scheduler.schedule(ticks, self.on_timeout) if ticks > 0 else None
+
+    @property
+    def message_timer(self):
+        """Ticks left to show the current message"""
+        return max(0, self.message_expires - self.game.scheduler.tick)
+
+    @message_timer.setter
+    def message_timer(self, ticks):
+        self.message_expires = self.game.scheduler.tick + ticks
+
+    def on_timeout(self):
+        """Scheduler callback: the activity clock ran out"""
+        self.timeout = None
+        if self.active and self.max_time > 0:
+            self.fail("Time's up, eh! You couldn't finish, buddy!")
+
+    def save_state(self):
+        """Progress as plain values, for snapshots"""
+        state = {name: getattr(self, name) for name in self.saved_fields}
+        state["timer"] = self.timer
+        state["message_timer"] = self.message_timer
+        return state
+
+    def load_state(self, state):
+        """Restore progress saved by save_state()"""
+        for name in self.saved_fields:
+            if name in state:
+                setattr(self, name, state[name])
+        self.timer = state.get("timer", 0)
+        self.message_timer = state.get("message_timer", 0)
+
     def trigger(self):
         """Start the activity"""
         self.active = True
@@ -47,19 +84,20 @@ class SideActivity:
         self.message = f"Started: {self.name}"
         self.message_timer = 180
         
+    def setup(self):
+        """Return a generator of setup work to spread over frames, or None
+
+        The activity manager runs it under its per-frame budget after a
+        successful trigger() and holds off update() until it is finished.
+        """
+        return None
+        
     def update(self, player, walls, vehicles, pedestrians):
         """Update activity state - override in subclasses"""
         if not self.active:
             return
             
-        if self.message_timer > 0:
-            self.message_timer -= 1
-            
-        if self.timer > 0:
-            self.timer -= 1
-            if self.timer <= 0 and self.max_time > 0:
-                self.fail("Time's up, eh! You couldn't finish, buddy!")
-                
+        # Message and time limit run on the game's scheduler (see timer/message_timer)
         if self.progress >= self.required_progress:
             self.complete()
             
@@ -68,16 +106,15 @@ class SideActivity:
         if not self.active:
             return
             
-        # Draw target markers
-        for x, y, marker_type in self.target_markers:
+        # Draw target markers (only the ones the game's spatial index says are on screen)
+        if hasattr(self.game, 'entity_index'):
+            markers = self.game.visible(("marker", self.type))
+        else:
+            markers = self.target_markers
+        for x, y, marker_type in markers:
             screen_x = x - camera_x
             screen_y = y - camera_y
             
-            # Skip if off-screen
-            if (screen_x < -50 or screen_x > screen.get_width() + 50 or 
-                screen_y < -50 or screen_y > screen.get_height() + 50):
-                continue
-                
             # Draw different marker types
             if marker_type == "pickup":
                 pygame.draw.circle(screen, (0, 255, 0), (int(screen_x), int(screen_y)), 10)
@@ -121,6 +158,7 @@ class SideActivity:
         """Mark activity as completed"""
         self.active = False
         self.completed = True
+        self.timer = 0
         self.message = f"Completed: {self.name}! Reward: ${self.reward}"
         self.message_timer = 180
         
@@ -132,11 +170,148 @@ class SideActivity:
         """Mark activity as failed"""
         self.active = False
         self.failed = False  # Reset fail state to allow retrying
+        self.timer = 0
         self.message = f"Failed: {reason}"
         self.message_timer = 180
 
+class TriggerIndex:
+    """Trigger points of every side activity in one grid, cached per player cell
+
+    The player's cell only changes every few seconds of movement, so the
+    handful of triggers that overlap it are looked up once per cell and
+    each frame only tests those with squared distances.
+    """
+    def __init__(self, activities, cell_size=256):
+        self.cell_size = cell_size
+        self.grid = spatial_index.SpatialHash(cell_size)
+        self.cell = None  # Player cell the candidates belong to
+        self.candidates = []  # [[x, y, radius_sq, activity, rank], ...] near the player's cell, by rank
+        self.build(activities)
+
+    def build(self, activities):
+        """Index the trigger circles of all activities"""
+        self.grid.clear()
+        for rank, activity in enumerate(activities):
+            for x, y, radius in activity.trigger_points:
+                trigger = [x, y, radius * radius, activity, rank]
+                self.grid.insert(trigger, x - radius, y - radius, radius * 2, radius * 2)
+        self.cell = None
+
+    def triggerable(self, player_x, player_y):
+        """Activities (in registration order) the player can start from here"""
+        size = self.cell_size
+        cell = (int(player_x // size), int(player_y // size))
+        if cell != self.cell:
+            self.cell = cell
+            # The grid returns them in bucket order; sort once per cell so results come in registration order
+            self.candidates = sorted(self.grid.query_rect((cell[0] * size, cell[1] * size, size, size)),
+                                     key=lambda trigger: trigger[4])
+
+        found = []
+        for x, y, radius_sq, activity, _ in self.candidates:
+            if activity.active or activity.completed or activity in found:
+                continue
+            if (player_x - x) ** 2 + (player_y - y) ** 2 < radius_sq:
+                found.append(activity)
+        return found
+
+# Activity classes every ActivityManager creates, in registration order
+ACTIVITY_TYPES = []
+
+def register_activity(activity_class):
+    """Class decorator: add an activity type to the game"""
+    ACTIVITY_TYPES.append(activity_class)
+    return activity_class
+
+class AttributeView:
+    """Read-only view over list attributes of an object, read at iteration time
+
+    Lets activities walk e.g. vehicles and police vehicles as one sequence
+    without concatenating lists, and follows the attributes if they are
+    reassigned (the no-police cheat swaps the police list).
+    """
+    __slots__ = ("owner", "names")
+
+    def __init__(self, owner, *names):
+        self.owner = owner
+        self.names = names
+
+    def __iter__(self):
+        for name in self.names:
+            yield from getattr(self.owner, name)
+
+    def __len__(self):
+        return sum(len(getattr(self.owner, name)) for name in self.names)
+
+class ActivityManager:
+    """Owns the side activities: creation, triggering, setup work and updates"""
+    def __init__(self, game, budget_ms=2.0):
+        self.game = game
+        self.budget = budget_ms / 1000.0  # Seconds of setup work allowed per frame
+        self.activities = [activity_class(game) for activity_class in ACTIVITY_TYPES]
+        self.trigger_index = TriggerIndex(self.activities)
+        self.jobs = deque()  # (activity, generator) setup work in progress
+        self.setting_up = set()  # Activities whose setup hasn't finished
+
+        # Shared views handed to every activity update
+        self.vehicles = AttributeView(game.map, "vehicles", "police_vehicles")
+
+    def add(self, activity):
+        """Add an activity created outside the registry"""
+        self.activities.append(activity)
+        self.trigger_index.build(self.activities)
+
+    def triggerable(self, player_x, player_y):
+        """Activities the player can start from here"""
+        return self.trigger_index.triggerable(player_x, player_y)
+
+    def trigger(self, activity):
+        """Start an activity and queue its setup work"""
+        activity.trigger()
+        if activity.active:
+            self.queue_setup(activity)
+
+    def queue_setup(self, activity):
+        """Queue an activity's setup work (also re-run for restored snapshots)"""
+        job = activity.setup()
+        if job is not None:
+            self.jobs.append((activity, job))
+            self.setting_up.add(activity)
+
+    def run_jobs(self):
+        """Advance queued setup work until this frame's budget is spent"""
+        deadline = time.perf_counter() + self.budget
+        while self.jobs:
+            activity, job = self.jobs[0]
+            try:
+                next(job)
+            except StopIteration:
+                self.jobs.popleft()
+                self.setting_up.discard(activity)
+            # Always make some progress, then stop once over budget
+            if time.perf_counter() >= deadline:
+                break
+
+    def update(self, player):
+        """Run setup work, then update each active, ready activity once"""
+        self.run_jobs()
+        walls = self.game.map.walls
+        pedestrians = self.game.map.pedestrians
+        for activity in self.activities:
+            if activity.active and activity not in self.setting_up:
+                activity.update(player, walls, self.vehicles, pedestrians)
+
+    def draw(self, screen, camera_x, camera_y, font):
+        """Draw the active activities"""
+        for activity in self.activities:
+            if activity.active:
+                activity.draw(screen, camera_x, camera_y, font)
+
+@register_activity
 class IllegalTaxi(SideActivity):
     """Illegal taxi service activity - steal a car and pick up shady fares"""
+    saved_fields = SideActivity.saved_fields + ("passenger", "has_passenger", "destination", "fare_count")
+
     def __init__(self, game):
         super().__init__(
             game,
@@ -156,6 +331,9 @@ class IllegalTaxi(SideActivity):
         for x in range(400, game.map.width, 800):
             for y in range(400, game.map.height, 800):
                 self.trigger_points.append((x, y, 150))
+        
+        # Build the road sample pool in the background rather than when the activity starts
+        game.map.prepare_road_samples()
     
     def trigger(self):
         super().trigger()
@@ -171,20 +349,11 @@ class IllegalTaxi(SideActivity):
     def generate_passenger(self):
         """Generate a random passenger waiting for pickup"""
         # Find a random road position away from player
-        road_pos = None
-        while road_pos is None:
-            candidate_road = random.choice(self.game.map.roads)
-            rect = candidate_road["rect"]
-            road_x = rect.x + random.randint(0, rect.width)
-            road_y = rect.y + random.randint(0, rect.height)
-            
-            # Make sure it's not too close to player
-            dx = road_x - self.game.player.x
-            dy = road_y - self.game.player.y
-            distance = math.sqrt(dx*dx + dy*dy)
-            
-            if distance > 500 and distance < 1200:
-                road_pos = (road_x, road_y)
+        pool = self.game.map.road_sample_pool()
+        road_pos = pool.choose_band(self.game.player.x, self.game.player.y, 500, 1200)
+        if road_pos is None:
+            # Small map: settle for any road position
+            road_pos = random.choice(pool.values) if pool.values else (self.game.player.x, self.game.player.y)
         
         self.passenger = road_pos
         self.has_passenger = False
@@ -199,19 +368,17 @@ class IllegalTaxi(SideActivity):
         # Find a different road position from passenger for dropoff
         road_pos = None
         if self.passenger:
-            while road_pos is None:
-                candidate_road = random.choice(self.game.map.roads)
-                rect = candidate_road["rect"]
-                road_x = rect.x + random.randint(0, rect.width)
-                road_y = rect.y + random.randint(0, rect.height)
-                
-                # Make sure it's far enough from pickup point
-                dx = road_x - self.passenger[0]
-                dy = road_y - self.passenger[1]
-                distance = math.sqrt(dx*dx + dy*dy)
-                
-                if distance > 800:
-                    road_pos = (road_x, road_y)
+            pool = self.game.map.road_sample_pool()
+            # Far enough from the pickup point (anything beyond the map's diagonal qualifies)
+            far = math.hypot(self.game.map.width, self.game.map.height) + 1
+            road_pos = pool.choose_band(self.passenger[0], self.passenger[1], 800, far)
+            if road_pos is None and pool.values:
+                road_pos = random.choice(pool.values)
+            if road_pos is None:
+                # No road samples at all: just place one 800 pixels away, inside the map
+                angle = random.uniform(0, 2 * math.pi)
+                road_pos = (min(max(self.passenger[0] + math.cos(angle) * 800, 0), self.game.map.width),
+                            min(max(self.passenger[1] + math.sin(angle) * 800, 0), self.game.map.height))
         
         self.destination = road_pos
     
@@ -255,8 +422,11 @@ class IllegalTaxi(SideActivity):
                     self.message_timer = 120
                     self.generate_passenger()
 
+@register_activity
 class GarbageTruckRace(SideActivity):
     """Race in a stolen garbage truck through narrow alleys"""
+    saved_fields = SideActivity.saved_fields + ("checkpoints", "current_checkpoint")
+
     def __init__(self, game):
         super().__init__(
             game,
@@ -274,15 +444,18 @@ class GarbageTruckRace(SideActivity):
         for x in range(600, game.map.width, 1000):
             for y in range(600, game.map.height, 1000):
                 self.trigger_points.append((x, y, 150))
+        
+        # Build the wall-free checkpoint pool in the background rather than when the race starts
+        game.map.prepare_road_samples(clearance=30)
     
     def trigger(self):
         super().trigger()
         self.timer = self.max_time
         
-        # Set up race checkpoints
-        self.generate_checkpoints()
+        # Race checkpoints are laid out by setup() over the next frames
+        self.checkpoints = []
         self.current_checkpoint = 0
-        self.update_checkpoint_markers()
+        self.target_markers = []
         
         # Check if player is in a vehicle
         if self.game.player.in_vehicle:
@@ -330,48 +503,35 @@ class GarbageTruckRace(SideActivity):
         
         self.game.map.vehicles.append(truck)
     
-    def generate_checkpoints(self):
-        """Generate a series of checkpoints for the race"""
+    def setup(self):
+        """Lay out the race checkpoints a few at a time"""
+        yield from self.checkpoint_steps()
+        self.current_checkpoint = 0
+        self.update_checkpoint_markers()
+    
+    def checkpoint_steps(self):
+        """Generate the race checkpoints, yielding after each one"""
         self.checkpoints = []
         
         # Start with player position
         last_x, last_y = self.game.player.x, self.game.player.y
         
+        # Road points with no wall inside a 60x60 box around them
+        pool = self.game.map.road_sample_pool(clearance=30)
+        
         # Generate 10 checkpoints, each progressively further from the start
         for i in range(10):
-            # Get a random road segment that's a certain distance from last checkpoint
+            # Get a random wall-free road point a certain distance from last checkpoint
             found = False
-            attempts = 0
             min_dist = 200 + i * 50  # Progressively further
             max_dist = 400 + i * 50
             
-            while not found and attempts < 50:
-                road = random.choice(self.game.map.roads)
-                rect = road["rect"]
-                cp_x = rect.x + random.randint(0, rect.width)
-                cp_y = rect.y + random.randint(0, rect.height)
-                
-                dx = cp_x - last_x
-                dy = cp_y - last_y
-                dist = math.sqrt(dx*dx + dy*dy)
-                
-                # Check if appropriate distance
-                if min_dist < dist < max_dist:
-                    # Ensure it doesn't collide with walls
-                    collides = False
-                    check_rect = pygame.Rect(cp_x - 30, cp_y - 30, 60, 60)
-                    
-                    for wall in self.game.map.walls:
-                        if check_rect.colliderect(wall["rect"]):
-                            collides = True
-                            break
-                    
-                    if not collides:
-                        self.checkpoints.append((cp_x, cp_y))
-                        last_x, last_y = cp_x, cp_y
-                        found = True
-                
-                attempts += 1
+            point = pool.choose_band(last_x, last_y, min_dist, max_dist)
+            if point is not None:
+                cp_x, cp_y = point
+                self.checkpoints.append((cp_x, cp_y))
+                last_x, last_y = cp_x, cp_y
+                found = True
             
             # If we couldn't find a good checkpoint, just place one
             if not found:
@@ -382,6 +542,8 @@ class GarbageTruckRace(SideActivity):
                 
                 self.checkpoints.append((cp_x, cp_y))
                 last_x, last_y = cp_x, cp_y
+            
+            yield
     
     def update_checkpoint_markers(self):
         """Update target markers to show current checkpoint"""
@@ -426,8 +588,12 @@ class GarbageTruckRace(SideActivity):
                 else:
                     self.complete()
 
+@register_activity
 class ParkingLotFightClub(SideActivity):
     """Enter underground fight club in parking lots"""
+    saved_fields = SideActivity.saved_fields + (
+        "arena_center", "arena_radius", "opponents", "fight_stage", "rounds_won")
+
     def __init__(self, game):
         super().__init__(
             game,
@@ -448,15 +614,13 @@ class ParkingLotFightClub(SideActivity):
         # Set trigger points in various locations
         for x in range(500, game.map.width, 900):
             for y in range(500, game.map.height, 900):
-                # Try to place it near buildings
-                found_building = False
-                for building in game.map.buildings:
-                    bx = building["rect"].centerx
-                    by = building["rect"].centery
-                    
-                    if math.sqrt((x - bx)**2 + (y - by)**2) < 300:
-                        found_building = True
-                        break
+                # Try to place it near buildings (within 300px of a building's center)
+                if hasattr(game.map, 'static_index'):
+                    found_building = bool(game.map.static_index.query_radius(x, y, 300, "building"))
+                else:
+                    found_building = any((x - building["rect"].centerx) ** 2 +
+                                         (y - building["rect"].centery) ** 2 < 300 * 300
+                                         for building in game.map.buildings)
                 
                 if found_building:
                     self.trigger_points.append((x, y, 150))
@@ -481,6 +645,18 @@ class ParkingLotFightClub(SideActivity):
         
         self.message = "Welcome to Fight Club, guy! First rule: Don't tell anyone aboot it!"
     
+    def save_state(self):
+        state = super().save_state()
+        # The current opponent is one of the opponents; store which
+        state["current_opponent"] = next((i for i, opponent in enumerate(self.opponents)
+                                          if opponent is self.current_opponent), None)
+        return state
+
+    def load_state(self, state):
+        super().load_state(state)
+        index = state.get("current_opponent")
+        self.current_opponent = self.opponents[index] if index is not None else None
+
     def generate_opponents(self):
         """Generate a series of progressively tougher opponents"""
         self.opponents = []
@@ -616,8 +792,7 @@ class ParkingLotFightClub(SideActivity):
                 # Attack if close and timer is up
                 if dist < 40 and opponent["timer"] <= 0:
                     # Deal damage to player
-                    if hasattr(player, 'health'):
-                        player.health -= opponent["damage"]
+                    player.take_damage(opponent["damage"])
                     
                     # Set cooldown
                     opponent["timer"] = 30
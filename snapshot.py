@@ -0,0 +1,603 @@
+"""
+Save-state snapshots for GTA-style South Park Canadian game
+This module writes the whole world (city geometry and image, vehicles,
+pedestrians, the player, events, cheats and side-activity progress) to a
+versioned binary file and restores it without regenerating the city, so a
+session can resume where it stopped and a saved world can be loaded as a
+fixed benchmark fixture.
+
+File layout (little-endian):
+    header:   magic "GTAS", version (u16), section count (u16), world seed (u64),
+              region seed (u64), city seed (u64), scheduler tick (u64)
+    sections: section count x (tag (4s), length (u32), one tagged value)
+
+Bulk data (geometry, entity columns, the palette-indexed city image) is
+stored as raw NumPy arrays inside the values; only small nested state goes
+through the per-value tags. Sections a reader doesn't know are ignored.
+
+Timers are saved as ticks remaining and rescheduled on restore. Attributes
+changed by cheats are saved at their unmodified values and the cheats are
+re-applied on top, so expiry still puts the right values back.
+"""
+import random
+import struct
+import zlib
+
+import numpy as np
+import pygame
+
+MAGIC = b"GTAS"
+VERSION = 3
+
+HEADER = struct.Struct("<4sHHQQQQ")
+SECTION = struct.Struct("<4sI")
+COUNT = struct.Struct("<I")
+INT = struct.Struct("<q")
+FLOAT = struct.Struct("<d")
+
+# Entity references (a pedestrian fleeing a car, the car the player drives)
+REF_NONE = -1
+REF_PLAYER = -2
+
+# Pedestrian colours, in the order they are stored
+PED_COLOR_KEYS = ("skin", "shirt", "pants", "shoes", "eyes")
+
+# Player attributes that cheats modify (saved without the modifiers)
+PLAYER_MODIFIED = ("shoot_cooldown_time", "bullet_speed", "rockets", "invincible")
+
+# Tagged values
+
+def write_value(out, value):
+    """Append one tagged value to a list of byte strings"""
+    if value is None:
+        out.append(b"N")
+    elif value is True or value is False or isinstance(value, np.bool_):
+        out.append(b"T" if value else b"F")
+    elif isinstance(value, (int, np.integer)):
+        out.append(b"i" + INT.pack(int(value)))
+    elif isinstance(value, (float, np.floating)):
+        out.append(b"f" + FLOAT.pack(float(value)))
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out.append(b"s" + COUNT.pack(len(data)) + data)
+    elif isinstance(value, bytes):
+        out.append(b"b" + COUNT.pack(len(value)) + value)
+    elif isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        dtype = array.dtype.str.encode("ascii")
+        out.append(b"a" + struct.pack(f"<B{len(dtype)}sB{array.ndim}I", len(dtype), dtype,
+                                      array.ndim, *array.shape))
+        out.append(array.tobytes())
+    elif isinstance(value, (tuple, list)):
+        out.append((b"t" if isinstance(value, tuple) else b"l") + COUNT.pack(len(value)))
+        for item in value:
+            write_value(out, item)
+    elif isinstance(value, dict):
+        out.append(b"d" + COUNT.pack(len(value)))
+        for key, item in value.items():
+            write_value(out, key)
+            write_value(out, item)
+    else:
+        raise TypeError(f"Can't store {type(value).__name__} values in a snapshot")
+
+class Reader:
+    """Decodes tagged values from a buffer"""
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values[0]
+
+    def take(self, size):
+        start = self.offset
+        self.offset += size
+        if self.offset > len(self.data):
+            raise ValueError("Snapshot section is truncated")
+        return self.data[start:self.offset]
+
+    def value(self):
+        tag = self.take(1)
+        if tag == b"N":
+            return None
+        if tag == b"T":
+            return True
+        if tag == b"F":
+            return False
+        if tag == b"i":
+            return self.unpack(INT)
+        if tag == b"f":
+            return self.unpack(FLOAT)
+        if tag == b"s":
+            return self.take(self.unpack(COUNT)).decode("utf-8")
+        if tag == b"b":
+            return bytes(self.take(self.unpack(COUNT)))
+        if tag == b"a":
+            dtype = np.dtype(self.take(self.take(1)[0]).decode("ascii"))
+            ndim = self.take(1)[0]
+            shape = struct.unpack_from(f"<{ndim}I", self.data, self.offset)
+            self.offset += 4 * ndim
+            count = int(np.prod(shape))
+            # A view straight onto the file's bytes (read-only)
+            array = np.frombuffer(self.data, dtype, count, self.offset).reshape(shape)
+            self.offset += count * dtype.itemsize
+            return array
+        if tag in (b"t", b"l"):
+            items = [self.value() for _ in range(self.unpack(COUNT))]
+            return tuple(items) if tag == b"t" else items
+        if tag == b"d":
+            result = {}
+            for _ in range(self.unpack(COUNT)):
+                key = self.value()
+                result[key] = self.value()
+            return result
+        raise ValueError(f"Unknown value tag {tag!r} in snapshot")
+
+# File
+
+class Snapshot:
+    """A loaded snapshot: seeds, scheduler tick and its sections, decoded on first use"""
+    def __init__(self, seeds, tick, data, sections):
+        self.seeds = seeds
+        self.tick = tick
+        self.data = data
+        self.sections = sections  # tag -> (offset, length)
+        self.decoded = {}
+
+    def __contains__(self, tag):
+        return tag in self.sections
+
+    def section(self, tag, default=None):
+        """A section's value, or default if the snapshot doesn't have it"""
+        if tag not in self.sections:
+            return default
+        if tag not in self.decoded:
+            offset, length = self.sections[tag]
+            reader = Reader(self.data, offset)
+            self.decoded[tag] = reader.value()
+            if reader.offset != offset + length:
+                raise ValueError(f"Snapshot section {tag.decode()} is corrupt")
+        return self.decoded[tag]
+
+def save(path, game):
+    """Write a snapshot of the running game"""
+    sections = capture(game)
+    seeds = game.seeds
+    parts = [HEADER.pack(MAGIC, VERSION, len(sections), seeds["world"], seeds["regions"],
+                         seeds.get("city", seeds["world"]), game.scheduler.tick)]
+    for tag, value in sections:
+        body = []
+        write_value(body, value)
+        body = b"".join(body)
+        parts.append(SECTION.pack(tag, len(body)))
+        parts.append(body)
+    data = b"".join(parts)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+def load(path):
+    """Read a snapshot file; sections are decoded when restored"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is too short to be a snapshot")
+    magic, version, section_count, world_seed, region_seed, city_seed, tick = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a snapshot file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version} (expected {VERSION})")
+
+    sections = {}
+    offset = HEADER.size
+    for _ in range(section_count):
+        if offset + SECTION.size > len(data):
+            raise ValueError(f"{path} is truncated or corrupt")
+        tag, length = SECTION.unpack_from(data, offset)
+        offset += SECTION.size
+        if offset + length > len(data):
+            raise ValueError(f"{path} is truncated or corrupt")
+        sections[tag] = (offset, length)
+        offset += length
+
+    seeds = {"world": world_seed, "regions": region_seed, "city": city_seed}
+    return Snapshot(seeds, tick, data, sections)
+
+# Saving
+
+def capture(game):
+    """The game's state as [(tag, value), ...]"""
+    game_map = game.map
+    refs = EntityRefs(game)
+    return [
+        (b"CITY", save_city(game_map)),
+        (b"IMAG", save_image(game_map.map_image)),
+        (b"VEHI", save_vehicles(game_map.vehicles, game, refs)),
+        (b"POLI", save_vehicles(refs.police, game, refs)),
+        (b"PEDS", save_pedestrians(game_map.pedestrians, game, refs)),
+        (b"PLAY", save_player(game.player, game, refs)),
+        (b"EVNT", save_events(game.event_system)),
+        (b"CHET", save_cheats(game.cheat_system)),
+        (b"ACTV", save_activities(game.activity_manager)),
+        (b"GAME", save_game(game)),
+        (b"RAND", {"world": random.getstate(), "regions": game.event_system.region_rng.getstate()}),
+    ]
+
+class EntityRefs:
+    """Numbers vehicles so references to them can be stored as integers"""
+    def __init__(self, game):
+        self.player = game.player
+        # Saved police are the real list, even while the no-police cheat hides it
+        self.police = game.cheat_system.modifiers.base_value(game.map, "police_vehicles")
+        self.vehicles = list(game.map.vehicles) + list(self.police)
+        self.index = {id(vehicle): i for i, vehicle in enumerate(self.vehicles)}
+
+    def ref(self, entity):
+        if entity is None:
+            return REF_NONE
+        if entity is self.player:
+            return REF_PLAYER
+        return self.index.get(id(entity), REF_NONE)
+
+    def resolve(self, ref):
+        if ref == REF_PLAYER:
+            return self.player
+        if 0 <= ref < len(self.vehicles):
+            return self.vehicles[ref]
+        return None
+
+def rect_array(items):
+    """(N, 4) int32 array of the "rect" of each dict"""
+    return np.array([tuple(item["rect"]) for item in items], dtype=np.int32).reshape(-1, 4)
+
+def save_city(game_map):
+    lights = getattr(game_map, 'traffic_lights', [])
+    return {
+        "size": (game_map.width, game_map.height),
+        "walls": rect_array(game_map.walls),
+        "roads": rect_array(game_map.roads),
+        "road_horizontal": np.array([road.get("horizontal", False) for road in game_map.roads], dtype=np.uint8),
+        "curbs": rect_array(game_map.curbs),
+        "buildings": rect_array(game_map.buildings),
+        "building_heights": np.array([b.get("height", 1) for b in game_map.buildings], dtype=np.int32),
+        "building_colors": np.array([b.get("color", (0, 0, 0)) for b in game_map.buildings],
+                                    dtype=np.uint8).reshape(-1, 3),
+        "blocks": rect_array(game_map.blocks),
+        "block_types": [block.get("type") for block in game_map.blocks],
+        "block_subtypes": [block.get("subtype") for block in game_map.blocks],
+        "lights": np.array([light["position"] for light in lights], dtype=np.int32).reshape(-1, 2),
+        "light_green": np.array([light["horizontal_green"] for light in lights], dtype=np.uint8),
+        "light_timers": np.array([light["timer"] for light in lights], dtype=np.int32),
+        "time_of_day": game_map.time_of_day,
+        "time_speed": game_map.time_speed,
+    }
+
+def save_image(surface):
+    """The city image as palette indexes (it only uses a few dozen colours)"""
+    width, height = surface.get_size()
+    rgb = np.frombuffer(pygame.image.tobytes(surface, "RGB"), dtype=np.uint8).reshape(-1, 3)
+    packed = (rgb[:, 0].astype(np.uint32) << 16) | (rgb[:, 1].astype(np.uint32) << 8) | rgb[:, 2]
+
+    # Guess the palette from a sample, then add any colours the sample missed
+    colors = np.unique(packed[::97])
+    while True:
+        indexes = np.searchsorted(colors, packed)
+        indexes[indexes == len(colors)] = 0
+        missing = colors[indexes] != packed
+        if not missing.any() or len(colors) > 256:
+            break
+        colors = np.union1d(colors, np.unique(packed[missing]))
+
+    if len(colors) > 256:
+        # Too many colours for a palette (e.g. a photo fallback map): store RGB
+        return {"size": (width, height), "rgb": zlib.compress(rgb.tobytes(), 6)}
+
+    palette = np.stack([colors >> 16, (colors >> 8) & 0xFF, colors & 0xFF], axis=1).astype(np.uint8)
+    return {
+        "size": (width, height),
+        "palette": palette,
+        "pixels": zlib.compress(indexes.astype(np.uint8).tobytes(), 6),
+    }
+
+def save_vehicles(vehicles, game, refs):
+    """Vehicle columns (police get their AI columns too)"""
+    base = game.cheat_system.modifiers.base_value
+    columns = {
+        "motion": np.array([(v.x, v.y, v.speed, base(v, "max_speed"), v.acceleration,
+                             v.deceleration, v.rotation) for v in vehicles], dtype=np.float64).reshape(-1, 7),
+        "size": np.array([v.size for v in vehicles], dtype=np.float64).reshape(-1, 2),
+        "color": np.array([v.color for v in vehicles], dtype=np.uint8).reshape(-1, 3),
+        "stolen": np.array([v.stolen for v in vehicles], dtype=np.uint8),
+        "lane_entry": np.array([getattr(v, 'lane_entry', -np.inf) for v in vehicles], dtype=np.float64),
+    }
+    if vehicles and hasattr(vehicles[0], 'patrol_timer'):
+        columns.update({
+            "state": [v.state for v in vehicles],
+            "target": np.array([refs.ref(v.target) for v in vehicles], dtype=np.int32),
+            "timers": np.array([(v.patrol_timer, v.siren_timer, v.current_siren)
+                                for v in vehicles], dtype=np.int64).reshape(-1, 3),
+            "patrol_turn": np.array([v.patrol_turn for v in vehicles], dtype=np.float64),
+            "siren_active": np.array([v.siren_active for v in vehicles], dtype=np.uint8),
+        })
+    return columns
+
+def save_pedestrians(pedestrians, game, refs):
+    scheduler = game.scheduler
+    return {
+        "motion": np.array([(p.x, p.y, p.speed, p.animation_frame, p.animation_speed)
+                            for p in pedestrians], dtype=np.float64).reshape(-1, 5),
+        "stats": np.array([(p.size, p.ai_timer, p.health) for p in pedestrians],
+                          dtype=np.int64).reshape(-1, 3),
+        "flags": np.array([(p.moving, p.is_dead) for p in pedestrians], dtype=np.uint8).reshape(-1, 2),
+        "colors": np.array([[p.colors[key] for key in PED_COLOR_KEYS] for p in pedestrians],
+                           dtype=np.uint8).reshape(-1, len(PED_COLOR_KEYS), 3),
+        "direction": [p.direction for p in pedestrians],
+        "ai_state": [p.ai_state for p in pedestrians],
+        "type": [getattr(p, 'type', None) for p in pedestrians],
+        "flee": np.array([refs.ref(p.flee_target) for p in pedestrians], dtype=np.int32),
+        "target": np.array([refs.ref(getattr(p, 'target', None)) for p in pedestrians], dtype=np.int32),
+        # Ticks until the body is removed (-1: not scheduled)
+        "despawn": np.array([scheduler.remaining(p.despawn_timer) if p.despawn_timer is not None else -1
+                             for p in pedestrians], dtype=np.int64),
+    }
+
+def save_player(player, game, refs):
+    base = game.cheat_system.modifiers.base_value
+    state = {
+        "position": (player.x, player.y),
+        "direction": player.direction,
+        "moving": player.moving,
+        "animation_frame": player.animation_frame,
+        "vehicle": refs.ref(player.in_vehicle),
+        "vehicle_entry_cooldown": player.vehicle_entry_cooldown,
+        "has_weapon": player.has_weapon,
+        "shoot_cooldown": player.shoot_cooldown,
+        "bullets": player.bullets,
+        "wanted_level": player.wanted_level,
+        "wanted_cooldown": player.wanted_cooldown,
+        "base": {name: base(player, name) for name in PLAYER_MODIFIED},
+    }
+    if hasattr(player, 'money'):
+        state["money"] = player.money
+    return state
+
+def save_events(events):
+    scheduler = events.game.scheduler
+    return {
+        "cooldown_until": events.cooldown_until,
+        "current_region_id": events.current_region_id,
+        "region_entered_tick": events.region_entered_tick,
+        "active": [{
+            "template": events.event_templates.index(event["template"]),
+            "stage": event["current_stage"],
+            "position": (event["x"], event["y"]),
+            "region": event["region"]["id"],
+            "timer": scheduler.remaining(event["timer"]),
+        } for event in events.active_events],
+    }
+
+def save_cheats(cheats):
+    scheduler = cheats.game.scheduler
+    return {
+        "discovered": [cheat["effect"] for cheat in cheats.cheats if cheat.get("discovered")],
+        "active": {effect: scheduler.remaining(expiry) for effect, expiry in cheats.active_cheats.items()},
+        # A code typed half-way still completes after a restore
+        "sequence": cheats.input_sequence,
+        "match_state": cheats.match_state,
+        "sequence_expires": cheats.sequence_expires,
+    }
+
+def save_activities(manager):
+    states = []
+    for activity in manager.activities:
+        state = activity.save_state()
+        state["kind"] = type(activity).__name__
+        # Setup can't be saved half-way; it is run again on restore
+        state["setting_up"] = activity in manager.setting_up
+        states.append(state)
+    return states
+
+def save_game(game):
+    return {
+        "frame_count": game.frame_count,
+        "camera": (game.camera_x, game.camera_y),
+        "message": game.message,
+        "message_timer": game.message_timer,
+        "big_head_mode": game.big_head_mode,
+        "visual_effects": game.visual_effects,
+        "sound_effects": game.sound_effects,
+        "paused": game.paused,
+        "actions_held": game.input.held,  # So the next tick's pressed edges match
+    }
+
+# Restoring
+
+def restore_map(saved, game_map, entity_classes):
+    """Fill a new Map from a snapshot instead of generating the city
+
+    entity_classes maps "vehicle", "police" and "pedestrian" to the classes
+    to create. References between entities are resolved by restore_game().
+    """
+    city = saved.section(b"CITY")
+    game_map.width, game_map.height = city["size"]
+    game_map.walls = [{"rect": pygame.Rect(*rect)} for rect in city["walls"].tolist()]
+    game_map.roads = [{"rect": pygame.Rect(*rect), "horizontal": bool(horizontal)}
+                      for rect, horizontal in zip(city["roads"].tolist(), city["road_horizontal"].tolist())]
+    game_map.curbs = [{"rect": pygame.Rect(*rect)} for rect in city["curbs"].tolist()]
+    game_map.buildings = [{"rect": pygame.Rect(*rect), "height": height, "color": tuple(color)}
+                          for rect, height, color in zip(city["buildings"].tolist(),
+                                                         city["building_heights"].tolist(),
+                                                         city["building_colors"].tolist())]
+    game_map.blocks = [{"rect": pygame.Rect(*rect), "type": block_type, "subtype": subtype}
+                       for rect, block_type, subtype in zip(city["blocks"].tolist(), city["block_types"],
+                                                            city["block_subtypes"])]
+    game_map.traffic_lights = [{"position": tuple(position), "horizontal_green": bool(green), "timer": timer}
+                               for position, green, timer in zip(city["lights"].tolist(),
+                                                                 city["light_green"].tolist(),
+                                                                 city["light_timers"].tolist())]
+    game_map.time_of_day = city["time_of_day"]
+    game_map.time_speed = city["time_speed"]
+
+    game_map.map_image = restore_image(saved.section(b"IMAG"))
+
+    game_map.vehicles = restore_vehicles(saved.section(b"VEHI"), entity_classes["vehicle"])
+    game_map.police_vehicles = restore_vehicles(saved.section(b"POLI"), entity_classes["police"])
+    game_map.pedestrians = restore_pedestrians(saved.section(b"PEDS"), entity_classes["pedestrian"],
+                                               game_map)
+
+def restore_image(image):
+    width, height = image["size"]
+    if "rgb" in image:
+        return pygame.image.frombuffer(zlib.decompress(image["rgb"]), (width, height), "RGB").convert()
+    surface = pygame.image.frombuffer(zlib.decompress(image["pixels"]), (width, height), "P")
+    surface.set_palette([tuple(color) for color in image["palette"].tolist()])
+    return surface.convert()
+
+def restore_vehicles(columns, vehicle_class):
+    vehicles = []
+    for i, (x, y, speed, max_speed, acceleration, deceleration, rotation) in enumerate(columns["motion"].tolist()):
+        vehicle = vehicle_class(x, y)
+        vehicle.speed = speed
+        vehicle.max_speed = max_speed
+        vehicle.acceleration = acceleration
+        vehicle.deceleration = deceleration
+        vehicle.rotation = rotation
+        width, height = columns["size"][i].tolist()
+        vehicle.size = (int(width), int(height))
+        vehicle.rect = pygame.Rect(x - width / 2, y - height / 2, width, height)
+        vehicle.color = tuple(columns["color"][i].tolist())
+        vehicle.stolen = bool(columns["stolen"][i])
+        if "lane_entry" in columns:
+            vehicle.lane_entry = float(columns["lane_entry"][i])
+        if "state" in columns:
+            vehicle.state = columns["state"][i]
+            vehicle.patrol_timer, vehicle.siren_timer, vehicle.current_siren = columns["timers"][i].tolist()
+            vehicle.patrol_turn = float(columns["patrol_turn"][i])
+            vehicle.siren_active = bool(columns["siren_active"][i])
+        vehicles.append(vehicle)
+    return vehicles
+
+def restore_pedestrians(columns, pedestrian_class, game_map):
+    pedestrians = []
+    colors = columns["colors"].tolist()
+    for i, (x, y, speed, animation_frame, animation_speed) in enumerate(columns["motion"].tolist()):
+        ped = pedestrian_class(x, y)
+        ped.speed = speed
+        ped.animation_frame = animation_frame
+        ped.animation_speed = animation_speed
+        ped.size, ped.ai_timer, ped.health = columns["stats"][i].tolist()
+        ped.rect = pygame.Rect(x - ped.size / 2, y - ped.size / 2, ped.size, ped.size)
+        ped.moving, ped.is_dead = (bool(flag) for flag in columns["flags"][i])
+        ped.colors = {key: tuple(color) for key, color in zip(PED_COLOR_KEYS, colors[i])}
+        ped.direction = columns["direction"][i]
+        ped.ai_state = columns["ai_state"][i]
+        if columns["type"][i] is not None:
+            ped.type = columns["type"][i]
+        despawn = int(columns["despawn"][i])
+        if despawn >= 0:
+            scheduler = game_map.scheduler
+            ped.despawn_timer = scheduler.schedule_at(scheduler.tick + despawn, game_map.despawn_pedestrian, ped)
+        pedestrians.append(ped)
+    return pedestrians
+
+def restore_game(saved, game):
+    """Restore everything outside the map once the game's systems exist
+
+    The Map must have been built from the same snapshot, and game.scheduler
+    set to saved.tick before any timers were scheduled.
+    """
+    refs = EntityRefs(game)
+    game_map = game.map
+
+    # Targets between entities
+    police = saved.section(b"POLI")
+    for vehicle, target in zip(game_map.police_vehicles, police.get("target", np.zeros(0)).tolist()):
+        vehicle.target = refs.resolve(target)
+    peds = saved.section(b"PEDS")
+    for ped, flee, target in zip(game_map.pedestrians, peds["flee"].tolist(), peds["target"].tolist()):
+        ped.flee_target = refs.resolve(flee)
+        if target != REF_NONE:
+            ped.target = refs.resolve(target)
+
+    restore_player(saved.section(b"PLAY"), game.player, refs)
+    restore_events(saved.section(b"EVNT"), game.event_system)
+    restore_activities(saved.section(b"ACTV"), game.activity_manager)
+
+    state = saved.section(b"GAME")
+    game.frame_count = state["frame_count"]
+    game.camera_x, game.camera_y = state["camera"]
+    game.message = state["message"]
+    game.message_timer = state["message_timer"]
+    game.big_head_mode = state["big_head_mode"]
+    game.visual_effects = state["visual_effects"]
+    game.sound_effects = state["sound_effects"]
+    game.paused = state["paused"]
+    game.input.held = state["actions_held"]
+
+    # Cheats last: their modifiers go on top of the restored base values
+    restore_cheats(saved.section(b"CHET"), game.cheat_system)
+
+    game.update_view_rect()
+    game.index_entities()
+
+    # Continue the random sequences exactly where the saved game left them
+    rng = saved.section(b"RAND")
+    random.setstate(rng["world"])
+    game.event_system.region_rng.setstate(rng["regions"])
+
+def restore_player(state, player, refs):
+    player.x, player.y = state["position"]
+    player.rect = pygame.Rect(player.x - player.size / 2, player.y - player.size / 2, player.size, player.size)
+    player.direction = state["direction"]
+    player.moving = state["moving"]
+    player.animation_frame = state["animation_frame"]
+    player.in_vehicle = refs.resolve(state["vehicle"])
+    player.vehicle_entry_cooldown = state["vehicle_entry_cooldown"]
+    player.has_weapon = state["has_weapon"]
+    player.shoot_cooldown = state["shoot_cooldown"]
+    player.bullets = state["bullets"]
+    player.wanted_level = state["wanted_level"]
+    player.wanted_cooldown = state["wanted_cooldown"]
+    for name, value in state["base"].items():
+        setattr(player, name, value)
+    if "money" in state:
+        player.money = state["money"]
+
+def restore_events(state, events):
+    scheduler = events.game.scheduler
+    events.cooldown_until = state["cooldown_until"]
+    events.current_region_id = state["current_region_id"]
+    events.region_entered_tick = state["region_entered_tick"]
+    events.active_events = []
+    for saved_event in state["active"]:
+        event = {
+            "template": events.event_templates[saved_event["template"]],
+            "current_stage": saved_event["stage"],
+            "x": saved_event["position"][0],
+            "y": saved_event["position"][1],
+            "region": events.event_regions[saved_event["region"]],
+        }
+        event["timer"] = scheduler.schedule_at(scheduler.tick + saved_event["timer"], events.advance_event, event)
+        events.active_events.append(event)
+
+def restore_activities(states, manager):
+    for activity, state in zip(manager.activities, states):
+        if state["kind"] != type(activity).__name__:
+            raise ValueError(f"Snapshot activity {state['kind']} doesn't match {type(activity).__name__}")
+        activity.load_state(state)
+        if state["setting_up"]:
+            manager.queue_setup(activity)
+
+def restore_cheats(state, cheats):
+    discovered = set(state["discovered"])
+    for cheat in cheats.cheats:
+        if cheat["effect"] in discovered:
+            cheat["discovered"] = True
+    for effect, remaining in state["active"].items():
+        cheats.resume_cheat(effect, remaining)
+    cheats.input_sequence = state["sequence"]
+    cheats.match_state = state["match_state"]
+    cheats.sequence_expires = state["sequence_expires"]
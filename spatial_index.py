@@ -0,0 +1,368 @@
+"""
+Spatial indexing for GTA-style South Park Canadian game
+This module implements a uniform-grid spatial hash so systems can fetch only
+the objects near a point or inside a rectangle (such as the camera view)
+instead of testing every object in the city, plus point-in-region lookups
+for regular grids and for non-uniform rectangles, and a k-d tree for
+distance-band queries over fixed sample points.
+"""
+import math
+import random
+from bisect import bisect_right
+
+class SpatialHash:
+    """Uniform grid of buckets supporting rectangle and radius queries"""
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self.buckets = {}  # (cell_x, cell_y) -> {key: obj}
+        self.entries = {}  # key -> [obj, kind, x, y, w, h, cell_range]
+        self.groups = {}  # group -> objects as of the last track() call
+
+    def cell_range(self, x, y, w, h):
+        """Return the (x0, y0, x1, y1) range of cells covered by a box"""
+        size = self.cell_size
+        return (int(x // size), int(y // size),
+                int((x + w) // size), int((y + h) // size))
+
+    def insert(self, obj, x, y, w=0, h=0, kind=None):
+        """Add an object with a bounding box (w=h=0 for a point)"""
+        key = id(obj)
+        if key in self.entries:
+            self.update(obj, x, y, w, h)
+            return
+
+        cells = self.cell_range(x, y, w, h)
+        self.entries[key] = [obj, kind, x, y, w, h, cells]
+        self._add_to_cells(key, obj, cells)
+
+    def update(self, obj, x, y, w=0, h=0):
+        """Move an object, only touching buckets when it changes cells"""
+        entry = self.entries.get(id(obj))
+        if entry is None:
+            self.insert(obj, x, y, w, h)
+            return
+
+        entry[2] = x
+        entry[3] = y
+        entry[4] = w
+        entry[5] = h
+
+        cells = self.cell_range(x, y, w, h)
+        if cells != entry[6]:
+            self._remove_from_cells(id(obj), entry[6])
+            self._add_to_cells(id(obj), obj, cells)
+            entry[6] = cells
+
+    def track(self, group, objects, kind, position):
+        """Keep a group of objects (a list that grows on spawn and shrinks on despawn) indexed by position
+
+        Objects are only inserted or removed when the group's membership changes,
+        and only re-bucketed when they move into another cell.
+        """
+        known = self.groups.get(group, ())
+        if len(known) != len(objects) or any(old is not obj for old, obj in zip(known, objects)):
+            # Spawns and despawns since the last call (holding known keeps old ids from being reused)
+            current = {id(obj) for obj in objects}
+            for obj in known:
+                if id(obj) not in current:
+                    self.remove(obj)
+            self.groups[group] = list(objects)
+
+        entries = self.entries
+        for obj in objects:
+            x, y = position(obj)
+            if id(obj) in entries:
+                self.update(obj, x, y)
+            else:
+                self.insert(obj, x, y, kind=kind)
+
+    def remove(self, obj):
+        """Remove an object from the index"""
+        entry = self.entries.pop(id(obj), None)
+        if entry is not None:
+            self._remove_from_cells(id(obj), entry[6])
+
+    def clear(self):
+        """Remove everything"""
+        self.buckets = {}
+        self.entries = {}
+        self.groups = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, obj):
+        return id(obj) in self.entries
+
+    def _add_to_cells(self, key, obj, cells):
+        x0, y0, x1, y1 = cells
+        buckets = self.buckets
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                bucket = buckets.get((cell_x, cell_y))
+                if bucket is None:
+                    bucket = buckets[(cell_x, cell_y)] = {}
+                bucket[key] = obj
+
+    def _remove_from_cells(self, key, cells):
+        x0, y0, x1, y1 = cells
+        buckets = self.buckets
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                bucket = buckets.get((cell_x, cell_y))
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del buckets[(cell_x, cell_y)]
+
+    def query_rect(self, rect, kind=None):
+        """Return objects whose box intersects a rect (x, y, w, h), optionally of one kind"""
+        rx, ry, rw, rh = rect
+        x0, y0, x1, y1 = self.cell_range(rx, ry, rw, rh)
+        buckets = self.buckets
+        entries = self.entries
+        seen = set()
+        results = []
+
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                bucket = buckets.get((cell_x, cell_y))
+                if not bucket:
+                    continue
+                for key in bucket:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    obj, obj_kind, x, y, w, h, _ = entries[key]
+                    if kind is not None and obj_kind != kind:
+                        continue
+                    # Exact overlap test (edges count for zero-size points)
+                    if x + w >= rx and x <= rx + rw and y + h >= ry and y <= ry + rh:
+                        results.append(obj)
+        return results
+
+    def query_radius(self, center_x, center_y, radius, kind=None):
+        """Return objects whose position lies within a radius of a point"""
+        candidates = self.query_rect(
+            (center_x - radius, center_y - radius, radius * 2, radius * 2), kind)
+        radius_sq = radius * radius
+        results = []
+        for obj in candidates:
+            entry = self.entries[id(obj)]
+            # Distance from the center of the object's box
+            dx = entry[2] + entry[4] / 2 - center_x
+            dy = entry[3] + entry[5] / 2 - center_y
+            if dx * dx + dy * dy <= radius_sq:
+                results.append(obj)
+        return results
+
+    def nearest(self, center_x, center_y, max_radius, kind=None):
+        """Return the closest object within max_radius, or None"""
+        best = None
+        best_dist = math.inf
+        for obj in self.query_radius(center_x, center_y, max_radius, kind):
+            entry = self.entries[id(obj)]
+            dist = math.hypot(entry[2] + entry[4] / 2 - center_x,
+                              entry[3] + entry[5] / 2 - center_y)
+            if dist < best_dist:
+                best = obj
+                best_dist = dist
+        return best
+
+class GridLookup:
+    """O(1) point lookup over a regular grid of cells by arithmetic"""
+    def __init__(self, origin_x, origin_y, cell_width, cell_height, columns, rows):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.columns = columns
+        self.rows = rows
+        self.cells = [None] * (columns * rows)  # Row-major values
+
+    def cell_at(self, x, y):
+        """Return the (column, row) containing a point, or None outside the grid"""
+        column = int((x - self.origin_x) // self.cell_width)
+        row = int((y - self.origin_y) // self.cell_height)
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return column, row
+        return None
+
+    def set(self, column, row, value):
+        self.cells[row * self.columns + column] = value
+
+    def get(self, x, y):
+        """Return the value of the cell containing a point, or None"""
+        cell = self.cell_at(x, y)
+        if cell is None:
+            return None
+        return self.cells[cell[1] * self.columns + cell[0]]
+
+class IntervalIndex:
+    """O(log n) point lookup over non-overlapping rectangles of any size
+
+    The x axis is cut into slabs at every rectangle edge; each slab keeps the
+    rectangles spanning it sorted by y, so a lookup is two binary searches.
+    """
+    def __init__(self, items=()):
+        self.slab_xs = []     # Sorted x edges; slab i spans slab_xs[i]..slab_xs[i+1]
+        self.slab_starts = [] # slab -> sorted y starts
+        self.slab_spans = []  # slab -> [(y_end, value), ...] matching slab_starts
+        self.count = 0
+        self.build(items)
+
+    def build(self, items):
+        """Index items given as [(x, y, w, h, value), ...]; edges are half-open"""
+        items = list(items)
+        self.count = len(items)
+        self.slab_xs = sorted({x for x, _, _, _, _ in items} |
+                              {x + w for x, _, w, _, _ in items})
+        self.slab_starts = []
+        self.slab_spans = []
+
+        for left, right in zip(self.slab_xs, self.slab_xs[1:]):
+            spans = sorted(((y, y + h, value) for x, y, w, h, value in items
+                            if x <= left and x + w >= right), key=lambda span: span[0])
+            self.slab_starts.append([y_start for y_start, _, _ in spans])
+            self.slab_spans.append([(y_end, value) for _, y_end, value in spans])
+
+    def __len__(self):
+        return self.count
+
+    def get(self, x, y):
+        """Return the value of the rectangle containing a point, or None"""
+        slab = bisect_right(self.slab_xs, x) - 1
+        if slab < 0 or slab >= len(self.slab_starts):
+            return None
+
+        index = bisect_right(self.slab_starts[slab], y) - 1
+        if index < 0:
+            return None
+        y_end, value = self.slab_spans[slab][index]
+        return value if y < y_end else None
+
+class KDTree:
+    """Static 2-d tree over points for "everything between two radii" queries
+
+    Nodes live in flat lists; children of a node are found by index, and a
+    subtree is skipped as soon as its splitting line is farther away than
+    the outer radius. Nodes are stored in preorder, so every subtree is a
+    run of consecutive nodes; with each subtree's size and bounding box that
+    lets choose_band() pick from a band without listing it.
+    """
+    def __init__(self, points=()):
+        self.xs = []      # node -> x
+        self.ys = []      # node -> y
+        self.values = []  # node -> value
+        self.axes = []    # node -> 0 (split on x) or 1 (split on y)
+        self.left = []    # node -> child index or -1
+        self.right = []
+        self.sizes = []   # node -> points in its subtree
+        self.boxes = []   # node -> (min x, min y, max x, max y) of its subtree
+        self.root = -1
+        self.build(points)
+
+    def build(self, points):
+        """Index points given as [(x, y, value), ...]"""
+        points = list(points)
+        self.xs, self.ys, self.values, self.axes, self.left, self.right = [], [], [], [], [], []
+        self.sizes, self.boxes = [], []
+        self.root = self._build(points, 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return -1
+        axis = depth % 2
+        points.sort(key=lambda point: point[axis])
+        middle = len(points) // 2
+        x, y, value = points[middle]
+
+        node = len(self.xs)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.values.append(value)
+        self.axes.append(axis)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.sizes.append(len(points))
+        ys = [point[1] for point in points]
+        if axis == 0:
+            self.boxes.append((points[0][0], min(ys), points[-1][0], max(ys)))
+        else:
+            xs = [point[0] for point in points]
+            self.boxes.append((min(xs), points[0][1], max(xs), points[-1][1]))
+        self.left[node] = self._build(points[:middle], depth + 1)
+        self.right[node] = self._build(points[middle + 1:], depth + 1)
+        return node
+
+    def __len__(self):
+        return len(self.xs)
+
+    def query_band(self, center_x, center_y, min_radius, max_radius):
+        """Return values of points farther than min_radius and closer than max_radius"""
+        min_sq = min_radius * min_radius
+        max_sq = max_radius * max_radius
+        xs, ys, axes = self.xs, self.ys, self.axes
+        results = []
+        stack = [self.root] if self.root >= 0 else []
+        while stack:
+            node = stack.pop()
+            dx = xs[node] - center_x
+            dy = ys[node] - center_y
+            distance_sq = dx * dx + dy * dy
+            if min_sq < distance_sq < max_sq:
+                results.append(self.values[node])
+
+            # Signed distance from the query point to this node's splitting line
+            offset = dx if axes[node] == 0 else dy
+            near, far = (self.left[node], self.right[node]) if offset > 0 else (self.right[node], self.left[node])
+            if near >= 0:
+                stack.append(near)
+            if far >= 0 and offset * offset < max_sq:
+                stack.append(far)
+        return results
+
+    def choose_band(self, center_x, center_y, min_radius, max_radius):
+        """Return the value of a uniformly random point from query_band(), or None if it is empty"""
+        min_sq = min_radius * min_radius
+        max_sq = max_radius * max_radius
+        xs, ys, boxes, sizes = self.xs, self.ys, self.boxes, self.sizes
+        runs = []  # (first node, count) of nodes in the band
+        total = 0
+        stack = [self.root] if self.root >= 0 else []
+        while stack:
+            node = stack.pop()
+
+            # Nearest and farthest squared distances from the centre to the subtree's box
+            x0, y0, x1, y1 = boxes[node]
+            near_x = max(x0 - center_x, 0, center_x - x1)
+            near_y = max(y0 - center_y, 0, center_y - y1)
+            far_x = max(center_x - x0, x1 - center_x)
+            far_y = max(center_y - y0, y1 - center_y)
+            nearest = near_x * near_x + near_y * near_y
+            farthest = far_x * far_x + far_y * far_y
+            if nearest >= max_sq or farthest <= min_sq:
+                continue  # Entirely outside the band
+            if min_sq < nearest and farthest < max_sq:
+                # Entirely inside: counted by size, never visited
+                runs.append((node, sizes[node]))
+                total += sizes[node]
+                continue
+
+            dx = xs[node] - center_x
+            dy = ys[node] - center_y
+            if min_sq < dx * dx + dy * dy < max_sq:
+                runs.append((node, 1))
+                total += 1
+            if self.left[node] >= 0:
+                stack.append(self.left[node])
+            if self.right[node] >= 0:
+                stack.append(self.right[node])
+
+        if not total:
+            return None
+        pick = random.randrange(total)
+        for node, count in runs:
+            if pick < count:
+                return self.values[node + pick]
+            pick -= count
@@ -0,0 +1,435 @@
+"""
+Civilian traffic for GTA-style South Park Canadian game
+This module drives the civilian cars along lanes instead of letting them
+roam until they pin themselves against a building. Every road gets one lane
+per direction, on the right-hand half, and a lane is a 1D line: a car on it
+is a position along the lane, and the car ahead is its neighbour once the
+lane's cars are sorted by position. Speeds follow the Intelligent Driver
+Model (keep a time gap to whatever is ahead, brake smoothly for red lights)
+and cars choose to go straight or turn at each intersection. Where a wall
+(a lake) crosses a road, its lanes are cut there and each piece ends at
+the wall's edge, so traffic turns off before it instead of driving across.
+
+Each tick the cars are sorted by lane and position, starting from the
+last tick's order, so a lane's cars and the queue at each red light are
+contiguous runs. One pass from the front of every lane to the back then
+holds each car behind where its leader has just moved to. A car stopped at
+a light brakes its whole queue in the same tick, and no two cars on a lane
+ever overlap.
+
+A car's lane is worked out from its heading and position each tick, so
+besides the vehicle's usual fields the only state is where it joined its
+lane. The fleet is stepped in one NumPy pass with no wall collisions at all.
+Cars that aren't on a lane (one the player left on the pavement, one an
+event dropped somewhere) stay parked.
+"""
+import random
+
+import numpy as np
+import pygame
+
+# Intelligent Driver Model, in pixels and ticks (desired speed, acceleration
+# and comfortable braking come from each vehicle's max_speed/acceleration/deceleration)
+MIN_GAP = 10.0  # Bumper-to-bumper distance when queued
+HEADWAY = 12.0  # Ticks of time gap kept to the car ahead
+EXPONENT = 4  # How sharply acceleration falls off near the desired speed
+
+# Turn choice at an intersection, among the ways that lead on to another intersection
+STRAIGHT_WEIGHT = 2.0
+TURN_WEIGHT = 1.0
+
+NO_LANE = -1
+CLEARANCE = 10  # Walls closer than this to a lane's centre line (half a car's width) cut the lane
+REACH = 40.0  # Room a car needs past a turn point before its lane ends (half a car, the queueing gap and some)
+LANE_SPAN = 1e6  # Wider than any lane's range of progress, to sort and scan lanes as one array
+DIRECTIONS = (0, 90, 180, 270)
+
+class LaneNetwork:
+    """Lanes of every road, the intersections along them and where each turn leads"""
+    def __init__(self, roads, traffic_lights, walls=()):
+        # Lanes as (rotation, lateral coordinate, sign, horizontal, road index, start, end); sign
+        # is +1 where the lane runs towards larger x/y, "progress" is sign * coordinate, and a
+        # lane covers progress start to end (the whole road, or the stretch between walls)
+        lanes = []
+        road_lanes = []  # road index -> {rotation: [lanes in order of progress]}
+        laterals = []  # road index -> {rotation: lateral coordinate}
+        for index, road in enumerate(roads):
+            rect = road["rect"]
+            horizontal = rect.width > rect.height
+            offset = (rect.height if horizontal else rect.width) // 4  # Middle of each half of the road
+            if horizontal:
+                # y grows downwards: eastbound keeps to the lower half, westbound to the upper
+                pairs = ((0, rect.centery + offset, 1), (180, rect.centery - offset, -1))
+            else:
+                pairs = ((90, rect.centerx - offset, 1), (270, rect.centerx + offset, -1))
+            road_lanes.append({})
+            laterals.append({rotation: lateral for rotation, lateral, _ in pairs})
+            for rotation, lateral, sign in pairs:
+                road_lanes[index][rotation] = []
+                low, high = (rect.left, rect.right) if horizontal else (rect.top, rect.bottom)
+                pieces = open_stretches(walls, horizontal, lateral, low, high)
+                for first, last in (pieces if sign > 0 else pieces[::-1]):
+                    road_lanes[index][rotation].append(len(lanes))
+                    start, end = (first, last) if sign > 0 else (-last, -first)
+                    lanes.append((rotation, lateral, sign, horizontal, index, start, end))
+        self.road_lanes = road_lanes
+
+        self.count = len(lanes)
+        self.rotation = np.array([lane[0] for lane in lanes], dtype=np.float64)
+        self.lateral = np.array([lane[1] for lane in lanes], dtype=np.float64)
+        self.sign = np.array([lane[2] for lane in lanes], dtype=np.float64)
+        self.horizontal = np.array([lane[3] for lane in lanes], dtype=bool)
+        self.start = np.array([lane[5] for lane in lanes], dtype=np.float64)
+        self.end = np.array([lane[6] for lane in lanes], dtype=np.float64)  # Where it runs off its road or into a wall
+
+        # Lanes sorted by line (heading and lateral coordinate), then by where they start along it
+        keys = lane_key(self.rotation, self.lateral)
+        self.lines = np.unique(keys)
+        self.key_order = np.lexsort((self.start, keys))
+        self.sorted_starts = (np.searchsorted(self.lines, keys) * LANE_SPAN + self.start)[self.key_order]
+
+        # Intersections along each lane, in the order a car meets them:
+        # (centre, stop line, right turn point, left turn point, light, right lane, left lane)
+        lights = {tuple(light['position']): i for i, light in enumerate(traffic_lights)}
+        crossings = []
+        for rotation, lateral, sign, horizontal, road, start, end in lanes:
+            rect = roads[road]["rect"]
+            found = []
+            for other, other_road in enumerate(roads):
+                other_rect = other_road["rect"]
+                if (other_rect.width > other_rect.height) == horizontal or not rect.colliderect(other_rect):
+                    continue
+                if horizontal:
+                    center, position, half = other_rect.centerx, (other_rect.centerx, rect.centery), other_rect.width / 2
+                else:
+                    center, position, half = other_rect.centery, (rect.centerx, other_rect.centery), other_rect.height / 2
+                if sign * center - half < start or sign * center + half > end:
+                    continue  # A wall cuts through this lane's part of the intersection
+                # Turns happen where this lane crosses the other road's lanes, onto whichever piece
+                # of them is there (none if a wall cuts them at the crossing, or comes too soon after
+                # the turn point for a car to get there)
+                right_point = sign * laterals[other][(rotation + 90) % 360]
+                left_point = sign * laterals[other][(rotation + 270) % 360]
+                right = self.on_piece(road_lanes[other][(rotation + 90) % 360], lateral) \
+                    if right_point <= end - REACH else NO_LANE
+                left = self.on_piece(road_lanes[other][(rotation + 270) % 360], lateral) \
+                    if left_point <= end - REACH else NO_LANE
+                found.append((sign * center, sign * center - half, right_point, left_point,
+                              lights.get(position, NO_LANE), right, left))
+            found.sort()
+            crossings.append(found)
+
+        depth = max([len(found) for found in crossings] + [1])
+        self.stop_line = np.full((self.count, depth), np.inf)
+        self.right_point = np.full((self.count, depth), np.inf)
+        self.left_point = np.full((self.count, depth), np.inf)
+        self.light = np.full((self.count, depth), NO_LANE, dtype=np.int64)
+        self.right = np.full((self.count, depth), NO_LANE, dtype=np.int64)
+        self.left = np.full((self.count, depth), NO_LANE, dtype=np.int64)
+        for lane, found in enumerate(crossings):
+            for k, (_, stop_line, right_point, left_point, light, right, left) in enumerate(found):
+                self.stop_line[lane, k] = stop_line
+                self.right_point[lane, k] = right_point
+                self.left_point[lane, k] = left_point
+                self.light[lane, k] = light
+                self.right[lane, k] = right
+                self.left[lane, k] = left
+
+        # A turn is only offered if the new lane has a way off it further on (a car can turn at an
+        # intersection whose right turn point is past where it joined the lane), so no car ends up
+        # stuck at the end of a road; dropping one turn can strand another, so repeat until none change
+        while True:
+            self.exit = self.exits()
+            dropped = False
+            for side in (self.right, self.left):
+                for lane, k in zip(*np.nonzero(side >= 0)):
+                    target = side[lane, k]
+                    if self.exit[target] <= self.entry(lane, target):
+                        side[lane, k] = NO_LANE
+                        dropped = True
+            if not dropped:
+                break
+        self.straight = self.exit[:, None] > self.right_point  # A way off further along this lane
+
+    def exits(self):
+        """Right turn point of each lane's last intersection with a turn (-inf for a lane without one)"""
+        turns = (self.right >= 0) | (self.left >= 0)
+        return np.where(turns, self.right_point, -np.inf).max(axis=1)
+
+    def entry(self, lane, target):
+        """Progress on target where a car turning off lane joins it"""
+        return self.sign[target] * self.lateral[lane]
+
+    def lookup(self, rotation, x, y):
+        """Lane of each car from its heading and position (NO_LANE if it isn't on one)"""
+        if self.count == 0:
+            return np.full(len(x), NO_LANE, dtype=np.int64)
+        horizontal = (rotation == 0) | (rotation == 180)
+        keys = lane_key(rotation, np.where(horizontal, y, x))
+        line = np.minimum(np.searchsorted(self.lines, keys), len(self.lines) - 1)
+        progress = np.where((rotation == 0) | (rotation == 90), 1.0, -1.0) * np.where(horizontal, x, y)
+        slot = np.searchsorted(self.sorted_starts, line * LANE_SPAN + progress, side="right") - 1
+        lane = self.key_order[np.maximum(slot, 0)]
+        found = (slot >= 0) & (lane_key(self.rotation[lane], self.lateral[lane]) == keys) & (progress <= self.end[lane])
+        return np.where(found, lane, NO_LANE)
+
+    def place(self, vehicle, roads):
+        """Put a car on the lane of the road it stands on, facing its way; returns False if there is none"""
+        rotation = vehicle.rotation % 360
+        if rotation not in DIRECTIONS:
+            return False
+        horizontal = rotation in (0, 180)
+        for index, road in enumerate(roads):
+            rect = road["rect"]
+            if (rect.width > rect.height) != horizontal or not rect.collidepoint(vehicle.x, vehicle.y):
+                continue
+            along = vehicle.x if horizontal else vehicle.y
+            lane = self.on_piece(self.road_lanes[index][rotation], along)
+            if lane == NO_LANE or self.exit[lane] <= self.sign[lane] * along:
+                # In a wall, or past the last turn off this lane: face the other way so it has somewhere to go
+                rotation = (rotation + 180) % 360
+                lane = self.on_piece(self.road_lanes[index][rotation], along)
+                if lane == NO_LANE or self.exit[lane] <= self.sign[lane] * along:
+                    return False
+            progress = self.sign[lane] * along
+            vehicle.rotation = rotation
+            if horizontal:
+                vehicle.y = float(self.lateral[lane])
+            else:
+                vehicle.x = float(self.lateral[lane])
+            vehicle.lane_entry = float(progress)
+            place_rect(vehicle)
+            return True
+        return False
+
+    def on_piece(self, pieces, coordinate):
+        """The lane among one line's pieces that covers this coordinate (NO_LANE if none does)"""
+        for lane in pieces:
+            if self.start[lane] <= self.sign[lane] * coordinate <= self.end[lane]:
+                return lane
+        return NO_LANE
+
+def open_stretches(walls, horizontal, lateral, low, high):
+    """[(first, last), ...] coordinates from low to high along a lane line that no wall comes within CLEARANCE of"""
+    blocked = []
+    for wall in walls:
+        rect = wall["rect"]
+        near, far, first, last = (rect.top, rect.bottom, rect.left, rect.right) if horizontal else \
+            (rect.left, rect.right, rect.top, rect.bottom)
+        if near - CLEARANCE < lateral < far + CLEARANCE and first < high and last > low:
+            blocked.append((first, last))
+    stretches = []
+    for first, last in sorted(blocked):
+        if first > low:
+            stretches.append((low, first))
+        low = max(low, last)
+    if low < high:
+        stretches.append((low, high))
+    return stretches
+
+def lane_key(rotation, lateral):
+    """One number per (heading, lateral coordinate) pair, for sorting and searching lanes"""
+    return np.asarray(rotation, dtype=np.float64) * 1e6 + lateral
+
+def dimensions(vehicle):
+    """(length, width) of a vehicle (some special vehicles have a single number for their size)"""
+    size = vehicle.size
+    return size if isinstance(size, tuple) else (size, size)
+
+def place_rect(vehicle):
+    length, width = dimensions(vehicle)
+    vehicle.rect = pygame.Rect(vehicle.x - length/2, vehicle.y - width/2, length, width)
+
+def first_ahead(points, progress):
+    """Index of the first point past each car's progress (rows padded with inf), and whether there is one"""
+    ahead = points > progress[:, None]
+    return ahead.argmax(axis=1), ahead.any(axis=1)
+
+class VehicleBatch:
+    """Steps every civilian car along its lane, all together once per tick"""
+    def __init__(self):
+        self.network = None
+        self.network_for = (None, None, None)  # The roads, walls and light positions it was built from
+
+        # Filled by drive(), one entry per car it stepped (lane is NO_LANE for a parked car)
+        self.lane = np.zeros(0, dtype=np.int64)
+        self.progress = np.zeros(0)
+        self.speed = np.zeros(0)
+
+        # Last tick's cars and their order along the lanes, which the next sort starts from
+        self.queue = []
+        self.order = np.zeros(0, dtype=np.int64)
+
+    def lanes(self, roads, traffic_lights, walls=()):
+        """The lane network for these roads, lights and walls, built on first use"""
+        lights = [tuple(light['position']) for light in traffic_lights]
+        if self.network_for[0] is not roads or self.network_for[1] is not walls or self.network_for[2] != lights:
+            self.network = LaneNetwork(roads, traffic_lights, walls)
+            self.network_for = (roads, walls, lights)
+        return self.network
+
+    def place(self, vehicle, roads, traffic_lights, walls=()):
+        """Snap a newly spawned car onto its road's lane"""
+        return self.lanes(roads, traffic_lights, walls).place(vehicle, roads)
+
+    def queue_order(self, cars, keys):
+        """Cars sorted by lane, then from the back of the lane to the front (by lane * LANE_SPAN + progress)"""
+        # Cars only pass each other by turning, so last tick's order is nearly sorted already and
+        # the stable sort (a merge sort that picks up runs already in order) takes about linear time
+        if len(cars) == len(self.queue) and all(car is queued for car, queued in zip(cars, self.queue)):
+            start = self.order
+        else:
+            start = np.arange(len(cars))
+        self.queue = cars
+        self.order = start[np.argsort(keys[start], kind="stable")]
+        return self.order
+
+    @staticmethod
+    def close_up(moved, progress, lane, length, order):
+        """Hold each car back behind its leader's new position, front of each lane to the back in one pass"""
+        # Car j may reach at most min over the cars i ahead of it of moved[i] minus the car lengths
+        # between them; with those lengths summed from the front of the lane that's a running minimum
+        walk = order[::-1]
+        spacing = np.zeros(len(walk))
+        spacing[1:] = (length[walk[:-1]] + length[walk[1:]]) / 2
+        head = np.ones(len(walk), dtype=bool)
+        head[1:] = lane[walk[1:]] != lane[walk[:-1]]
+        spacing[head] = 0.0
+        offset = np.cumsum(spacing)
+        offset -= np.maximum.accumulate(np.where(head, offset, 0.0))  # From the front of each lane
+        shift = lane[walk] * LANE_SPAN  # Lanes come in descending order, so no bound leaks into the next
+        bound = np.minimum.accumulate(moved[walk] + offset + shift) - offset - shift
+        held = (bound < moved[walk] - 1e-9) & (lane[walk] != NO_LANE)
+        moved[walk[held]] = np.maximum(bound[held], progress[walk[held]])  # Cars don't back up
+
+    @staticmethod
+    def merge_clear(target, joined, length, lane_order, order, moved, lengths, turns):
+        """Whether a car of this length can turn into target at progress joined without touching anyone"""
+        start, stop = np.searchsorted(lane_order, [target, target + 1])
+        ahead = start + np.searchsorted(moved[order[start:stop]], joined)
+        neighbours = [(moved[car], lengths[car]) for car in order[max(ahead - 1, start):min(ahead + 1, stop)]]
+        neighbours += [(progress, lengths[car]) for car, (lane, progress) in turns.items() if lane == target]
+        return all(abs(progress - joined) > (other + length) / 2 for progress, other in neighbours)
+
+    def drive(self, vehicles, traffic_lights, roads, walls=(), driven=None):
+        """One tick for every civilian car except driven (the player's car, left to the player)"""
+        cars = [vehicle for vehicle in vehicles if vehicle is not driven]
+        if not cars:
+            return
+        network = self.lanes(roads, traffic_lights, walls)
+
+        state = np.array([(vehicle.x, vehicle.y, vehicle.speed, vehicle.rotation, vehicle.max_speed,
+                           vehicle.acceleration, vehicle.deceleration, dimensions(vehicle)[0], vehicle.lane_entry)
+                          for vehicle in cars], dtype=np.float64).reshape(-1, 9)
+        x, y, speed, rotation, max_speed, acceleration, deceleration, length, entry = state.T
+        lane = network.lookup(rotation, x, y)
+        on_lane = lane >= 0
+        lane = np.where(on_lane, lane, 0)
+        sign = network.sign[lane]
+        progress = sign * np.where(network.horizontal[lane], x, y)
+        front = progress + length / 2
+
+        # Gap to the car ahead on the same lane
+        gap = np.full(len(cars), np.inf)
+        lead_speed = np.zeros(len(cars))
+        queued = np.where(on_lane, lane, NO_LANE)
+        order = self.queue_order(cars, queued * LANE_SPAN + progress)
+        follower, leader = order[:-1], order[1:]
+        same = (lane[follower] == lane[leader]) & on_lane[follower] & on_lane[leader]
+        follower, leader = follower[same], leader[same]
+        gap[follower] = progress[leader] - length[leader] / 2 - front[follower]
+        lead_speed[follower] = speed[leader]
+
+        # A red light at the next stop line counts as a stopped car there
+        stop_index, has_stop = first_ahead(network.stop_line[lane], front - 1e-9)
+        light = network.light[lane, stop_index]
+        if traffic_lights:
+            horizontal_green = np.array([bool(signal['horizontal_green']) for signal in traffic_lights])
+            red = has_stop & (light >= 0) & (network.horizontal[lane] != horizontal_green[np.maximum(light, 0)])
+        else:
+            red = np.zeros(len(cars), dtype=bool)
+        to_light = network.stop_line[lane, stop_index] - front
+        closer = red & (to_light < gap)
+        gap[closer] = to_light[closer]
+        lead_speed[closer] = 0.0
+        stop = np.where(red, to_light, np.inf)  # Never crossed this tick
+
+        # ...and so does the end of the lane
+        to_end = network.end[lane] - front
+        closer = to_end < gap
+        gap[closer] = to_end[closer]
+        lead_speed[closer] = 0.0
+        stop = np.minimum(stop, to_end)
+
+        # Intelligent Driver Model, then the queues close up: nobody crosses a red stop line or the
+        # end of the lane, or moves into where the car ahead has just moved to
+        with np.errstate(divide="ignore", invalid="ignore"):
+            desired_gap = MIN_GAP + np.maximum(0.0, speed * HEADWAY + speed * (speed - lead_speed) /
+                                               (2 * np.sqrt(acceleration * deceleration)))
+            accel = acceleration * (1 - (speed / max_speed) ** EXPONENT - (desired_gap / gap) ** 2)
+        speed = np.clip(speed + np.nan_to_num(accel, nan=0.0, neginf=-np.inf), 0.0, max_speed)
+        speed = np.minimum(speed, np.maximum(stop, 0.0))
+        speed[~on_lane] = 0.0  # Parked
+        moved = progress + speed
+        self.close_up(moved, progress, queued, length, order)
+
+        # Turns: crossing a turn point this tick, at an intersection past where the car joined its lane
+        right_index, has_right = first_ahead(network.right_point[lane], progress)
+        left_index, has_left = first_ahead(network.left_point[lane], progress)
+        right_point = network.right_point[lane, right_index]
+        left_point = network.left_point[lane, left_index]
+        at_right = on_lane & has_right & (right_point <= moved)
+        at_left = on_lane & has_left & (left_point <= moved) & ~at_right & \
+            (network.right_point[lane, left_index] > entry)
+        turns = {}  # car -> (new lane, progress on it)
+        waiting = False
+        lane_order = queued[order]
+        for i in np.flatnonzero(at_right | at_left).tolist():
+            k = right_index[i] if at_right[i] else left_index[i]
+            right = network.right[lane[i], k]
+            left = network.left[lane[i], k]
+            straight = STRAIGHT_WEIGHT if network.straight[lane[i], k] else 0.0
+            left_weight = TURN_WEIGHT if left >= 0 else 0.0
+            if at_right[i]:
+                if network.right_point[lane[i], k] <= entry[i] or right < 0:
+                    continue
+                target, point, chance = right, right_point[i], TURN_WEIGHT / (TURN_WEIGHT + left_weight + straight)
+            else:
+                if left < 0:
+                    continue
+                target, point, chance = left, left_point[i], left_weight / (left_weight + straight)
+            if chance < 1.0 and random.random() >= chance:
+                continue
+            joined = network.entry(lane[i], target) + (moved[i] - point)
+            if self.merge_clear(target, joined, length[i], lane_order, order, moved, length, turns):
+                turns[i] = (target, joined)
+            elif not straight:
+                # Nowhere else to go: wait at the turn for a gap
+                moved[i] = max(progress[i], point - 1e-6)
+                waiting = True
+        if waiting:
+            self.close_up(moved, progress, queued, length, order)
+        speed = moved - progress
+
+        self.lane = np.where(on_lane, lane, NO_LANE)
+        self.progress = moved
+        self.speed = speed
+
+        for i, vehicle in enumerate(cars):
+            vehicle.speed = float(speed[i])
+            if not on_lane[i] or speed[i] == 0.0:
+                continue
+            if i in turns:
+                target, joined = turns[i]
+                along = network.sign[target] * joined
+                vehicle.rotation = int(network.rotation[target])
+                vehicle.lane_entry = float(network.entry(lane[i], target))
+                current = target
+            else:
+                along = sign[i] * moved[i]
+                current = lane[i]
+            if network.horizontal[current]:
+                vehicle.x, vehicle.y = float(along), float(network.lateral[current])
+            else:
+                vehicle.x, vehicle.y = float(network.lateral[current]), float(along)
+            place_rect(vehicle)